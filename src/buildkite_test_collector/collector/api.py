@@ -1,12 +1,20 @@
 """Buildkite Test Engine API"""
 
-from typing import Any, Generator, Optional, Mapping
+from typing import TYPE_CHECKING, Any, Generator, Optional, Mapping
+import threading
+import time
 import traceback
-from requests import post, Response
-from requests.exceptions import InvalidHeader, HTTPError
-from .payload import Payload
 from ..pytest_plugin.logger import logger
 
+if TYPE_CHECKING:
+    from requests import Response
+
+    from .payload import Payload
+
+# requests (and gzip) are imported where they're used, as they are slow to
+# import and most local runs never upload.
+# pylint: disable=import-outside-toplevel
+
 
 # pylint: disable=too-few-public-methods
 class API:
@@ -25,7 +33,8 @@ class API:
         self.token = env.get(self.ENV_TOKEN)
         self.api_url = env.get(self.ENV_API_URL) or self.DEFAULT_API_URL
 
-    def submit(self, payload: Payload, batch_size=100) -> Generator[Optional[Response], Any, Any]:
+    def submit(self, payload: "Payload",
+               batch_size=100) -> Generator[Optional["Response"], Any, Any]:
         """Submit a payload to the API"""
         response = None
 
@@ -34,10 +43,13 @@ class API:
             yield None
 
         else:
-            for payload_slice in payload.into_batches(batch_size):
+            from requests import post
+            from requests.exceptions import InvalidHeader, HTTPError
+
+            for payload_slice in payload.iter_batches(batch_size):
                 try:
                     response = post(self.api_url + "/uploads",
-                                    json=payload_slice.as_json(),
+                                    data=payload_slice.as_json_bytes(),
                                     headers={
                                         "Content-Type": "application/json",
                                         "Authorization": f"Token token=\"{self.token}\""
@@ -57,3 +69,46 @@ class API:
                     error_message = traceback.format_exc()
                     logger.warning(error_message)
                     yield None
+
+    def submit_compressed(self, payload: "Payload", timeout: float) -> bool:
+        """
+        Submit the whole payload as a single gzip-compressed request.
+
+        Gives up after `timeout` seconds in total (including compression),
+        however far the request has got.  Returns True if the upload succeeded.
+        """
+        if not self.token:
+            logger.warning("No %s environment variable present", self.ENV_TOKEN)
+            return False
+
+        import gzip
+        from requests import post
+
+        deadline = time.monotonic() + timeout
+        body = gzip.compress(payload.as_json_bytes(), compresslevel=1)
+        succeeded = threading.Event()
+
+        def upload():
+            try:
+                response = post(self.api_url + "/uploads",
+                                data=body,
+                                headers={
+                                    "Content-Type": "application/json",
+                                    "Content-Encoding": "gzip",
+                                    "Authorization": f"Token token=\"{self.token}\""
+                                },
+                                timeout=max(deadline - time.monotonic(), 0.001))
+                response.raise_for_status()
+                succeeded.set()
+            except Exception:  # pylint: disable=broad-except
+                logger.warning(traceback.format_exc())
+
+        # A daemon thread, so an upload that overruns can't keep us alive
+        thread = threading.Thread(target=upload, daemon=True)
+        thread.start()
+        thread.join(max(deadline - time.monotonic(), 0))
+
+        if not succeeded.is_set() and thread.is_alive():
+            logger.warning("Upload did not complete within %ss", timeout)
+
+        return succeeded.is_set()
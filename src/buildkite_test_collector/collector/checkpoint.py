@@ -0,0 +1,158 @@
+"""Crash-safe checkpoints of finished tests"""
+
+import glob
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Iterator, Optional
+from uuid import uuid4
+
+from ..pytest_plugin.logger import logger
+from .payload import Payload, SerializedTestData
+from .run_env import RunEnv
+from .spool import Spool
+
+if TYPE_CHECKING:
+    from filelock import FileLock
+
+# filelock is imported where it's used, so that it's only loaded by runs
+# which checkpoint.
+# pylint: disable=import-outside-toplevel
+
+
+class Checkpoint:
+    """
+    An append-only record of the finished tests of a single session.
+
+    Each checkpoint is made up of three files in the checkpoint directory:
+
+    - ``<id>.json``: the run_env the results belong to.
+    - ``<id>.spool``: the serialised tests, see `Spool`.
+    - ``<id>.lock``: held for as long as the owning session is alive.
+
+    If the owning process is killed before it can upload its results the lock
+    is released by the operating system, and a later session can find the
+    orphaned checkpoint with `orphans` and upload it.
+    """
+
+    DEFAULT_FSYNC_INTERVAL = 5.0
+    # Orphans that haven't been written to for this long are deleted rather
+    # than uploaded, so they can't pile up while uploads keep failing.
+    MAX_ORPHAN_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, prefix: str, run_env: RunEnv, lock: "FileLock",
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.prefix = prefix
+        self.run_env = run_env
+        self.fsync_interval = fsync_interval
+        self._lock = lock
+        self._spool = Spool.open(f"{prefix}.spool")
+        self._synced_at = time.monotonic()
+
+    @classmethod
+    def create(cls, directory: str, run_env: RunEnv,
+               fsync_interval: float = DEFAULT_FSYNC_INTERVAL) -> "Checkpoint":
+        """Start a new, locked checkpoint in the directory"""
+        from filelock import FileLock
+
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, uuid4().hex)
+
+        lock = FileLock(f"{prefix}.lock")
+        lock.acquire()
+
+        # Write the header atomically, so a reader never sees a partial one.
+        with open(f"{prefix}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"run_env": run_env.as_json()}, f)
+        os.replace(f"{prefix}.json.tmp", f"{prefix}.json")
+
+        return cls(prefix, run_env, lock, fsync_interval)
+
+    @classmethod
+    def save(cls, directory: str, payload: Payload) -> "Checkpoint":
+        """Write out every finished test in the payload as an orphaned checkpoint"""
+        checkpoint = cls.create(directory, payload.run_env)
+        for test_data in payload.iter_serialized():
+            checkpoint.append(test_data)
+        checkpoint.close()
+        return checkpoint
+
+    @classmethod
+    def orphans(cls, directory: str,
+                max_age: float = MAX_ORPHAN_AGE) -> Iterator["Checkpoint"]:
+        """
+        Yield (and lock) the checkpoints in the directory that have no live
+        owner, deleting those last written to more than max_age seconds ago
+        """
+        from filelock import FileLock, Timeout
+
+        for header_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            prefix = header_path[:-len(".json")]
+            lock = FileLock(f"{prefix}.lock")
+            try:
+                lock.acquire(timeout=0)
+            except Timeout:
+                continue
+
+            checkpoint = cls._open(prefix, lock)
+            if checkpoint is None:
+                continue
+            if checkpoint.age() > max_age:
+                logger.warning("Removing checkpoint %s, it is too old to upload", prefix)
+                checkpoint.remove()
+                continue
+            yield checkpoint
+
+    @classmethod
+    def _open(cls, prefix: str, lock: "FileLock") -> Optional["Checkpoint"]:
+        try:
+            with open(f"{prefix}.json", "r", encoding="utf-8") as f:
+                run_env = RunEnv.from_json(json.load(f)["run_env"])
+        except (OSError, ValueError, KeyError):
+            # Another session removed it after we globbed, or it is corrupt.
+            lock.release()
+            return None
+
+        return cls(prefix, run_env, lock)
+
+    def age(self) -> float:
+        """Seconds since the checkpoint was last written to"""
+        return time.time() - os.path.getmtime(f"{self.prefix}.spool")
+
+    def append(self, test_data: SerializedTestData) -> None:
+        """
+        Append a finished test.
+
+        Every record is flushed to the operating system straight away, which
+        is enough to survive the process being killed.  Surviving the machine
+        going down needs an fsync, which is much more expensive, so that only
+        happens every `fsync_interval` seconds.
+        """
+        self._spool.append(test_data.to_record())
+
+        now = time.monotonic()
+        if now - self._synced_at >= self.fsync_interval:
+            self._spool.sync()
+            self._synced_at = now
+        else:
+            self._spool.flush()
+
+    def payload(self) -> Payload:
+        """A payload which streams the checkpointed tests back from disk"""
+        return Payload(run_env=self.run_env, data=(), started_at=None, finished_at=None,
+                       spool=self._spool)
+
+    def close(self) -> None:
+        """Sync and unlock the checkpoint, leaving it on disk for recovery"""
+        self._spool.sync()
+        self._spool.close()
+        self._lock.release()
+
+    def remove(self) -> None:
+        """Delete the checkpoint"""
+        self._spool.remove()
+        if os.path.exists(f"{self.prefix}.json"):
+            os.remove(f"{self.prefix}.json")
+        self._lock.release()
+        if os.path.exists(f"{self.prefix}.lock"):
+            os.remove(f"{self.prefix}.lock")
@@ -2,17 +2,31 @@
 
 """This module defines collector-level constants."""
 
+from functools import lru_cache
+
 DISTRIBUTION_NAME = 'buildkite-test-collector'
 COLLECTOR_NAME = f"python-{DISTRIBUTION_NAME}"
 TEST_RUNNER = "pytest"
 
-try:
-    from importlib.metadata import version, PackageNotFoundError
+
+@lru_cache(maxsize=None)
+def _version():
+    # importlib.metadata is slow to import and to search, so VERSION is only
+    # looked up the first time it is used (when results are uploaded or saved)
     try:
-        VERSION = version(DISTRIBUTION_NAME)
-    except PackageNotFoundError:
-        # Fallback for development environments where package isn't installed
-        VERSION = 'dev'
-except ImportError:
-    # Fallback for edge cases
-    VERSION = 'unknown'
+        # pylint: disable-next=import-outside-toplevel
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            return version(DISTRIBUTION_NAME)
+        except PackageNotFoundError:
+            # Fallback for development environments where package isn't installed
+            return 'dev'
+    except ImportError:
+        # Fallback for edge cases
+        return 'unknown'
+
+
+def __getattr__(name):
+    if name == "VERSION":
+        return _version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
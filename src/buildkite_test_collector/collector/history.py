@@ -0,0 +1,236 @@
+"""Local history of test results across runs"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .payload import TestData, TestResultFailed, TestResultPassed, TestResultSkipped
+from .run_env import RunEnv
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    nodeid TEXT NOT NULL,
+    commit_sha TEXT,
+    run_key TEXT,
+    recorded_at REAL NOT NULL,
+    duration REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_nodeid ON results (nodeid, id);
+CREATE INDEX IF NOT EXISTS results_by_commit ON results (commit_sha);
+CREATE TABLE IF NOT EXISTS stats (
+    nodeid TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    m2 REAL NOT NULL,
+    ewma REAL NOT NULL,
+    minimum REAL NOT NULL,
+    maximum REAL NOT NULL,
+    last_result TEXT,
+    last_failed_at REAL
+);
+"""
+
+# SQLite limits the number of parameters in a single statement
+_CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True)
+class TestStats:
+    """Rolling duration statistics and pass/fail counts for one test"""
+
+    # pylint: disable=too-many-instance-attributes
+    nodeid: str
+    runs: int
+    failures: int
+    mean: float
+    m2: float
+    ewma: float
+    minimum: float
+    maximum: float
+    last_result: Optional[str] = None
+    last_failed_at: Optional[float] = None
+
+    @property
+    def stddev(self) -> float:
+        """Sample standard deviation of the test's duration"""
+        if self.runs < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.runs - 1))
+
+    def updated(self, duration: float, result: str, recorded_at: float,
+                alpha: float) -> "TestStats":
+        """These stats with another passed or failed run added"""
+        runs = self.runs + 1
+        delta = duration - self.mean
+        mean = self.mean + delta / runs
+        failed = result == "failed"
+        return TestStats(
+            nodeid=self.nodeid,
+            runs=runs,
+            failures=self.failures + failed,
+            mean=mean,
+            m2=self.m2 + delta * (duration - mean),
+            ewma=alpha * duration + (1 - alpha) * self.ewma,
+            minimum=min(self.minimum, duration),
+            maximum=max(self.maximum, duration),
+            last_result=result,
+            last_failed_at=recorded_at if failed else self.last_failed_at,
+        )
+
+    @classmethod
+    def first(cls, nodeid: str, duration: float, result: str,
+              recorded_at: float) -> "TestStats":
+        """Stats for a test's first passed or failed run"""
+        return cls(nodeid=nodeid, runs=1, failures=int(result == "failed"),
+                   mean=duration, m2=0.0, ewma=duration,
+                   minimum=duration, maximum=duration, last_result=result,
+                   last_failed_at=recorded_at if result == "failed" else None)
+
+
+class History:
+    """
+    A local SQLite database of test results, kept across runs.
+
+    Each finished test is added to an in-memory buffer, which `flush` writes
+    out in a single transaction.  Two tables are kept:
+
+    - ``results``: one row per test run (the most recent `keep` per test),
+      indexed by nodeid and by commit.
+    - ``stats``: per test rolling duration statistics (mean and variance
+      with Welford's algorithm, and an exponentially weighted moving
+      average) and pass/fail counts.  Skipped runs aren't counted.
+
+    The database is opened in WAL mode so that several processes (e.g. xdist
+    workers) can flush to it.
+    """
+
+    DEFAULT_KEEP = 50
+    EWMA_ALPHA = 0.3
+
+    def __init__(self, path: str, run_env: Optional[RunEnv] = None,
+                 keep: int = DEFAULT_KEEP):
+        self.path = path
+        self.commit_sha = run_env.commit_sha if run_env is not None else None
+        self.run_key = run_env.key if run_env is not None else None
+        self.keep = keep
+        self._pending: List[Tuple[str, float, str, float]] = []
+        # Only loaded when a history is used, as it's slow to import
+        import sqlite3  # pylint: disable=import-outside-toplevel
+
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def add(self, nodeid: str, test_data: TestData) -> None:
+        """Buffer a finished test to be written by the next flush"""
+        duration = test_data.history.duration
+        self._pending.append((
+            nodeid,
+            duration.total_seconds() if duration is not None else 0.0,
+            result_name(test_data),
+            time.time(),
+        ))
+
+    def flush(self) -> None:
+        """Write out buffered tests and update their statistics"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO results (nodeid, commit_sha, run_key, recorded_at, duration, result)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(nodeid, self.commit_sha, self.run_key, recorded_at, duration, result)
+                 for nodeid, duration, result, recorded_at in pending],
+            )
+            self._update_stats(pending)
+            self._prune({nodeid for nodeid, _, _, _ in pending})
+
+    def _update_stats(self, pending):
+        timed = [row for row in pending if row[2] in ("passed", "failed")]
+        stats = self.stats({nodeid for nodeid, _, _, _ in timed})
+        for nodeid, duration, result, recorded_at in timed:
+            existing = stats.get(nodeid)
+            if existing is None:
+                stats[nodeid] = TestStats.first(nodeid, duration, result, recorded_at)
+            else:
+                stats[nodeid] = existing.updated(duration, result, recorded_at, self.EWMA_ALPHA)
+
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO stats (nodeid, runs, failures, mean, m2, ewma, minimum,"
+            " maximum, last_result, last_failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(s.nodeid, s.runs, s.failures, s.mean, s.m2, s.ewma, s.minimum, s.maximum,
+              s.last_result, s.last_failed_at) for s in stats.values()],
+        )
+
+    def _prune(self, nodeids):
+        for chunk in _chunks(sorted(nodeids)):
+            self._connection.execute(
+                "DELETE FROM results WHERE id IN ("
+                " SELECT id FROM ("
+                "  SELECT id, ROW_NUMBER() OVER (PARTITION BY nodeid ORDER BY id DESC) AS n"
+                f"  FROM results WHERE nodeid IN ({_placeholders(chunk)})"
+                " ) WHERE n > ?)",
+                (*chunk, self.keep),
+            )
+
+    def stats(self, nodeids: Optional[Iterable[str]] = None) -> Dict[str, TestStats]:
+        """The statistics of the given tests (or all tests), keyed by nodeid"""
+        query = ("SELECT nodeid, runs, failures, mean, m2, ewma, minimum, maximum,"
+                 " last_result, last_failed_at FROM stats")
+        if nodeids is None:
+            rows = self._connection.execute(query).fetchall()
+        else:
+            rows = []
+            for chunk in _chunks(list(nodeids)):
+                rows.extend(self._connection.execute(
+                    f"{query} WHERE nodeid IN ({_placeholders(chunk)})", chunk))
+        return {row[0]: TestStats(*row) for row in rows}
+
+    def durations(self, nodeid: str, limit: Optional[int] = None) -> List[float]:
+        """Durations of a test's recent passed and failed runs, newest first"""
+        rows = self._connection.execute(
+            "SELECT duration FROM results WHERE nodeid = ? AND result IN ('passed', 'failed')"
+            " ORDER BY id DESC LIMIT ?",
+            (nodeid, limit if limit is not None else -1),
+        )
+        return [duration for (duration,) in rows]
+
+    def results(self, nodeid: str, limit: Optional[int] = None) -> List[str]:
+        """Results of a test's recent runs, newest first"""
+        rows = self._connection.execute(
+            "SELECT result FROM results WHERE nodeid = ? ORDER BY id DESC LIMIT ?",
+            (nodeid, limit if limit is not None else -1),
+        )
+        return [result for (result,) in rows]
+
+    def close(self) -> None:
+        """Flush buffered tests and close the database"""
+        self.flush()
+        self._connection.close()
+
+
+def result_name(test_data: TestData) -> str:
+    """The name of a test's result, as used in the JSON payload"""
+    if isinstance(test_data.result, TestResultPassed):
+        return "passed"
+    if isinstance(test_data.result, TestResultFailed):
+        return "failed"
+    if isinstance(test_data.result, TestResultSkipped):
+        return "skipped"
+    return "unknown"
+
+
+def _chunks(items):
+    for start in range(0, len(items), _CHUNK_SIZE):
+        yield items[start:start + _CHUNK_SIZE]
+
+
+def _placeholders(chunk):
+    return ", ".join("?" * len(chunk))
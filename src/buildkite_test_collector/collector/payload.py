@@ -1,7 +1,10 @@
 """Buildkite Test Engine payload"""
 
+import json
+from itertools import chain
 from dataclasses import dataclass, replace, field
-from typing import Dict, Tuple, Optional, Union, Literal, List, Iterable, Mapping
+from typing import (AbstractSet, Dict, FrozenSet, Tuple, Optional, Union, Literal, List,
+                    Iterable, Iterator, Mapping)
 from datetime import timedelta
 from uuid import UUID
 
@@ -9,6 +12,7 @@ from ..pytest_plugin.logger import logger
 
 from .instant import Instant
 from .run_env import RunEnv
+from .spool import Spool
 
 JsonValue = Union[str, int, float, bool, "JsonDict", Tuple["JsonValue"]]
 JsonDict = Dict[str, JsonValue]
@@ -122,6 +126,10 @@ class TestHistory:
         """Add a new span to the children"""
         return replace(self, children=self.children + tuple([span]))
 
+    def push_spans(self, spans: Iterable[TestSpan]) -> "TestHistory":
+        """Add several new spans to the children"""
+        return replace(self, children=self.children + tuple(spans))
+
     def as_json(self, started_at: Instant) -> JsonDict:
         """Convert this trace into a Dict for eventual serialisation into JSON"""
         attrs = {
@@ -219,6 +227,10 @@ class TestData:
         """Add a span to the test history"""
         return replace(self, history=self.history.push_span(span))
 
+    def push_spans(self, spans: Iterable[TestSpan]) -> "TestData":
+        """Add several spans to the test history"""
+        return replace(self, history=self.history.push_spans(spans))
+
     def as_json(self, started_at: Instant) -> JsonDict:
         """Convert into a Dict suitable for eventual serialisation to JSON"""
         attrs = {
@@ -248,15 +260,71 @@ class TestData:
 
         return attrs
 
+    def as_json_fragment(self, started_at: Instant) -> bytes:
+        """Serialise into the UTF-8 JSON fragment used in upload bodies"""
+        return _dump_json(self.as_json(started_at))
+
+    def serialize(self, started_at: Instant) -> "SerializedTestData":
+        """Serialise this (finished) test once, dropping the rich object graph"""
+        return SerializedTestData(id=self.id, fragment=self.as_json_fragment(started_at))
+
+
+@dataclass(frozen=True)
+class SerializedTestData:
+    """
+    A finished test execution which has already been serialised to JSON.
+
+    Holding only the encoded fragment means the payload doesn't keep every
+    `TestHistory` and `TestSpan` alive until upload, and batches can be
+    assembled by concatenating fragments rather than walking the tree again.
+    """
+
+    id: UUID
+    fragment: bytes
+
+    def is_finished(self) -> bool:
+        """Serialised tests are always finished"""
+        return True
+
+    def as_json(self, started_at: Instant) -> JsonDict:  # pylint: disable=unused-argument
+        """Decode the cached fragment back into a Dict"""
+        return json.loads(self.fragment)
+
+    def as_json_fragment(self, started_at: Instant) -> bytes:  # pylint: disable=unused-argument
+        """Return the cached fragment"""
+        return self.fragment
+
+    def serialize(self, started_at: Instant) -> "SerializedTestData":  # pylint: disable=unused-argument
+        """Already serialised, so this is a no-op"""
+        return self
+
+    def to_record(self) -> bytes:
+        """Encode as a spool record: the 16 byte id followed by the fragment"""
+        return self.id.bytes + self.fragment
+
+    @classmethod
+    def from_record(cls, record: bytes) -> "SerializedTestData":
+        """Decode a spool record written by `to_record`"""
+        return cls(id=UUID(bytes=record[:16]), fragment=record[16:])
+
+
+def _dump_json(value: JsonValue) -> bytes:
+    """Compact UTF-8 JSON encoding shared by all fragments"""
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
 
 @dataclass(frozen=True)
 class Payload:
     """The full test analytics payload"""
 
     run_env: RunEnv
-    data: Tuple[TestData]
+    data: Tuple[Union[TestData, SerializedTestData]]
     started_at: Optional[Instant]
     finished_at: Optional[Instant]
+    # Finished tests which have been moved out of memory, see `spill`.
+    spool: Optional[Spool] = None
+    # The ids of tests which are left out, see `excluding`.
+    excluded: FrozenSet[UUID] = frozenset()
 
     @classmethod
     def init(cls, run_env: RunEnv) -> "Payload":
@@ -266,20 +334,78 @@ class Payload:
 
     def as_json(self) -> JsonDict:
         """Convert into a Dict suitable for eventual serialisation to JSON"""
-        finished_data = list(filter(lambda td: td.is_finished(), self.data))
-
-        if len(finished_data) < len(self.data):
-            logger.warning(
-                "Unexpected unfinished test data, skipping unfinished test records..."
-            )
-
         return {
             "format": "json",
             "run_env": self.run_env.as_json(),
-            "data": tuple(map(lambda td: td.as_json(self.started_at), finished_data)),
+            "data": tuple(map(lambda td: td.as_json(self.started_at), self._finished_data())),
         }
 
-    def push_test_data(self, report: TestData) -> "Payload":
+    def as_json_bytes(self) -> bytes:
+        """
+        Serialise into an upload body.
+
+        Equivalent to encoding `as_json()`, but pre-serialised tests are
+        spliced in as-is rather than being decoded and encoded again.
+        """
+        return b"".join([
+            b'{"format":"json","run_env":',
+            _dump_json(self.run_env.as_json()),
+            b',"data":[',
+            b",".join(self.data_fragments()),
+            b"]}",
+        ])
+
+    def data_fragments(self) -> Iterator[bytes]:
+        """Yield the JSON fragment of each finished test"""
+        for test_data in self._finished_data():
+            yield test_data.as_json_fragment(self.started_at)
+
+    def _finished_data(self) -> Iterator[Union[TestData, SerializedTestData]]:
+        skipped = False
+        for test_data in self._iter_data():
+            if test_data.is_finished():
+                yield test_data
+            else:
+                skipped = True
+
+        if skipped:
+            logger.warning(
+                "Unexpected unfinished test data, skipping unfinished test records..."
+            )
+
+    def _iter_data(self) -> Iterator[Union[TestData, SerializedTestData]]:
+        """Spooled tests, streamed back from disk, followed by in-memory tests"""
+        data = self.data
+        if self.spool is not None:
+            data = chain(map(SerializedTestData.from_record, self.spool), data)
+        if self.excluded:
+            data = (test_data for test_data in data if test_data.id not in self.excluded)
+        yield from data
+
+    def iter_serialized(self) -> Iterator[SerializedTestData]:
+        """Yield every finished test (including spooled tests) in serialised form"""
+        for test_data in self._finished_data():
+            yield test_data.serialize(self.started_at)
+
+    def count(self) -> int:
+        """The number of tests in the payload, including spooled tests"""
+        spooled = len(self.spool) if self.spool is not None else 0
+        return spooled + len(self.data) - len(self.excluded)
+
+    def excluding(self, ids: AbstractSet[UUID]) -> "Payload":
+        """
+        The payload without the tests with the given ids, which must be in
+        it.  They are skipped as the payload is read, so aren't copied.
+        """
+        return replace(self, excluded=self.excluded | frozenset(ids))
+
+    def spill(self, spool: Spool) -> "Payload":
+        """Serialise the in-memory tests onto the spool, freeing their memory"""
+        for test_data in self.data:
+            spool.append(test_data.serialize(self.started_at).to_record())
+        return replace(self, data=(), spool=spool)
+
+    def push_test_data(self, report: Union[TestData, SerializedTestData]) -> "Payload":
         """Append a test-data to the payload"""
         return replace(self, data=self.data + tuple([report]))
 
@@ -293,14 +419,23 @@ class Payload:
 
     def into_batches(self, batch_size=100) -> Tuple["Payload"]:
         """Convert the payload into a collection of payloads based on the batch size"""
-        return self.__into_batches(self.data, tuple(), batch_size)
-
-    def __into_batches(self, data, batches, batch_size) -> Tuple["Payload"]:
-        if len(data) <= batch_size:
-            return batches + tuple([replace(self, data=data)])
-
-        next_batch = data[0:batch_size]
-        next_data = data[batch_size:]
-        return self.__into_batches(
-            next_data, batches + tuple([replace(self, data=next_batch)]), batch_size
-        )
+        return tuple(self.iter_batches(batch_size))
+
+    def iter_batches(self, batch_size=100) -> Iterator["Payload"]:
+        """
+        Lazily split the payload into payloads of at most batch_size tests.
+
+        Spooled tests are streamed back from disk, so only one batch is held
+        in memory at a time.  An empty payload yields a single empty batch.
+        """
+        batch = []
+        yielded = False
+        for test_data in self._iter_data():
+            batch.append(test_data)
+            if len(batch) == batch_size:
+                yield replace(self, data=tuple(batch), spool=None, excluded=frozenset())
+                batch = []
+                yielded = True
+
+        if batch or not yielded:
+            yield replace(self, data=tuple(batch), spool=None, excluded=frozenset())
@@ -0,0 +1,56 @@
+"""Detecting duration regressions with robust statistics"""
+
+import statistics
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+# Scales the median absolute deviation to estimate the standard deviation
+# of normally distributed durations
+MAD_SCALE = 1.4826
+
+
+@dataclass(frozen=True)
+class Baseline:
+    """
+    The usual duration of a test: the median of its recent durations, and
+    their median absolute deviation (MAD).  Unlike the mean and standard
+    deviation these aren't skewed by the occasional very slow run.
+    """
+
+    median: float
+    mad: float
+    samples: int
+
+    MIN_SAMPLES = 5
+    # How many (robust) standard deviations slower a run must be
+    THRESHOLD = 4.0
+    # A regression must also be at least this much slower, in seconds, so
+    # that a test which always takes 1ms isn't flagged for taking 3ms
+    MIN_SLOWDOWN = 0.05
+    # The spread is never taken to be less than this fraction of the median,
+    # so very consistent tests aren't flagged for tiny slowdowns
+    MIN_RELATIVE_SPREAD = 0.05
+
+    @classmethod
+    def from_durations(cls, durations: Sequence[float]) -> Optional["Baseline"]:
+        """The baseline of some durations, or None if there are too few"""
+        if len(durations) < cls.MIN_SAMPLES:
+            return None
+
+        median = statistics.median(durations)
+        mad = statistics.median(abs(duration - median) for duration in durations)
+        return cls(median=median, mad=mad, samples=len(durations))
+
+    @property
+    def spread(self) -> float:
+        """The estimated standard deviation of the durations"""
+        return max(MAD_SCALE * self.mad, self.MIN_RELATIVE_SPREAD * self.median, 1e-6)
+
+    def score(self, duration: float) -> float:
+        """How many (robust) standard deviations slower than usual a duration is"""
+        return (duration - self.median) / self.spread
+
+    def is_regression(self, duration: float) -> bool:
+        """Is the duration significantly slower than usual"""
+        return (duration - self.median >= self.MIN_SLOWDOWN
+                and self.score(duration) >= self.THRESHOLD)
@@ -2,10 +2,11 @@
 
 import platform
 from dataclasses import dataclass
-from typing import Dict, Optional, Mapping
+from typing import Dict, Optional, Mapping, Tuple
 from uuid import uuid4
 
-from .constants import COLLECTOR_NAME, VERSION, TEST_RUNNER
+from . import constants
+from .constants import COLLECTOR_NAME, TEST_RUNNER
 
 # pylint: disable=too-few-public-methods
 class RunEnvBuilder:
@@ -40,6 +41,25 @@ class RunEnvBuilder:
             self._circle_ci_env() or \
             self._generic_env()
 
+    def parallel_job(self) -> Optional[Tuple[int, int]]:
+        """
+        The (zero-based) index of this job and the number of jobs, when
+        running as one of a Buildkite step's parallel jobs, else None.
+        """
+        job = self._get_env("BUILDKITE_PARALLEL_JOB")
+        job_count = self._get_env("BUILDKITE_PARALLEL_JOB_COUNT")
+        if job is None or job_count is None:
+            return None
+
+        try:
+            job, job_count = int(job), int(job_count)
+        except ValueError:
+            return None
+
+        if job_count < 1 or not 0 <= job < job_count:
+            return None
+        return job, job_count
+
     def _get_env(self, name: str) -> Optional[str]:
         var = self.env.get(name)
         if (var is None or var == ''):
@@ -146,8 +166,22 @@ class RunEnv:
             "url": self.url,
             "collector": COLLECTOR_NAME,
             "test_runner": TEST_RUNNER,
-            "version": VERSION,
+            "version": constants.VERSION,
             "language_version": f"{platform.python_version()}"
         }
 
         return {k: v for k, v in attrs.items() if v is not None}
+
+    @classmethod
+    def from_json(cls, attrs: Mapping[str, str]) -> 'RunEnv':
+        """Rebuild a RunEnv from the output of `as_json`"""
+        return cls(
+            ci=attrs["CI"],
+            key=attrs["key"],
+            number=attrs.get("number"),
+            job_id=attrs.get("job_id"),
+            branch=attrs.get("branch"),
+            commit_sha=attrs.get("commit_sha"),
+            message=attrs.get("message"),
+            url=attrs.get("url"),
+        )
@@ -0,0 +1,90 @@
+"""Deterministically sampling which passed and skipped tests are uploaded"""
+
+import hashlib
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import Optional, Sequence
+
+from .history import result_name
+from .payload import TestData
+
+WEIGHT_TAG = "sample.weight"
+
+
+@dataclass(frozen=True)
+class SampleRule:
+    """
+    A sample rate for the tests matching a pattern: either ``tag:key=value``
+    or a glob matched against the test's file name.
+    """
+
+    pattern: str
+    rate: float
+
+    @classmethod
+    def parse(cls, rule: str) -> "SampleRule":
+        """Parse ``PATTERN=RATE``, raising ValueError if it's invalid"""
+        pattern, separator, rate = rule.rpartition("=")
+        if not separator or not pattern:
+            raise ValueError(f"expected PATTERN=RATE, got {rule!r}")
+        return cls(pattern, parse_rate(rate))
+
+    def matches(self, test_data: TestData) -> bool:
+        """Does the rule apply to the test"""
+        if self.pattern.startswith("tag:"):
+            key, _, value = self.pattern[len("tag:"):].partition("=")
+            return test_data.tags.get(key) == value
+        return fnmatch(test_data.file_name or "", self.pattern)
+
+
+class Sampler:
+    """
+    Keeps every failed test, and a fraction of passed and skipped ones.
+
+    Whether a test is kept depends only on a hash of its nodeid and the
+    build's key, so every job of a build (and every retry of a job) keeps
+    the same tests, while each build keeps a different sample.  The rate
+    comes from the first rule matching the test, or else the default rate.
+
+    Each sampled test that is kept stands in for 1/rate tests, and is tagged
+    with that weight as ``sample.weight`` so totals can be scaled back up.
+    """
+
+    def __init__(self, key: str, rate: float, rules: Sequence[SampleRule] = ()):
+        self.key = key
+        self.rate = rate
+        self.rules = tuple(rules)
+
+    def rate_for(self, test_data: TestData) -> float:
+        """The rate the test is sampled at"""
+        for rule in self.rules:
+            if rule.matches(test_data):
+                return rule.rate
+        return self.rate
+
+    def sample(self, nodeid: str, test_data: TestData) -> Optional[TestData]:
+        """The test, tagged with its weight if it was sampled, or None if it's dropped"""
+        if result_name(test_data) not in ("passed", "skipped"):
+            return test_data
+
+        rate = self.rate_for(test_data)
+        if rate >= 1:
+            return test_data
+        if rate <= 0 or self._position(nodeid) >= rate:
+            return None
+        return test_data.tag_execution(WEIGHT_TAG, f"{1 / rate:g}")
+
+    def _position(self, nodeid):
+        """Where the test falls, from 0 to 1, in this build's sample order"""
+        # Not crc32: it's linear, so changing the key would shift every
+        # test's position the same way and builds would share samples.
+        digest = hashlib.blake2b(f"{self.key}\0{nodeid}".encode("utf-8"), digest_size=8)
+        return int.from_bytes(digest.digest(), "big") / 2 ** 64
+
+
+def parse_rate(value: str) -> float:
+    """Parse a sample rate, raising ValueError if it isn't between 0 and 1"""
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError(f"sample rates must be between 0 and 1, got {value}")
+    return rate
@@ -0,0 +1,133 @@
+"""Mergeable quantile sketches of durations"""
+
+import math
+from typing import Dict, Optional
+
+
+class DDSketch:
+    """
+    A DDSketch: an approximate distribution of positive values, which can
+    answer any quantile to within a relative error, and can be merged with
+    other sketches of the same accuracy.
+
+    Values are counted in logarithmically sized bins, so memory depends on
+    the range of the values rather than how many there are, and is bounded
+    by `max_bins`.  When that is reached the lowest bins are collapsed
+    together, keeping the upper quantiles (the ones of interest for
+    durations) accurate.
+
+    See: https://arxiv.org/abs/1908.10693
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    DEFAULT_RELATIVE_ACCURACY = 0.01
+    DEFAULT_MAX_BINS = 2048
+    # Values at or below this are counted as zero
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """Add a value to the sketch"""
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if value <= self.MIN_VALUE:
+            self.zero_count += 1
+            return
+
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def merge(self, other: "DDSketch") -> None:
+        """Add every value of another sketch of the same accuracy to this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can't merge sketches with different relative accuracies")
+
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest bins into the lowest remaining one"""
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        self.bins[excess[-1]] += sum(self.bins.pop(key) for key in excess[:-1])
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The approximate value at quantile q (between 0 and 1), or None if empty"""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return None
+
+        # The (zero based) nearest rank, so e.g. the p99 of 10 values is the largest
+        rank = max(math.ceil(q * self.count) - 1, 0)
+        if rank == self.count - 1:
+            return self.max
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # The midpoint of the bin, within relative_accuracy of any value in it
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        """The exact mean of the values, or None if empty"""
+        return self.sum / self.count if self.count else None
+
+    def as_json(self) -> dict:
+        """Convert into a Dict suitable for JSON serialization"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero_count": self.zero_count,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "DDSketch":
+        """Restore a sketch from the output of as_json"""
+        sketch = cls(data["relative_accuracy"], data["max_bins"])
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
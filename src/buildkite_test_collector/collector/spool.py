@@ -0,0 +1,117 @@
+"""Append-only on-disk storage for serialised test results"""
+
+import os
+import shutil
+import struct
+import tempfile
+from typing import Iterator, Optional
+
+# Each record is prefixed with its length as an unsigned 32-bit big-endian int.
+_LENGTH = struct.Struct(">I")
+
+
+class Spool:
+    """
+    An append-only file of length-prefixed binary records.
+
+    Used to keep finished tests out of memory on very large runs: records are
+    appended as tests finish and streamed back, in order, when the payload is
+    uploaded or written out as JSON.
+    """
+
+    def __init__(self, path: str, owns_directory: bool = False):
+        self.path = path
+        self.count = 0
+        self._owns_directory = owns_directory
+        # Kept open for the life of the spool; closed in close() or remove().
+        self._file = open(path, "ab")  # pylint: disable=consider-using-with
+
+    @classmethod
+    def create(cls, directory: Optional[str] = None) -> "Spool":
+        """Create a new spool file in a fresh temporary directory"""
+        tmpdir = tempfile.mkdtemp(prefix="buildkite-test-collector-", dir=directory)
+        return cls(os.path.join(tmpdir, "results.spool"), owns_directory=True)
+
+    @classmethod
+    def open(cls, path: str) -> "Spool":
+        """Reopen a spool written earlier (e.g. by another process), counting its records"""
+        spool = cls(path)
+        spool.count = count_records(path)
+        return spool
+
+    def append(self, record: bytes) -> None:
+        """Append a record to the end of the spool"""
+        self._file.write(_LENGTH.pack(len(record)))
+        self._file.write(record)
+        self.count += 1
+
+    def flush(self) -> None:
+        """Flush buffered records to the operating system"""
+        self._file.flush()
+
+    def sync(self) -> None:
+        """Flush buffered records and fsync them to stable storage"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Stream records back from disk in the order they were appended"""
+        self.flush()
+        return read_records(self.path)
+
+    def close(self) -> None:
+        """Close the spool, leaving its records on disk"""
+        self._file.close()
+
+    def remove(self) -> None:
+        """Close the spool and delete it (and its temporary directory, if any)"""
+        self._file.close()
+        if self._owns_directory:
+            shutil.rmtree(os.path.dirname(self.path), ignore_errors=True)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def read_records(path: str) -> Iterator[bytes]:
+    """
+    Read length-prefixed records from a file.
+
+    A truncated trailing record (e.g. from a process killed mid-write) is
+    silently ignored.
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+
+            (length,) = _LENGTH.unpack(header)
+            record = f.read(length)
+            if len(record) < length:
+                return
+
+            yield record
+
+
+def count_records(path: str) -> int:
+    """
+    Count the complete length-prefixed records in a file, seeking past
+    each one rather than reading it.
+    """
+    size = os.path.getsize(path)
+    count = 0
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return count
+
+            (length,) = _LENGTH.unpack(header)
+            if f.tell() + length > size:
+                return count
+
+            f.seek(length, os.SEEK_CUR)
+            count += 1
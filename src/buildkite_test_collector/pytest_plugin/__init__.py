@@ -3,16 +3,37 @@
 import os
 import pytest
 
-from ..collector.payload import Payload
-from ..collector.run_env import RunEnvBuilder
 from ..collector.api import API
-from .span_collector import SpanCollector
-from .buildkite_plugin import BuildkitePlugin
+from .logger import logger
+from .options import ORDERS, SCHEDULES, SPLITS
+from .tag_filter import TagFilter
+from . import instrumentation
+
+# This module is loaded on every pytest start, so the plugin itself, and the
+# features behind options, are only imported when they're used.
+# pylint: disable=import-outside-toplevel
+
+# Names this module has always exported, imported when first used
+_LAZY_EXPORTS = {
+    "Payload": "..collector.payload",
+    "RunEnvBuilder": "..collector.run_env",
+    "SpanCollector": ".span_collector",
+    "BuildkitePlugin": ".buildkite_plugin",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        from importlib import import_module
+        return getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @pytest.fixture
 def spans(request):
     """A pytest fixture which returns an instance of SpanCollector"""
+    from .span_collector import SpanCollector
+
     nodeid = request.node.nodeid
     plugin = getattr(request.config, '_buildkite', None)
 
@@ -22,47 +43,326 @@ def spans(request):
 @pytest.hookimpl(trylast=True)
 def pytest_configure(config):
     """pytest_configure hook callback"""
-    env = RunEnvBuilder(os.environ).build()
-
     config.addinivalue_line("markers",
         "execution_tag(key, value): "
         "add tag to test execution for Buildkite Test Collector. "
         "Both key and value must be a string.")
 
-    plugin = BuildkitePlugin(Payload.init(env), rootpath=config.rootpath)
+    _check_options(config)
+    sample_rates = _sample_rates(config)
+
+    api = API(os.environ)
+    if not _collecting(config, api):
+        # Nothing would be uploaded, saved or reported, so don't pay for
+        # tracking every test.  The spans fixture is a no-op without a plugin.
+        logger.debug("-> no token, --json or local reports, not collecting results")
+        _install_tag_filter(config)
+        return
+
+    from ..collector.run_env import RunEnvBuilder
+    env = RunEnvBuilder(os.environ).build()
+    xdist_enabled, is_xdist_worker = _xdist_state(config)
+    checkpoint = _checkpoint(config, api, env, xdist_enabled, is_xdist_worker)
+
+    # Only record history where tests run, i.e. not in the xdist controller
+    history = None
+    if config.option.history_path and (not xdist_enabled or is_xdist_worker):
+        from ..collector.history import History
+        history = History(config.option.history_path, env)
+
+    plugin = _plugin(config, env, checkpoint, history, sample_rates)
     setattr(config, '_buildkite', plugin)
     config.pluginmanager.register(plugin)
 
+    # Tests don't run in the xdist controller, so there is nothing to instrument
+    if not xdist_enabled or is_xdist_worker:
+        _install_instrumentation(config, plugin)
+
+    _install_reports(config, plugin, history, xdist_enabled, is_xdist_worker)
+
+    if config.option.flush_on_sigterm and api.token and (not xdist_enabled or is_xdist_worker):
+        from .sigterm import SigtermFlusher
+        flusher = SigtermFlusher(plugin, api, checkpoint_dir=config.option.checkpoint_dir)
+        if flusher.install():
+            setattr(config, '_buildkite_sigterm', flusher)
+
+
+def _install_tag_filter(config):
+    """Apply --tag-filters on its own, when the BuildkitePlugin isn't registered"""
+    if config.option.tag_filters:
+        tag_filter = TagFilter(config.option.tag_filters)
+        config.pluginmanager.register(tag_filter)
+        setattr(config, '_buildkite_tag_filter', tag_filter)
+
+
+def _install_instrumentation(config, plugin):
+    """Install the instrumentations given by --bk-instrument"""
+    instrumentations = [
+        instrumentation.load(name, plugin) for name in _instrumentation_names(config)
+    ]
+    for instr in instrumentations:
+        instr.install()
+        # Instrumentations may also implement pytest hooks
+        config.pluginmanager.register(instr)
+    setattr(config, '_buildkite_instrumentation', instrumentations)
+
+
+def _collecting(config, api):
+    """Is there anything to collect results for: uploading, --json or a local feature"""
+    option = config.option
+    return bool(
+        api.token
+        or option.jsonpath
+        or option.instrument
+        or option.history_path
+        or option.order
+        or option.split
+        or option.xdist_schedule
+        or option.slowest
+        or option.sketches_path
+        or option.regressions
+    )
+
+
+def _checkpoint(config, api, env, xdist_enabled, is_xdist_worker):
+    """The Checkpoint given by --bk-checkpoint-dir, after uploading any orphaned ones"""
+    checkpoint_dir = config.option.checkpoint_dir
+    if not checkpoint_dir or not api.token:
+        return None
+
+    if not is_xdist_worker:
+        _upload_orphaned_checkpoints(api, checkpoint_dir)
+    # Only the processes which upload need to checkpoint what they'd upload
+    if xdist_enabled and not is_xdist_worker:
+        return None
+
+    from ..collector.checkpoint import Checkpoint
+    return Checkpoint.create(checkpoint_dir, env)
+
+
+def _plugin(config, env, checkpoint, history, sample_rates):
+    """The BuildkitePlugin, set up by the options"""
+    from ..collector.payload import Payload
+    from .buildkite_plugin import BuildkitePlugin
+
+    span_aggregator = None
+    if config.option.span_threshold is not None:
+        from .span_aggregator import SpanAggregator
+        span_aggregator = SpanAggregator(config.option.span_threshold)
+
+    sampler = None
+    if sample_rates is not None:
+        from ..collector.sampling import Sampler
+        sampler = Sampler(env.key, *sample_rates)
+
+    return BuildkitePlugin(
+        Payload.init(env),
+        rootpath=config.rootpath,
+        preserialize=config.option.preserialize,
+        spool_threshold=config.option.spool_threshold,
+        checkpoint=checkpoint,
+        span_aggregator=span_aggregator,
+        history=history,
+        sampler=sampler,
+        # xdist workers don't write the JSON file
+        keep_unsampled=bool(config.option.jsonpath) and not hasattr(config, 'workerinput'),
+    )
+
+
+def _sample_rates(config):
+    """The (rate, rules) given by --bk-sample-rate and --bk-sample-rule, if any"""
+    rate = config.option.sample_rate
+    if rate is None and not config.option.sample_rules:
+        return None
+
+    from ..collector.sampling import SampleRule, parse_rate
+    try:
+        rate = parse_rate(rate) if rate is not None else 1.0
+        rules = [SampleRule.parse(rule) for rule in config.option.sample_rules]
+    except ValueError as e:
+        raise pytest.UsageError(f"--bk-sample-rate/--bk-sample-rule: {e}") from e
+    return rate, rules
+
+
+def _check_options(config):
+    """
+    Reject options which need durations without somewhere to read them from,
+    and out of range values
+    """
+    if config.option.slowest is not None and config.option.slowest < 1:
+        raise pytest.UsageError("--bk-slowest must be at least 1")
+    if config.option.order and not config.option.history_path:
+        raise pytest.UsageError("--bk-order requires --bk-history")
+    if config.option.regressions and not config.option.history_path:
+        raise pytest.UsageError("--bk-regressions requires --bk-history")
+    # Each parallel job has its own history, recording only its own share of
+    # the tests, so the jobs would disagree on the split
+    if config.option.split and not config.option.timings_path:
+        raise pytest.UsageError("--bk-split requires --bk-timings")
+    if (config.option.xdist_schedule
+            and not (config.option.history_path or config.option.timings_path)):
+        raise pytest.UsageError("--bk-xdist-schedule requires --bk-history or --bk-timings")
+
+
+def _install_reports(config, plugin, history, xdist_enabled, is_xdist_worker):
+    """Set up the terminal summary reports, which the xdist controller writes"""
+    if config.option.slowest and not is_xdist_worker:
+        from .slowest import SlowestReport
+        report = SlowestReport(config.option.slowest)
+        plugin.finalize_hooks.append(report.finalize_test)
+        config.pluginmanager.register(report)
+        setattr(config, '_buildkite_slowest', report)
+
+    if config.option.sketches_path:
+        from .sketches import DurationSketches
+        sketches = DurationSketches(config.option.sketches_path)
+        if not xdist_enabled or is_xdist_worker:
+            plugin.finalize_hooks.append(sketches.finalize_test)
+        config.pluginmanager.register(sketches)
+        setattr(config, '_buildkite_sketches', sketches)
+
+    if config.option.regressions:
+        from .regressions import RegressionReport
+        if history is not None:
+            regressions = RegressionReport(history)
+            plugin.finalize_hooks.append(regressions.finalize_test)
+        else:
+            # The xdist controller, which has no history of its own
+            from ..collector.history import History
+            regressions = RegressionReport(History(config.option.history_path),
+                                           from_reports=True)
+        if not is_xdist_worker:
+            config.pluginmanager.register(regressions)
+            setattr(config, '_buildkite_regressions', regressions)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    """pytest_xdist_make_scheduler hook callback, only called when xdist is installed"""
+    plugin = getattr(config, '_buildkite', None)
+    schedule = config.getoption("xdist_schedule")
+    if plugin is None or not schedule:
+        return None
+
+    from .xdist_scheduling import make_scheduler
+    return make_scheduler(config, log, schedule,
+                          lambda nodeids: plugin.expected_durations(config, nodeids))
+
+
+def _upload_orphaned_checkpoints(api, checkpoint_dir):
+    """
+    Upload the results of earlier sessions which were killed before uploading,
+    giving up on the rest (for the next session to retry) after a failure
+    """
+    from ..collector.checkpoint import Checkpoint
+    for checkpoint in Checkpoint.orphans(checkpoint_dir):
+        logger.info("Uploading orphaned checkpoint %s (%d tests)",
+                    checkpoint.prefix, checkpoint.payload().count())
+        responses = list(api.submit(checkpoint.payload()))
+        if all(responses):
+            checkpoint.remove()
+        else:
+            # Leave it in place to be retried by the next session
+            checkpoint.close()
+            return
+
+
+def _instrumentation_names(config):
+    """The validated names given to --bk-instrument"""
+    names = []
+    for value in config.option.instrument:
+        for name in value.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name not in instrumentation.INSTRUMENTATIONS:
+                raise pytest.UsageError(
+                    f"--bk-instrument: unknown instrumentation {name!r}, expected one of: "
+                    + ", ".join(instrumentation.INSTRUMENTATIONS)
+                )
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def _xdist_state(config):
+    """Returns a tuple of (is xdist enabled, is this an xdist worker)"""
+    xdist_plugin = config.pluginmanager.getplugin("xdist")
+    if xdist_plugin is not None:
+        numprocesses = config.getoption("numprocesses")
+    else:
+        numprocesses = None
+    xdist_enabled = (
+        xdist_plugin is not None
+        and numprocesses is not None
+        and numprocesses > 0
+    )
+    is_xdist_worker = hasattr(config, 'workerinput')
+    return xdist_enabled, is_xdist_worker
+
+
+def _uninstall_reports(config):
+    """Unregister the tag filter and the terminal summary reports, saving the sketches"""
+    tag_filter = getattr(config, '_buildkite_tag_filter', None)
+    if tag_filter is not None:
+        config.pluginmanager.unregister(tag_filter)
+        del config._buildkite_tag_filter
+
+    report = getattr(config, '_buildkite_slowest', None)
+    if report is not None:
+        config.pluginmanager.unregister(report)
+        del config._buildkite_slowest
+
+    sketches = getattr(config, '_buildkite_sketches', None)
+    if sketches is not None:
+        config.pluginmanager.unregister(sketches)
+        if not hasattr(config, 'workeroutput'):
+            sketches.save()
+        del config._buildkite_sketches
+
+    regressions = getattr(config, '_buildkite_regressions', None)
+    if regressions is not None:
+        config.pluginmanager.unregister(regressions)
+        regressions.close()
+        del config._buildkite_regressions
+
 
 @pytest.hookimpl
 def pytest_unconfigure(config):
     """pytest_unconfigure hook callback"""
+    flusher = getattr(config, '_buildkite_sigterm', None)
+    if flusher:
+        flusher.uninstall()
+        del config._buildkite_sigterm
+
+    _uninstall_reports(config)
+
+    instrumentations = getattr(config, '_buildkite_instrumentation', None)
+    if instrumentations is not None:
+        for instr in instrumentations:
+            config.pluginmanager.unregister(instr)
+            instr.uninstall()
+        del config._buildkite_instrumentation
+
     plugin = getattr(config, '_buildkite', None)
 
     if plugin:
         api = API(os.environ)
-        xdist_plugin = config.pluginmanager.getplugin("xdist")
-        if xdist_plugin is not None:
-            numprocesses = config.getoption("numprocesses")
-        else:
-            numprocesses = None
-        xdist_enabled = (
-            xdist_plugin is not None
-            and numprocesses is not None
-            and numprocesses > 0
-        )
-        is_xdist_worker = hasattr(config, 'workerinput')
+        xdist_enabled, is_xdist_worker = _xdist_state(config)
 
         is_controller = not xdist_enabled or (xdist_enabled and not is_xdist_worker)
 
+        # Whether every batch was accepted, so the checkpoint can be removed
+        uploaded = True
+
         # When xdist is not installed, or when it's installed and not enabled
         if not xdist_enabled:
-            list(api.submit(plugin.payload))
+            uploaded = all(list(api.submit(plugin.upload_payload)))
 
         # When xdist is activated, we want to submit from worker thread only, because they have
         # access to tag data
         if xdist_enabled and is_xdist_worker:
-            list(api.submit(plugin.payload))
+            uploaded = all(list(api.submit(plugin.upload_payload)))
 
         # We only want a single thread to write to the json file.
         # When xdist is enabled, that will be the controller thread.
@@ -72,6 +372,7 @@ def pytest_unconfigure(config):
             if jsonpath:
                 plugin.save_payload_as_json(jsonpath, merge=config.option.mergejson)
 
+        plugin.close(uploaded=uploaded)
         del config._buildkite
         config.pluginmanager.unregister(plugin)
 
@@ -100,3 +401,151 @@ def pytest_addoption(parser):
         dest="tag_filters",
         help='filter tests by execution_tag with `key:value`, e.g. `--tag-filters color:red`'
     )
+    group.addoption(
+        '--bk-preserialize',
+        default=False,
+        action='store_true',
+        dest="preserialize",
+        help='serialise each test to JSON as it finishes instead of at upload time, '
+             'trading a little per-test work for lower peak memory'
+    )
+    group.addoption(
+        '--bk-spool-threshold',
+        default=None,
+        type=int,
+        dest="spool_threshold",
+        metavar="N",
+        help='spool finished tests to a temporary file on disk whenever N are held in memory'
+    )
+    group.addoption(
+        '--bk-checkpoint-dir',
+        default=None,
+        action='store',
+        dest="checkpoint_dir",
+        metavar="path",
+        help='checkpoint finished tests to this directory so they can be uploaded by a '
+             'later session if this one is killed before uploading'
+    )
+    group.addoption(
+        '--bk-flush-on-sigterm',
+        default=False,
+        action='store_true',
+        dest="flush_on_sigterm",
+        help='upload the results collected so far when the run is terminated with SIGTERM '
+             '(e.g. when a Buildkite job is cancelled)'
+    )
+    group.addoption(
+        '--bk-sample-rate',
+        default=None,
+        dest="sample_rate",
+        metavar="RATE",
+        help='only upload this fraction (0 to 1) of passed and skipped tests, always '
+             'uploading failures.  The sample is chosen by the build, and tests that are '
+             'uploaded are tagged with sample.weight'
+    )
+    group.addoption(
+        '--bk-sample-rule',
+        default=[],
+        action='append',
+        dest="sample_rules",
+        metavar="PATTERN=RATE",
+        help='sample the tests matching PATTERN at RATE instead, where PATTERN is '
+             'tag:key=value or a file name glob.  The first matching rule applies'
+    )
+    group.addoption(
+        '--bk-history',
+        default=None,
+        dest="history_path",
+        metavar="path",
+        help='record every test\'s result and duration in a local SQLite database at the '
+             'given path, keeping rolling statistics across runs'
+    )
+    group.addoption(
+        '--bk-order',
+        default=None,
+        choices=ORDERS,
+        dest="order",
+        help='run tests which failed last time first, then the slowest first, using '
+             '--bk-history.  "tests" orders every test on its own, "files" moves whole '
+             'files, keeping each file\'s tests together'
+    )
+    group.addoption(
+        '--bk-split',
+        default=None,
+        choices=SPLITS,
+        dest="split",
+        help='when running as one of a Buildkite step\'s parallel jobs, only run this '
+             'job\'s share of the tests, balanced by expected duration from --bk-timings, '
+             'which must be the same for every job.  "files" keeps each file\'s tests in '
+             'the same job'
+    )
+    group.addoption(
+        '--bk-timings',
+        default=None,
+        dest="timings_path",
+        metavar="path",
+        help='expected test durations for --bk-split and --bk-xdist-schedule: a JSON '
+             'object mapping test ids to seconds, or the output of --json from an earlier run'
+    )
+    group.addoption(
+        '--bk-xdist-schedule',
+        default=None,
+        choices=SCHEDULES,
+        dest="xdist_schedule",
+        help='with pytest-xdist, hand out the longest running tests to workers first, '
+             'using --bk-timings or --bk-history.  "files" keeps each file\'s tests on the '
+             'same worker'
+    )
+    group.addoption(
+        '--bk-slowest',
+        default=None,
+        type=int,
+        dest="slowest",
+        metavar="N",
+        help='report the N slowest tests, files and fixtures, and the time spent in each '
+             'phase'
+    )
+    group.addoption(
+        '--bk-regressions',
+        default=False,
+        action='store_true',
+        dest="regressions",
+        help='compare each test\'s duration with its recent runs in --bk-history, tagging '
+             'and reporting significantly slower tests'
+    )
+    group.addoption(
+        '--bk-sketches',
+        default=None,
+        dest="sketches_path",
+        metavar="path",
+        help='keep mergeable sketches of test duration percentiles for the suite and each '
+             'file, scope and tag, saving them as JSON at the given path (merged with the '
+             'file if it exists) and summarising them'
+    )
+    group.addoption(
+        '--bk-instrument',
+        default=[],
+        action='append',
+        dest="instrument",
+        metavar="name[,name...]",
+        help='automatically capture spans or resource usage from: '
+             + ', '.join(instrumentation.INSTRUMENTATIONS)
+    )
+    group.addoption(
+        '--bk-tracemalloc-rate',
+        default=0.0,
+        type=float,
+        dest="tracemalloc_rate",
+        metavar="RATE",
+        help='with --bk-instrument=memory, also trace allocations with tracemalloc for '
+             'this fraction (0 to 1) of tests'
+    )
+    group.addoption(
+        '--bk-span-threshold',
+        default=None,
+        type=int,
+        dest="span_threshold",
+        metavar="N",
+        help='after a test has recorded N spans, fold further spans with the same section '
+             'and detail into a count/total/min/max summary'
+    )
@@ -1,15 +1,28 @@
 """Buildkite test collector plugin for Pytest"""
 import json
 import os
+import threading
+from itertools import chain
 from pathlib import Path
 from typing import Dict, Tuple
 from uuid import uuid4
 
-from filelock import FileLock
-
 from ..collector.payload import TestData
+from ..collector.run_env import RunEnvBuilder
+from ..collector.spool import Spool
 from .logger import logger
 from .failure_reasons import failure_reasons
+from .span_buffer import CURRENT_NODEID, SpanBuffer
+from .tag_filter import deselect_by_tag
+
+# ordering and splitting (which use statistics), the history and filelock are
+# slow to import, so they're imported where they're used and only loaded by
+# runs which need them.
+# pylint: disable=import-outside-toplevel
+
+
+def _span_start(span):
+    return span.start_at.seconds if span.start_at is not None else float("inf")
 
 
 def _is_subtest_report(report):
@@ -33,11 +46,49 @@ class BuildkitePlugin:
     # 8 attributes of tracking state seems reasonable for this plugin
     # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, payload, rootpath=None):
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(self, payload, rootpath=None, preserialize=False, spool_threshold=None,
+                 checkpoint=None, span_aggregator=None, history=None, sampler=None,
+                 keep_unsampled=False):
         self.payload = payload
         self.rootpath = rootpath
+        # When set, finished tests are serialised to JSON fragments in
+        # finalize_test and the TestData object graph is dropped.
+        self.preserialize = preserialize
+        # When set, finished tests are moved to an on-disk spool whenever
+        # this many are being held in memory.
+        self.spool_threshold = spool_threshold
+        # When set, every finished test is also appended to this crash-safe
+        # Checkpoint so it can be recovered if we never reach upload.
+        self.checkpoint = checkpoint
+        # When set, a SpanAggregator which folds each test's spans past a
+        # threshold into summaries, see SpanCollector.record.
+        self.span_aggregator = span_aggregator
+        # When set, a History which every finished test is added to
+        self.history = history
+        # When set, a Sampler deciding which finished tests are uploaded.
+        # Tests are added to the history either way.
+        self.sampler = sampler
+        # When set, the tests the sampler drops are still kept in the payload
+        # (for --json), but left out of upload_payload.
+        self.keep_unsampled = keep_unsampled
+        self._unsampled = set()
         self.in_flight = {}
+        # SpanBuffers holding the spans recorded against each in-flight
+        # test, one per recording thread, merged in finalize_test.
         self.spans = {}
+        self._thread_local = threading.local()
+        # Callables taking and returning the TestData of each test as it is
+        # finalized, after it has finished and its spans have been merged.
+        # Used by automatic instrumentation to derive tags from the spans it
+        # recorded.
+        self.finalize_hooks = []
+        # The nodeid of the test currently being run, used to attribute
+        # automatically captured spans.  See the current_nodeid property.
+        self._current_nodeid = None
+        # The threads already running when the current test started, whose
+        # spans aren't attributed to it.  See thread_nodeid.
+        self._threads_at_start = frozenset()
         # Tracks nodeids whose in-flight result was set to failed by a
         # SubtestReport.  Used to prevent the parent test's "passed"
         # call-phase report from overwriting the failure.
@@ -55,9 +106,68 @@ class BuildkitePlugin:
         # (our usual tagging point) only fires in the discarded child.
         self._tags_by_nodeid: Dict[str, Tuple[Tuple[str, str], ...]] = {}
 
+    @property
+    def current_nodeid(self):
+        """The nodeid of the test currently being run, if any"""
+        return self._current_nodeid
+
+    @current_nodeid.setter
+    def current_nodeid(self, nodeid):
+        self._current_nodeid = nodeid
+        CURRENT_NODEID.set(nodeid)
+
+    def thread_nodeid(self):
+        """
+        The nodeid of the test currently being run, if the calling thread was
+        started while it was running, else None.  Threads which were already
+        running, such as a session scoped server or poller, aren't doing the
+        test's work, so their spans shouldn't be charged to it.
+        """
+        if threading.current_thread() in self._threads_at_start:
+            return None
+        return self._current_nodeid
+
+    def span_buffer(self, nodeid):
+        """
+        The calling thread's SpanBuffer for a test, or None if the test isn't
+        in flight.  Each thread only ever appends to its own buffer, and only
+        keeps the buffer for one test at a time.
+        """
+        test_data = self.in_flight.get(nodeid)
+        if test_data is None:
+            return None
+
+        buffer = getattr(self._thread_local, "span_buffer", None)
+        if buffer is None or buffer.test_id != test_data.id:
+            buffer = SpanBuffer(test_data.id)
+            self.spans.setdefault(nodeid, []).append(buffer)
+            self._thread_local.span_buffer = buffer
+        return buffer
+
+    def current_test_data(self, nodeid):
+        """The in-flight TestData for a test, including its buffered spans"""
+        test_data = self.in_flight[nodeid]
+        buffers = self.spans.get(nodeid, ())
+        return test_data.push_spans(chain.from_iterable(buffer.spans for buffer in buffers))
+
+    def _merge_spans(self, nodeid, test_data):
+        """Move the test's buffered (and aggregated) spans into its TestData"""
+        buffers = self.spans.pop(nodeid, ())
+        if not buffers:
+            return test_data
+
+        spans = list(chain.from_iterable(buffer.spans for buffer in buffers))
+        if len(buffers) > 1:
+            # Each buffer is in order, but they need interleaving
+            spans.sort(key=_span_start)
+        if self.span_aggregator is not None:
+            spans.extend(self.span_aggregator.spans(buffers))
+        return test_data.push_spans(spans)
+
     def pytest_collection_modifyitems(self, config, items):
         """pytest_collection_modifyitems hook callback to capture execution_tag
-        markers and filter tests by them"""
+        markers, filter tests by them, split them between parallel jobs and order
+        them by their history"""
         for item in items:
             tags = tuple(
                 (tag.args[0], tag.args[1])
@@ -68,13 +178,65 @@ class BuildkitePlugin:
                 self._tags_by_nodeid[item.nodeid] = tags
 
         tag_filter = config.getoption("tag_filters")
-        if not tag_filter:
+        if tag_filter:
+            deselect_by_tag(config, items, tag_filter)
+
+        split = config.getoption("split")
+        if split:
+            self._split_items(config, items, split)
+
+        order = config.getoption("order")
+        if order:
+            from .ordering import order_items
+            order_items(items, self._history_stats(config, [item.nodeid for item in items]),
+                        order)
+
+    def _split_items(self, config, items, split):
+        """Deselect every item outside this parallel job's share"""
+        parallel_job = RunEnvBuilder(os.environ).parallel_job()
+        if parallel_job is None:
+            logger.warning(
+                "--bk-split: BUILDKITE_PARALLEL_JOB and BUILDKITE_PARALLEL_JOB_COUNT "
+                "aren't set, running every test"
+            )
             return
 
-        filtered_items, unfiltered_items = self._filter_tests_by_tag(items, tag_filter)
-
-        config.hook.pytest_deselected(items=unfiltered_items)
-        items[:] = filtered_items
+        job, job_count = parallel_job
+        from .splitting import load_timings, split_items
+        selected, deselected = split_items(
+            items, load_timings(config.getoption("timings_path")), job, job_count, split
+        )
+        logger.debug('-> split: job %d of %d runs %d of %d tests',
+                     job, job_count, len(selected), len(items))
+
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+    def expected_durations(self, config, nodeids):
+        """Expected test durations for --bk-xdist-schedule, from --bk-timings or
+        else --bk-history (which every worker on this machine shares)"""
+        timings_path = config.getoption("timings_path")
+        if timings_path:
+            from .splitting import load_timings
+            return load_timings(timings_path)
+        if config.getoption("history_path"):
+            return {nodeid: stats.ewma
+                    for nodeid, stats in self._history_stats(config, nodeids).items()}
+        return {}
+
+    def _history_stats(self, config, nodeids):
+        """The history of the given tests, read from --bk-history"""
+        if self.history is not None:
+            return self.history.stats(nodeids)
+
+        # e.g. the xdist controller, which reads history but doesn't record it
+        from ..collector.history import History
+
+        history = History(config.getoption("history_path"))
+        try:
+            return history.stats(nodeids)
+        finally:
+            history.close()
 
     def pytest_collectreport(self, report):
         """Capture collection errors (e.g. import failures) as failed tests.
@@ -126,7 +288,7 @@ class BuildkitePlugin:
         )
         test_data = test_data.finish()
 
-        self.payload = self.payload.push_test_data(test_data)
+        self._push_finished(test_data)
 
     def pytest_runtest_logstart(self, nodeid, location):
         """pytest_runtest_logstart hook callback"""
@@ -149,6 +311,8 @@ class BuildkitePlugin:
             location=f"{file_name}:{location[1]}"
         )
         self.in_flight[nodeid] = test_data
+        self._threads_at_start = frozenset(threading.enumerate())
+        self.current_nodeid = nodeid
 
     def _normalize_file_path(self, path):
         """Normalize a pytest-reported file path (relative to config.rootpath)
@@ -322,6 +486,15 @@ class BuildkitePlugin:
             logger.debug('-> finalize_test: not in flight: %s', nodeid)
             return False
         del self.in_flight[nodeid]
+        if self.current_nodeid == nodeid:
+            self.current_nodeid = None
+
+        if test_data.result is None:
+            logger.warning('Test %s has no result set at finalization', nodeid)
+        # Finish first, so the finalize hooks' own work (e.g. comparing
+        # tracemalloc snapshots) isn't counted in the test's duration
+        test_data = test_data.finish()
+        logger.debug('-> finalize_test nodeid=%s duration=%s', nodeid, test_data.history.duration)
 
         # Apply tags captured at collection time.  Under fork-per-test
         # runners this is the only tagging point that runs in the owning
@@ -333,60 +506,102 @@ class BuildkitePlugin:
             if key not in test_data.tags:
                 test_data = test_data.tag_execution(key, value)
 
-        if test_data.result is None:
-            logger.warning('Test %s has no result set at finalization', nodeid)
-        test_data = test_data.finish()
-        logger.debug('-> finalize_test nodeid=%s duration=%s', nodeid, test_data.history.duration)
-        self.payload = self.payload.push_test_data(test_data)
+        test_data = self._merge_spans(nodeid, test_data)
+        for hook in self.finalize_hooks:
+            test_data = hook(test_data)
+
+        if self.history is not None:
+            self.history.add(nodeid, test_data)
+        sampled = test_data
+        if self.sampler is not None:
+            sampled = self.sampler.sample(nodeid, test_data)
+        if sampled is not None:
+            self._push_finished(sampled)
+        else:
+            logger.debug('-> finalize_test: %s not sampled', nodeid)
+            if self.keep_unsampled:
+                self._push_finished(test_data, upload=False)
 
         # Clean up subtest tracking state for this test.
         self._failed_by_subtest.discard(nodeid)
 
         return True
 
+    def interrupt(self, reason):
+        """Finalize every in-flight test as failed because the run was interrupted"""
+        for nodeid in list(self.in_flight):
+            test_data = self.in_flight[nodeid]
+            if test_data.result is None:
+                test_data = test_data.failed(failure_reason=reason)
+            self.in_flight[nodeid] = test_data.tag_execution("test.interrupted", "true")
+            self.finalize_test(nodeid)
+
+    def _push_finished(self, test_data, upload=True):
+        """Move a finished test into the payload, to be uploaded or not"""
+        if self.preserialize or self.checkpoint is not None:
+            test_data = test_data.serialize(self.payload.started_at)
+        if not upload:
+            self._unsampled.add(test_data.id)
+        elif self.checkpoint is not None:
+            self.checkpoint.append(test_data)
+        self.payload = self.payload.push_test_data(test_data)
+
+        if self.spool_threshold and len(self.payload.data) >= self.spool_threshold:
+            spool = self.payload.spool or Spool.create()
+            logger.debug('-> spilling %d tests to %s', len(self.payload.data), spool.path)
+            self.payload = self.payload.spill(spool)
+
+    @property
+    def upload_payload(self):
+        """The payload, less the tests kept only because of keep_unsampled"""
+        return self.payload.excluding(self._unsampled)
+
+    def close(self, uploaded=True):
+        """Release any on-disk storage held by the payload or checkpoint, and
+        write out the history.  If the results weren't uploaded the checkpoint
+        is left on disk, to be uploaded by a later session."""
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        if self.payload.spool is not None:
+            self.payload.spool.remove()
+        self._unsampled.clear()
+        if self.checkpoint is not None:
+            if uploaded:
+                self.checkpoint.remove()
+            else:
+                self.checkpoint.close()
+                logger.warning("Test results saved to %s", self.checkpoint.prefix)
+            self.checkpoint = None
+
     def save_payload_as_json(self, path, merge=False):
         """Save payload into a json file, merging with existing data if merge is True"""
-        data = list(self.payload.as_json()["data"])
+        fragments = self.payload.data_fragments()
 
         if merge:
+            from filelock import FileLock
+
             lock = FileLock(f"{path}.lock")
             with lock:
                 if os.path.exists(path):
                     with open(path, "r", encoding="utf-8") as f:
                         existing_data = json.load(f)
                     # Merge existing data with current payload
-                    data = existing_data + data
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(data, f)
+                    fragments = chain(
+                        (json.dumps(entry).encode("utf-8") for entry in existing_data),
+                        fragments,
+                    )
+                self._write_json_fragments(path, fragments)
         else:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f)
-
-    def _filter_tests_by_tag(self, items, tag_filter):
-        """
-        Filters tests based on the tag_filter option.
-        Supports filtering by a single tag in the format key:value.
-        Only equality comparison is supported.
-        Returns a tuple of (filtered_items, unfiltered_items).
-        """
-        key, _, value = tag_filter.partition(":")
-
-        filtered_items = []
-        unfiltered_items = []
-        for item in items:
-            # Extract all execution_tag markers and store them in a dict
-            tags = {}
-            markers = item.iter_markers("execution_tag")
-            for tag_marker in markers:
-                # Ensure the marker has exactly two arguments: key and value
-                if len(tag_marker.args) != 2:
-                    continue
-
-                tags[tag_marker.args[0]] = tag_marker.args[1]
-
-            if tags.get(key) == value:
-                filtered_items.append(item)
-            else:
-                unfiltered_items.append(item)
-
-        return filtered_items, unfiltered_items
+            self._write_json_fragments(path, fragments)
+
+    @staticmethod
+    def _write_json_fragments(path, fragments):
+        """Stream JSON fragments out as a single JSON array"""
+        with open(path, "wb") as f:
+            f.write(b"[")
+            for i, fragment in enumerate(fragments):
+                if i > 0:
+                    f.write(b",")
+                f.write(fragment)
+            f.write(b"]")
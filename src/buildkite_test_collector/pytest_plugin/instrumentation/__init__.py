@@ -0,0 +1,30 @@
+"""
+Automatic span capture for common causes of slow tests.
+
+Each instrumentation patches a library (or implements pytest hooks) for the
+duration of the session and records spans or tags against whichever test is
+running at the time.  They are opt-in via `--bk-instrument` and only imported when
+enabled.
+"""
+
+from importlib import import_module
+
+# Names accepted by --bk-instrument, mapped to "module:class"
+INSTRUMENTATIONS = {
+    "http": "http_client:HttpInstrumentation",
+    "sql": "dbapi:DbApiInstrumentation",
+    "sleep": "sleep:SleepInstrumentation",
+    "fixtures": "fixtures:FixtureInstrumentation",
+    "phases": "phases:PhaseInstrumentation",
+    "cpu": "resources:CpuInstrumentation",
+    "memory": "memory:MemoryInstrumentation",
+    "gc": "resources:GcInstrumentation",
+    "io": "resources:IoInstrumentation",
+}
+
+
+def load(name, plugin):
+    """Import and construct the named instrumentation for the plugin"""
+    module_name, class_name = INSTRUMENTATIONS[name].split(":")
+    module = import_module(f".{module_name}", __name__)
+    return getattr(module, class_name)(plugin)
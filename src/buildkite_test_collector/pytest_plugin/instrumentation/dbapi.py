@@ -0,0 +1,188 @@
+"""Automatic sql span capture for DB-API 2.0 drivers"""
+
+import sys
+from functools import wraps
+from importlib import import_module
+
+from ...collector.instant import Instant
+from ..span_collector import SpanCollector
+from ..sql import normalize_query
+
+# Driver modules to instrument, mapped to the name of their connect function.
+# sqlite3 is handled specially, see _instrument_sqlite3.
+DRIVERS = {"sqlite3": "connect"}
+
+
+def register_driver(module_name, connect="connect"):
+    """
+    Instrument another DB-API 2.0 driver, e.g. ``register_driver("psycopg2")``.
+
+    Must be called before the session starts, e.g. at the top of a conftest.py.
+    Connections from registered drivers are wrapped in a proxy which times
+    ``execute`` and ``executemany`` on their cursors.
+    """
+    DRIVERS[module_name] = connect
+
+
+class DbApiInstrumentation:
+    """
+    Records an sql span for each ``execute`` and ``executemany`` call.
+
+    Drivers are instrumented by patching their ``connect`` function, so only
+    connections made after the session starts (and through the module
+    attribute, rather than a ``from driver import connect`` made earlier) are
+    instrumented.  Drivers which aren't installed are skipped.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self._patched = []
+
+    def install(self):
+        """Patch the connect function of each registered driver"""
+        for module_name, connect_name in DRIVERS.items():
+            try:
+                module = import_module(module_name)
+            except ImportError:
+                continue
+
+            if module_name == "sqlite3":
+                instrument = _instrument_sqlite3(self.plugin)
+                self._patch(module, connect_name, instrument)
+                # sqlite3.connect is a re-export of sqlite3.dbapi2.connect
+                self._patch(sys.modules["sqlite3.dbapi2"], connect_name, instrument)
+            else:
+                self._patch(module, connect_name, _instrument_proxy(self.plugin))
+
+    def uninstall(self):
+        """Restore every patched connect function"""
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched = []
+
+    def _patch(self, module, name, instrument):
+        original = getattr(module, name)
+        self._patched.append((module, name, original))
+        setattr(module, name, instrument(original))
+
+
+def _timed(plugin, method, query, *args, **kwargs):
+    collector = SpanCollector.for_current_test(plugin)
+    if collector is None:
+        return method(query, *args, **kwargs)
+
+    start_at = Instant.now()
+    try:
+        return method(query, *args, **kwargs)
+    finally:
+        collector.record_since("sql", start_at, {"query": normalize_query(query)})
+
+
+def _instrument_sqlite3(plugin):
+    """
+    sqlite3 connections and cursors are C types which can't be patched, and
+    code commonly checks isinstance(conn, sqlite3.Connection), so rather than
+    a proxy we pass subclasses as the connection and cursor factories.
+    """
+    import sqlite3  # pylint: disable=import-outside-toplevel
+
+    class Cursor(sqlite3.Cursor):
+        """A sqlite3.Cursor which records sql spans"""
+
+        def execute(self, sql, *args, **kwargs):
+            """Execute and record an sql span"""
+            return _timed(plugin, super().execute, sql, *args, **kwargs)
+
+        def executemany(self, sql, *args, **kwargs):
+            """Execute many and record an sql span"""
+            return _timed(plugin, super().executemany, sql, *args, **kwargs)
+
+    class Connection(sqlite3.Connection):
+        """A sqlite3.Connection whose cursors record sql spans"""
+
+        # pylint: disable-next=arguments-differ,useless-parent-delegation
+        def cursor(self, factory=Cursor):
+            """Return an instrumented cursor by default"""
+            return super().cursor(factory)
+
+        # The C implementations of these bypass cursor(), so redo them here.
+        def execute(self, sql, *args, **kwargs):
+            """Execute on a new instrumented cursor"""
+            return self.cursor().execute(sql, *args, **kwargs)
+
+        def executemany(self, sql, *args, **kwargs):
+            """Execute many on a new instrumented cursor"""
+            return self.cursor().executemany(sql, *args, **kwargs)
+
+    def instrument(original):
+        @wraps(original)
+        def connect(*args, **kwargs):
+            # factory is the sixth positional argument.  Leave connections
+            # with a custom factory alone rather than risk breaking them.
+            if len(args) <= 5 and "factory" not in kwargs:
+                kwargs["factory"] = Connection
+            return original(*args, **kwargs)
+        return connect
+
+    return instrument
+
+
+def _instrument_proxy(plugin):
+    def instrument(original):
+        @wraps(original)
+        def connect(*args, **kwargs):
+            return _ConnectionProxy(original(*args, **kwargs), plugin)
+        return connect
+
+    return instrument
+
+
+class _ConnectionProxy:
+    """Wraps a DB-API connection so its cursors record sql spans"""
+
+    def __init__(self, connection, plugin):
+        self._connection = connection
+        self._plugin = plugin
+
+    def cursor(self, *args, **kwargs):
+        """Return an instrumented cursor"""
+        return _CursorProxy(self._connection.cursor(*args, **kwargs), self._plugin)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._connection.__exit__(*exc_info)
+
+
+class _CursorProxy:
+    """Wraps a DB-API cursor to record sql spans"""
+
+    def __init__(self, cursor, plugin):
+        self._cursor = cursor
+        self._plugin = plugin
+
+    def execute(self, operation, *args, **kwargs):
+        """Execute and record an sql span"""
+        return _timed(self._plugin, self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        """Execute many and record an sql span"""
+        return _timed(self._plugin, self._cursor.executemany, operation, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cursor.__exit__(*exc_info)
@@ -0,0 +1,61 @@
+"""Automatic span capture for fixture setup and teardown"""
+
+import pytest
+
+from ...collector.instant import Instant
+from ..span_collector import SpanCollector
+
+# The content of a fixture's setup annotation starts with this, and is
+# followed by "<name> (<scope>)"
+SETUP_ANNOTATION = "fixture setup: "
+
+
+class FixtureInstrumentation:
+    """
+    Records an annotation span for the setup and the teardown of each fixture.
+
+    Spans are recorded against the test that was running when the fixture
+    was set up or torn down, so the cost of a session or module scoped
+    fixture is charged to the first test which needed it (and its teardown
+    to the last).  The fixture's scope is included in the annotation.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        # Teardown start times, keyed by id(fixturedef)
+        self._teardowns = {}
+
+    def install(self):
+        """Nothing to patch, the fixture hooks below do the work"""
+
+    def uninstall(self):
+        """Forget any teardowns still in progress"""
+        self._teardowns.clear()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):  # pylint: disable=unused-argument
+        """Time the fixture's setup, and arrange to time its teardown"""
+        start_at = Instant.now()
+        yield
+        _record(self.plugin, "setup", fixturedef, start_at)
+
+        # Finalizers run last in, first out, so this runs before the
+        # fixture's own teardown, which pytest_fixture_setup just added.
+        key = id(fixturedef)
+        fixturedef.addfinalizer(lambda: self._teardowns.__setitem__(key, Instant.now()))
+
+    def pytest_fixture_post_finalizer(self, fixturedef, request):  # pylint: disable=unused-argument
+        """Record the fixture's teardown"""
+        start_at = self._teardowns.pop(id(fixturedef), None)
+        if start_at is not None:
+            _record(self.plugin, "teardown", fixturedef, start_at)
+
+
+def _record(plugin, phase, fixturedef, start_at):
+    collector = SpanCollector.for_current_test(plugin)
+    if collector is None:
+        return
+
+    collector.record_since("annotation", start_at, {
+        "content": f"fixture {phase}: {fixturedef.argname} ({fixturedef.scope})",
+    })
@@ -0,0 +1,94 @@
+"""Automatic http span capture for http.client, and so urllib3 and requests"""
+
+import http.client
+from functools import wraps
+
+from ...collector.instant import Instant
+from ..span_collector import SpanCollector
+
+# Set on a connection between putrequest and getresponse
+_PENDING_ATTR = "_buildkite_pending_span"
+
+
+class HttpInstrumentation:
+    """
+    Records an http span for each request made through `http.client`.
+
+    urllib3 (and so requests) connections are subclasses of
+    `http.client.HTTPConnection` which call up to its `putrequest` and
+    `getresponse`, so patching those two methods covers all three libraries.
+    A span runs from the request line being sent until the response headers
+    have been received.  Query strings are dropped from the recorded url, as
+    they're unbounded in size and often carry credentials.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self._originals = None
+
+    def install(self):
+        """Patch http.client.HTTPConnection"""
+        if self._originals is not None:
+            return
+
+        cls = http.client.HTTPConnection
+        self._originals = (cls.putrequest, cls.getresponse)
+        original_putrequest, original_getresponse = self._originals
+        plugin = self.plugin
+
+        @wraps(original_putrequest)
+        def putrequest(conn, method, url, *args, **kwargs):
+            if plugin.current_nodeid is not None:
+                setattr(conn, _PENDING_ATTR, (Instant.now(), method, url))
+            return original_putrequest(conn, method, url, *args, **kwargs)
+
+        @wraps(original_getresponse)
+        def getresponse(conn, *args, **kwargs):
+            try:
+                return original_getresponse(conn, *args, **kwargs)
+            finally:
+                pending = conn.__dict__.pop(_PENDING_ATTR, None)
+                if pending is not None:
+                    _record(plugin, conn, *pending)
+
+        cls.putrequest = putrequest
+        cls.getresponse = getresponse
+
+    def uninstall(self):
+        """Restore http.client.HTTPConnection"""
+        if self._originals is None:
+            return
+
+        cls = http.client.HTTPConnection
+        cls.putrequest, cls.getresponse = self._originals
+        self._originals = None
+
+
+def _record(plugin, conn, start_at, method, url):
+    collector = SpanCollector.for_current_test(plugin)
+    if collector is None:
+        return
+
+    collector.record_since("http", start_at, {
+        "method": method, "url": _full_url(conn, url), "lib": _lib(conn),
+    })
+
+
+def _full_url(conn, url):
+    url = url.split("?", 1)[0]
+    if "://" in url:
+        # Already absolute, e.g. when talking to a proxy
+        return url
+
+    scheme = "https" if conn.default_port == http.client.HTTPS_PORT else "http"
+    host = conn.host
+    if ":" in host:
+        host = f"[{host}]"
+    if conn.port and conn.port != conn.default_port:
+        host = f"{host}:{conn.port}"
+    return f"{scheme}://{host}{url}"
+
+
+def _lib(conn):
+    package = type(conn).__module__.split(".", 1)[0]
+    return "http.client" if package == "http" else package
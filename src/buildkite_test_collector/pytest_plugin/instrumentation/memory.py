@@ -0,0 +1,146 @@
+"""Per-test memory usage tags, and optional allocation tracing"""
+
+import os
+import sys
+import tracemalloc
+import zlib
+from datetime import timedelta
+
+import pytest
+
+from ...collector.instant import Instant
+from ...collector.payload import TestSpan
+from .resources import ResourceInstrumentation, resource
+
+# How many allocation sites to list for each traced test
+TOP_ALLOCATIONS = 5
+
+# Allocations made by tracemalloc itself or the import system aren't interesting
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryInstrumentation(ResourceInstrumentation):
+    """
+    Tags each test with how the process's memory changed while it ran:
+
+    - ``test.rss_delta_bytes``: the change in resident set size, from
+      ``/proc/self/statm``.  Tests which leak show up as consistently
+      positive.
+    - ``test.maxrss_delta_bytes``: how far the test pushed up the process's
+      high-water mark, from `resource`.  Non-zero only for tests which used
+      more memory than any before them.
+
+    Reading these is cheap, so every test is tagged.  Tracing allocations
+    with `tracemalloc` is not, so it's only done for the fraction of tests
+    given by ``--bk-tracemalloc-rate``, chosen by a hash of their nodeid so
+    the same tests are traced on every run.  Traced tests are also tagged with
+    ``test.tracemalloc_peak_bytes`` and get an annotation listing the
+    allocation sites holding the most memory at the end of the test.
+    """
+
+    def __init__(self, plugin):
+        super().__init__(plugin)
+        self.tracemalloc_rate = 0.0
+        # Traced tests, keyed by TestData.id, mapped to the snapshot taken
+        # when they started if tracemalloc was already tracing, else None.
+        self._traced = {}
+
+    def uninstall(self):
+        super().uninstall()
+        # Stop tracing if we started it for a test that never finished
+        if None in self._traced.values():
+            tracemalloc.stop()
+        self._traced.clear()
+
+    def pytest_configure(self, config):
+        """Read the tracing rate"""
+        self.tracemalloc_rate = config.option.tracemalloc_rate
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_logstart(self, nodeid, location):
+        """Start tracing sampled tests, and snapshot the counters"""
+        test_data = self.plugin.in_flight.get(nodeid)
+        if test_data is not None and _sampled(nodeid, self.tracemalloc_rate):
+            if tracemalloc.is_tracing():
+                baseline = tracemalloc.take_snapshot()
+                tracemalloc.reset_peak()
+            else:
+                baseline = None
+                tracemalloc.start()
+            self._traced[test_data.id] = baseline
+
+        super().pytest_runtest_logstart(nodeid, location)
+
+    def _finalize(self, test_data):
+        if test_data.id in self._traced:
+            test_data = self._stop_tracing(test_data, self._traced.pop(test_data.id))
+        return super()._finalize(test_data)
+
+    def _stop_tracing(self, test_data, baseline):
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        if baseline is None:
+            tracemalloc.stop()
+            sites = [(stat.traceback[0], stat.size, stat.count)
+                     for stat in snapshot.statistics("lineno")]
+        else:
+            diffs = snapshot.compare_to(baseline.filter_traces(_TRACE_FILTERS), "lineno")
+            sites = sorted(((stat.traceback[0], stat.size_diff, stat.count_diff)
+                            for stat in diffs if stat.size_diff > 0),
+                           key=lambda site: site[1], reverse=True)
+
+        test_data = test_data.tag_execution("test.tracemalloc_peak_bytes", str(peak))
+        if not sites:
+            return test_data
+
+        lines = [f"{frame.filename}:{frame.lineno}: {size} bytes in {count} blocks"
+                 for frame, size, count in sites[:TOP_ALLOCATIONS]]
+        now = Instant.now()
+        return test_data.push_span(TestSpan(
+            section="annotation",
+            start_at=now,
+            end_at=now,
+            duration=timedelta(0),
+            detail={"content": "top allocations:\n" + "\n".join(lines)},
+        ))
+
+    def snapshot(self):
+        return (_rss_bytes(), _maxrss_bytes())
+
+    def tags(self, before, after):
+        tags = {}
+        if before[0] is not None and after[0] is not None:
+            tags["test.rss_delta_bytes"] = str(after[0] - before[0])
+        if before[1] is not None and after[1] is not None:
+            tags["test.maxrss_delta_bytes"] = str(after[1] - before[1])
+        return tags
+
+
+def _sampled(nodeid, rate):
+    if rate <= 0:
+        return False
+    if rate >= 1:
+        return True
+    return zlib.crc32(nodeid.encode("utf-8")) / 0xFFFFFFFF < rate
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _maxrss_bytes():
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes everywhere else
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
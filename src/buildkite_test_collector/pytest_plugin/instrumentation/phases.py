@@ -0,0 +1,51 @@
+"""Setup, call and teardown phase timings"""
+
+import time
+from datetime import timedelta
+
+import pytest
+
+from ...collector.instant import Instant
+from ...collector.payload import TestSpan
+from ..span_collector import SpanCollector
+
+
+class PhaseInstrumentation:
+    """
+    Records an annotation span for each of a test's setup, call and teardown
+    phases, and tags the test with the duration of each, e.g.
+    ``test.setup_seconds``.
+
+    The timings come from the CallInfo passed to
+    `pytest_runtest_makereport`, which is what each phase's report copies its
+    start and stop from.  The reports themselves can't be used as the plugin
+    finalizes a test before its teardown report is logged.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def install(self):
+        """Nothing to patch, the makereport hook below does the work"""
+
+    def uninstall(self):
+        """Nothing to restore"""
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_makereport(self, item, call):
+        """Record the phase, before the plugin finalizes the test after teardown"""
+        test_data = self.plugin.in_flight.get(item.nodeid)
+        if test_data is None:
+            return
+
+        # CallInfo times are wall clock, spans are monotonic
+        offset = time.monotonic() - time.time()
+        SpanCollector(nodeid=item.nodeid, plugin=self.plugin).record(TestSpan(
+            section="annotation",
+            start_at=Instant(seconds=call.start + offset),
+            end_at=Instant(seconds=call.stop + offset),
+            duration=timedelta(seconds=call.duration),
+            detail={"content": f"phase: {call.when}"},
+        ))
+        self.plugin.in_flight[item.nodeid] = test_data.tag_execution(
+            f"test.{call.when}_seconds", f"{call.duration:.6f}")
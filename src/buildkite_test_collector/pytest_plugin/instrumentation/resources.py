@@ -0,0 +1,210 @@
+"""Per-test resource usage tags"""
+
+import gc
+import time
+from abc import ABC, abstractmethod
+
+import pytest
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class ResourceInstrumentation(ABC):
+    """
+    Base for instrumentations which tag each test with how much some
+    counters changed while it ran.
+
+    Counters are snapshotted when the test starts (after the plugin has
+    created its TestData) and again when the plugin finalizes it, after
+    teardown.  Subclasses implement `snapshot` and `tags`.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        # Snapshots taken at the start of each in-flight test, keyed by TestData.id
+        self._before = {}
+
+    def install(self):
+        """Start tagging tests as they are finalized"""
+        self.plugin.finalize_hooks.append(self._finalize)
+
+    def uninstall(self):
+        """Stop tagging tests"""
+        if self._finalize in self.plugin.finalize_hooks:
+            self.plugin.finalize_hooks.remove(self._finalize)
+        self._before.clear()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_logstart(self, nodeid, location):  # pylint: disable=unused-argument
+        """Snapshot the counters as the test starts"""
+        test_data = self.plugin.in_flight.get(nodeid)
+        if test_data is not None:
+            self._before[test_data.id] = self.snapshot()
+
+    def _finalize(self, test_data):
+        before = self._before.pop(test_data.id, None)
+        if before is None:
+            return test_data
+
+        for key, value in self.tags(before, self.snapshot()).items():
+            test_data = test_data.tag_execution(key, value)
+        return test_data
+
+    @abstractmethod
+    def snapshot(self):
+        """Read the counters"""
+
+    @abstractmethod
+    def tags(self, before, after):
+        """The tags for a test, given snapshots from its start and end"""
+
+
+class CpuInstrumentation(ResourceInstrumentation):
+    """
+    Tags each test with the CPU time the process spent running it, so tests
+    which are CPU bound can be told apart from those waiting on I/O or locks:
+
+    - ``test.cpu_seconds``: CPU time used by every thread of the process.
+    - ``test.cpu_thread_seconds``: CPU time used by the thread running the test.
+    - ``test.cpu_user_seconds`` and ``test.cpu_system_seconds``: the split
+      between user and kernel mode, where `resource` is available.
+    - ``test.cpu_utilization``: CPU time over wall time.  Close to (or above)
+      1 for CPU bound tests, close to 0 for tests which mostly wait.
+    """
+
+    def snapshot(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF) if resource is not None else None
+        return (time.monotonic(), time.process_time_ns(), time.thread_time_ns(), usage)
+
+    def tags(self, before, after):
+        wall = after[0] - before[0]
+        cpu = (after[1] - before[1]) / 1e9
+        tags = {
+            "test.cpu_seconds": seconds(cpu),
+            "test.cpu_thread_seconds": seconds((after[2] - before[2]) / 1e9),
+        }
+        if after[3] is not None:
+            tags["test.cpu_user_seconds"] = seconds(after[3].ru_utime - before[3].ru_utime)
+            tags["test.cpu_system_seconds"] = seconds(after[3].ru_stime - before[3].ru_stime)
+        if wall > 0:
+            tags["test.cpu_utilization"] = f"{cpu / wall:.3f}"
+        return tags
+
+
+class GcInstrumentation(ResourceInstrumentation):
+    """
+    Tags each test with the garbage collection it triggered, so that the
+    test which happened to trigger a slow full collection of a huge heap can
+    be told apart from one that is slow itself:
+
+    - ``test.gc_pause_seconds``: total time spent collecting.
+    - ``test.gc_gen0_collections``, ``test.gc_gen1_collections`` and
+      ``test.gc_gen2_collections``: the number of collections of each
+      generation.
+    - ``test.gc_collected``: the number of unreachable objects found.
+    """
+
+    def __init__(self, plugin):
+        super().__init__(plugin)
+        # Running totals since install, updated by _callback
+        self._pause = 0.0
+        self._collections = [0] * len(gc.get_count())
+        self._collected = 0
+        self._started_at = None
+
+    def install(self):
+        super().install()
+        gc.callbacks.append(self._callback)
+
+    def uninstall(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+        super().uninstall()
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._started_at = time.perf_counter()
+        elif self._started_at is not None:
+            self._pause += time.perf_counter() - self._started_at
+            self._started_at = None
+            self._collections[info["generation"]] += 1
+            self._collected += info["collected"]
+
+    def snapshot(self):
+        return (self._pause, tuple(self._collections), self._collected)
+
+    def tags(self, before, after):
+        tags = {"test.gc_pause_seconds": seconds(after[0] - before[0])}
+        for generation, (start, end) in enumerate(zip(before[1], after[1])):
+            tags[f"test.gc_gen{generation}_collections"] = str(end - start)
+        tags["test.gc_collected"] = str(after[2] - before[2])
+        return tags
+
+
+class IoInstrumentation(ResourceInstrumentation):
+    """
+    Tags each test with the I/O the process did while it ran, to find tests
+    which hammer the filesystem:
+
+    - ``test.io_read_bytes`` and ``test.io_write_bytes``: bytes actually
+      read from or written to storage, from ``/proc/self/io`` (Linux only).
+    - ``test.io_read_syscalls`` and ``test.io_write_syscalls``: read and
+      write system calls, including those served by the page cache.
+    - ``test.voluntary_context_switches`` and
+      ``test.involuntary_context_switches``: from `resource`.  Many voluntary
+      switches means the test spends its time blocked waiting.
+    """
+
+    # Tags for the /proc/self/io fields we report
+    IO_FIELDS = {
+        b"read_bytes": "test.io_read_bytes",
+        b"write_bytes": "test.io_write_bytes",
+        b"syscr": "test.io_read_syscalls",
+        b"syscw": "test.io_write_syscalls",
+    }
+
+    def snapshot(self):
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            switches = (usage.ru_nvcsw, usage.ru_nivcsw)
+        else:
+            switches = None
+        return (_read_proc_io(), switches)
+
+    def tags(self, before, after):
+        tags = {}
+        if before[0] is not None and after[0] is not None:
+            for field, tag in self.IO_FIELDS.items():
+                if field in before[0] and field in after[0]:
+                    tags[tag] = str(after[0][field] - before[0][field])
+        if before[1] is not None:
+            tags["test.voluntary_context_switches"] = str(after[1][0] - before[1][0])
+            tags["test.involuntary_context_switches"] = str(after[1][1] - before[1][1])
+        return tags
+
+
+def _read_proc_io():
+    """The counters in /proc/self/io, or None where it isn't available"""
+    try:
+        with open("/proc/self/io", "rb") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    counters = {}
+    for line in lines:
+        name, _, value = line.partition(b":")
+        try:
+            counters[name] = int(value)
+        except ValueError:
+            continue
+    return counters
+
+
+def seconds(value):
+    """Format a number of seconds as a tag value"""
+    return f"{value:.6f}"
@@ -0,0 +1,100 @@
+"""Automatic sleep span capture for time.sleep and asyncio.sleep"""
+
+import asyncio
+import time
+from functools import wraps
+
+from ...collector.instant import Instant
+from ..span_collector import SpanCollector
+
+# Tag holding the total seconds a test spent sleeping
+TOTAL_TAG = "test.sleep_seconds"
+
+
+class SleepInstrumentation:
+    """
+    Records a sleep span for each call to `time.sleep` or `asyncio.sleep`,
+    and tags each test with the total time it spent asleep.
+
+    Only calls made through the module attributes are seen, so a
+    ``from time import sleep`` made before the session started is missed.
+    Zero and negative delays are ignored, as ``asyncio.sleep(0)`` is the
+    idiomatic way to yield to the event loop rather than a real sleep.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self._patched = []
+
+    def install(self):
+        """Patch time.sleep and asyncio.sleep"""
+        if self._patched:
+            return
+
+        self.plugin.finalize_hooks.append(_tag_total)
+
+        time_sleep = _instrument_sync(self.plugin, time.sleep)
+        asyncio_sleep = _instrument_async(self.plugin, asyncio.sleep)
+        for module, instrumented in ((time, time_sleep),
+                                     (asyncio, asyncio_sleep),
+                                     (asyncio.tasks, asyncio_sleep)):
+            self._patched.append((module, module.sleep))
+            module.sleep = instrumented
+
+    def uninstall(self):
+        """Restore time.sleep and asyncio.sleep"""
+        if not self._patched:
+            return
+
+        for module, original in reversed(self._patched):
+            module.sleep = original
+        self._patched = []
+        self.plugin.finalize_hooks.remove(_tag_total)
+
+
+def _tag_total(test_data):
+    """Tag the test with the total duration of its sleep spans"""
+    total = sum(span.duration.total_seconds()
+                for span in test_data.history.children
+                if span.section == "sleep")
+    if total == 0:
+        return test_data
+    return test_data.tag_execution(TOTAL_TAG, f"{total:.6f}")
+
+
+def _instrument_sync(plugin, original):
+    @wraps(original)
+    def sleep(seconds):
+        collector = _collector(plugin, seconds)
+        if collector is None:
+            return original(seconds)
+
+        start_at = Instant.now()
+        try:
+            return original(seconds)
+        finally:
+            collector.record_since("sleep", start_at)
+
+    return sleep
+
+
+def _instrument_async(plugin, original):
+    @wraps(original)
+    async def sleep(delay, *args, **kwargs):
+        collector = _collector(plugin, delay)
+        if collector is None:
+            return await original(delay, *args, **kwargs)
+
+        start_at = Instant.now()
+        try:
+            return await original(delay, *args, **kwargs)
+        finally:
+            collector.record_since("sleep", start_at)
+
+    return sleep
+
+
+def _collector(plugin, delay):
+    if delay <= 0:
+        return None
+    return SpanCollector.for_current_test(plugin)
@@ -0,0 +1,14 @@
+"""Values accepted by the collector's command line options.
+
+Kept apart from the features themselves, so that adding the options on
+every pytest start doesn't import them.
+"""
+
+# Values accepted by --bk-order
+ORDERS = ("tests", "files")
+
+# Values accepted by --bk-split
+SPLITS = ("tests", "files")
+
+# Values accepted by --bk-xdist-schedule
+SCHEDULES = ("tests", "files")
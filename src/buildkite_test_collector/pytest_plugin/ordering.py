@@ -0,0 +1,48 @@
+"""Reordering tests using their history"""
+
+import statistics
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from ..collector.history import TestStats
+
+
+def order_items(items: List, stats: Dict[str, "TestStats"], order: str) -> None:
+    """
+    Reorder items in place: tests which failed last time first, then the
+    longest running first, so that failures are reported sooner and one slow
+    test collected last can't hold up a parallel run on its own.
+
+    With the "files" order, whole files are moved with their tests kept
+    together and in their original order, so module and class scoped
+    fixtures are only set up once.  With "tests", every test is ordered on
+    its own.  Either way the result only depends on the collected items and
+    the history, and ties keep their collection order.
+
+    Tests with no history are expected to take the median duration.
+    """
+    known = [s.ewma for s in stats.values()]
+    default = statistics.median(known) if known else 0.0
+
+    def expected(item):
+        item_stats = stats.get(item.nodeid)
+        return item_stats.ewma if item_stats is not None else default
+
+    def failed(item):
+        item_stats = stats.get(item.nodeid)
+        return item_stats is not None and item_stats.last_result == "failed"
+
+    if order == "tests":
+        keyed = [((not failed(item), -expected(item), index), [item])
+                 for index, item in enumerate(items)]
+    else:
+        files = {}
+        for item in items:
+            files.setdefault(item.nodeid.split("::", 1)[0], []).append(item)
+        keyed = [((not any(failed(item) for item in file_items),
+                   -sum(expected(item) for item in file_items),
+                   index), file_items)
+                 for index, file_items in enumerate(files.values())]
+
+    keyed.sort(key=lambda pair: pair[0])
+    items[:] = [item for _, group in keyed for item in group]
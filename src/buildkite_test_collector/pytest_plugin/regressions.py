@@ -0,0 +1,93 @@
+"""Flagging tests which took significantly longer than usual"""
+
+from typing import Dict, List, Optional, Tuple
+
+from ..collector.history import History, result_name
+from ..collector.regression import Baseline
+from .buildkite_plugin import _is_subtest_report
+
+# How many of a test's recent runs make up its baseline
+WINDOW = 30
+
+TAG = "perf.regression"
+BASELINE_TAG = "perf.baseline_seconds"
+
+
+class RegressionReport:
+    """
+    Compares each test's duration with its baseline from --bk-history,
+    tags the tests which were significantly slower with
+    ``perf.regression=true``, and lists them in the terminal summary.
+
+    Where tests run (i.e. not the xdist controller) this is a BuildkitePlugin
+    finalize hook, checking the test's own duration.  The xdist controller
+    has no TestData of its own, so it checks the durations in pytest's
+    reports instead.  Either way the baseline is read before the test's own
+    result is added to the history.
+    """
+
+    def __init__(self, history: History, from_reports: bool = False):
+        self.history = history
+        self.from_reports = from_reports
+        # (duration, nodeid, baseline) of each regression, in finishing order
+        self.regressions: List[Tuple[float, str, Baseline]] = []
+        # Durations of the phases run so far of each test, or None once a
+        # phase is skipped, as skipped tests aren't timed by the history
+        self._running: Dict[str, Optional[float]] = {}
+
+    def check(self, nodeid: str, duration: float) -> Optional[Baseline]:
+        """The test's baseline if the duration is a regression, else None"""
+        baseline = Baseline.from_durations(self.history.durations(nodeid, WINDOW))
+        if baseline is None or not baseline.is_regression(duration):
+            return None
+
+        self.regressions.append((duration, nodeid, baseline))
+        return baseline
+
+    def finalize_test(self, test_data):
+        """A BuildkitePlugin finalize hook tagging the test if it regressed"""
+        if result_name(test_data) not in ("passed", "failed"):
+            return test_data
+
+        nodeid = f"{test_data.scope}::{test_data.name}" if test_data.scope else test_data.name
+        baseline = self.check(nodeid, test_data.history.duration.total_seconds())
+        if baseline is None:
+            return test_data
+        return (test_data
+                .tag_execution(TAG, "true")
+                .tag_execution(BASELINE_TAG, f"{baseline.median:.6f}"))
+
+    def pytest_runtest_logreport(self, report):
+        """In the xdist controller, check each test's total duration"""
+        if not self.from_reports or _is_subtest_report(report):
+            return
+        if report.when not in ("setup", "call", "teardown"):
+            return
+
+        duration = self._running.pop(report.nodeid, 0.0)
+        if duration is None or report.skipped:
+            if report.when != "teardown":
+                self._running[report.nodeid] = None
+            return
+
+        duration += report.duration
+        if report.when != "teardown":
+            self._running[report.nodeid] = duration
+        else:
+            self.check(report.nodeid, duration)
+
+    def close(self):
+        """Close the history, if it was opened for the xdist controller"""
+        if self.from_reports:
+            self.history.close()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """List the regressions"""
+        terminalreporter.write_sep("=", "duration regressions (buildkite)")
+        if not self.regressions:
+            terminalreporter.write_line("none")
+        for duration, nodeid, baseline in self.regressions:
+            terminalreporter.write_line(
+                f"{duration:8.2f}s {nodeid} (usually {baseline.median:.2f}s, "
+                f"{baseline.score(duration):.1f} deviations slower)"
+            )
@@ -0,0 +1,103 @@
+"""Flush collected results when the test run is terminated"""
+
+import os
+import signal
+import tempfile
+import threading
+from typing import Optional
+
+from ..collector.checkpoint import Checkpoint
+from ..collector.payload import Payload
+from .logger import logger
+
+
+class SigtermFlusher:
+    """
+    A chained SIGTERM handler which uploads whatever has been collected.
+
+    Buildkite cancels a job by sending it SIGTERM, which kills pytest before
+    pytest_unconfigure (and so the upload) runs.  This handler marks in-flight
+    tests as interrupted and uploads the results in one compressed request.
+    If that doesn't succeed within the time budget the results are written to
+    a checkpoint instead, to be uploaded by a later run.  The previously
+    installed handler is then called, so the process still terminates.
+    """
+
+    DEFAULT_BUDGET = 5.0
+
+    # Where results are saved if there is no --bk-checkpoint-dir
+    FALLBACK_CHECKPOINT_DIR = os.path.join(
+        tempfile.gettempdir(), "buildkite-test-collector-checkpoints"
+    )
+
+    def __init__(self, plugin, api, checkpoint_dir: Optional[str] = None,
+                 budget: float = DEFAULT_BUDGET):
+        self.plugin = plugin
+        self.api = api
+        self.checkpoint_dir = checkpoint_dir
+        self.budget = budget
+        self._previous = None
+        self._installed = False
+
+    def install(self) -> bool:
+        """Install the handler.  Only possible from the main thread."""
+        if not hasattr(signal, "SIGTERM") or \
+                threading.current_thread() is not threading.main_thread():
+            return False
+
+        self._previous = signal.signal(signal.SIGTERM, self)
+        self._installed = True
+        return True
+
+    def uninstall(self) -> None:
+        """Restore the previous handler"""
+        if self._installed:
+            signal.signal(signal.SIGTERM, self._previous)
+            self._installed = False
+
+    def __call__(self, signum, frame):
+        self.uninstall()
+        logger.warning("Received SIGTERM, flushing test results")
+
+        try:
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to flush test results")
+
+        self._chain(signum, frame)
+
+    def flush(self) -> None:
+        """Finalize in-flight tests and upload, or save, everything collected"""
+        plugin = self.plugin
+        plugin.interrupt("Interrupted by SIGTERM")
+
+        payload = plugin.upload_payload
+        if self.api.submit_compressed(payload, timeout=self.budget):
+            if plugin.checkpoint is not None:
+                plugin.checkpoint.remove()
+        elif plugin.checkpoint is not None:
+            # Everything is already in the checkpoint, make it recoverable
+            plugin.checkpoint.close()
+            logger.warning("Test results saved to %s", plugin.checkpoint.prefix)
+        else:
+            directory = self.checkpoint_dir or self.FALLBACK_CHECKPOINT_DIR
+            checkpoint = Checkpoint.save(directory, payload)
+            logger.warning(
+                "Test results saved to %s, run with --bk-checkpoint-dir=%s to upload them",
+                checkpoint.prefix, directory
+            )
+
+        # Everything has been dealt with, don't submit it again if the run
+        # somehow carries on to pytest_unconfigure.
+        plugin.checkpoint = None
+        plugin.close()
+        plugin.payload = Payload.init(payload.run_env)
+
+    def _chain(self, signum, frame):
+        previous = self._previous
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # SIG_DFL (or unknown): terminate as if we had never intercepted it
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
@@ -0,0 +1,121 @@
+"""Duration percentiles of the whole suite, and of each file, scope and tag"""
+
+import json
+import os
+from typing import Dict
+
+import pytest
+
+from ..collector.history import result_name
+from ..collector.sketch import DDSketch
+from .slowest import TopN
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Tags added by the collector itself rather than with execution_tag markers
+RESERVED_TAG_PREFIXES = ("test.", "perf.")
+
+# The key of the sketches in an xdist worker's workeroutput
+WORKEROUTPUT_KEY = "buildkite_sketches"
+
+# How many files the terminal summary lists
+SUMMARY_FILES = 5
+
+
+class DurationSketches:
+    """
+    Keeps a DDSketch of test durations for the whole suite and for each
+    file, scope and execution tag, as ``suite``, ``file:<path>``,
+    ``scope:<scope>`` and ``tag:<key>=<value>``.
+
+    Tests are added by a BuildkitePlugin finalize hook where they run.  xdist
+    workers hand their sketches to the controller in their workeroutput,
+    and the controller merges them, writes them out as JSON (merging with
+    the file if it already exists, e.g. from an earlier parallel job) and
+    summarises them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sketches: Dict[str, DDSketch] = {}
+
+    def _add(self, group, duration):
+        sketch = self.sketches.get(group)
+        if sketch is None:
+            sketch = self.sketches[group] = DDSketch()
+        sketch.add(duration)
+
+    def finalize_test(self, test_data):
+        """A BuildkitePlugin finalize hook adding the test's duration to its sketches"""
+        if result_name(test_data) not in ("passed", "failed"):
+            return test_data
+
+        duration = test_data.history.duration.total_seconds()
+        self._add("suite", duration)
+        self._add(f"file:{test_data.file_name}", duration)
+        if test_data.scope:
+            self._add(f"scope:{test_data.scope}", duration)
+        for key, value in test_data.tags.items():
+            if not key.startswith(RESERVED_TAG_PREFIXES):
+                self._add(f"tag:{key}={value}", duration)
+        return test_data
+
+    def merge(self, data: Dict[str, dict]) -> None:
+        """Merge in sketches serialised with as_json"""
+        for group, sketch_data in data.items():
+            sketch = DDSketch.from_json(sketch_data)
+            if group in self.sketches:
+                self.sketches[group].merge(sketch)
+            else:
+                self.sketches[group] = sketch
+
+    def as_json(self) -> Dict[str, dict]:
+        """Convert into a Dict suitable for JSON serialization"""
+        return {group: sketch.as_json() for group, sketch in self.sketches.items()}
+
+    def save(self) -> None:
+        """Write the sketches to the path, merged with any already there"""
+        # Only loaded when needed, as it's slow to import
+        from filelock import FileLock  # pylint: disable=import-outside-toplevel
+
+        with FileLock(f"{self.path}.lock"):
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.merge(json.load(f))
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.as_json(), f)
+
+    def pytest_sessionfinish(self, session):
+        """In an xdist worker, hand the sketches to the controller"""
+        workeroutput = getattr(session.config, "workeroutput", None)
+        if workeroutput is not None:
+            workeroutput[WORKEROUTPUT_KEY] = self.as_json()
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):  # pylint: disable=unused-argument
+        """In the xdist controller, merge a finished worker's sketches"""
+        data = getattr(node, "workeroutput", {}).get(WORKEROUTPUT_KEY)
+        if data:
+            self.merge(data)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """Summarise the suite's and the slowest files' percentiles"""
+        write_line = terminalreporter.write_line
+        terminalreporter.write_sep("=", "duration percentiles (buildkite)")
+        suite = self.sketches.get("suite")
+        if suite is None:
+            write_line("no timed tests")
+            return
+
+        write_line(_summary(suite, "all tests"))
+        slowest = TopN(SUMMARY_FILES)
+        for group, sketch in self.sketches.items():
+            if group.startswith("file:"):
+                slowest.push(sketch.quantile(0.95), group[len("file:"):])
+        for _, file_name in slowest.largest():
+            write_line(_summary(self.sketches[f"file:{file_name}"], file_name))
+
+
+def _summary(sketch, name):
+    quantiles = "  ".join(f"p{round(q * 100)}={sketch.quantile(q):.3f}s" for q in QUANTILES)
+    return f"{quantiles}  n={sketch.count}  {name}"
@@ -0,0 +1,103 @@
+"""A terminal summary of the slowest tests, files and fixtures"""
+
+import heapq
+from typing import Dict, List, Tuple
+
+from .buildkite_plugin import _is_subtest_report
+from .instrumentation.fixtures import SETUP_ANNOTATION
+
+PHASES = ("setup", "call", "teardown")
+
+
+class TopN:
+    """The n largest (value, key) pairs pushed, kept in a bounded min-heap"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self._heap: List[Tuple[float, str]] = []
+
+    def push(self, value: float, key: str) -> None:
+        """Offer a value, keeping it if it is one of the n largest so far"""
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, (value, key))
+        elif (value, key) > self._heap[0]:
+            heapq.heapreplace(self._heap, (value, key))
+
+    def largest(self) -> List[Tuple[float, str]]:
+        """The kept pairs, largest first"""
+        return sorted(self._heap, reverse=True)
+
+
+class SlowestReport:
+    """
+    Adds a section to pytest's terminal summary listing the slowest tests,
+    files and fixtures of the run, and how the run's time was split between
+    setup, call and teardown.
+
+    Test and phase durations come from pytest's reports, which reach the
+    xdist controller, and are kept in bounded heaps as tests finish rather
+    than sorted at the end.  Fixture durations come from the annotation
+    spans recorded by the fixtures instrumentation, so are only reported
+    with --bk-instrument=fixtures and without xdist.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.files: Dict[str, float] = {}
+        self.fixtures: Dict[str, float] = {}
+        self._tests = TopN(count)
+        self._running: Dict[str, float] = {}
+
+    def pytest_runtest_logreport(self, report):
+        """Add the phase's duration to its test, file and phase totals"""
+        if report.when not in self.phases or _is_subtest_report(report):
+            return
+
+        self.phases[report.when] += report.duration
+        file_name = report.nodeid.split("::", 1)[0]
+        self.files[file_name] = self.files.get(file_name, 0.0) + report.duration
+        duration = self._running.get(report.nodeid, 0.0) + report.duration
+        if report.when != "teardown":
+            self._running[report.nodeid] = duration
+            return
+
+        self._running.pop(report.nodeid, 0.0)
+        self._tests.push(duration, report.nodeid)
+
+    def finalize_test(self, test_data):
+        """A BuildkitePlugin finalize hook adding up the test's fixture setups"""
+        for span in test_data.history.children:
+            content = (span.detail or {}).get("content", "")
+            if span.section == "annotation" and content.startswith(SETUP_ANNOTATION):
+                fixture = content[len(SETUP_ANNOTATION):]
+                self.fixtures[fixture] = (self.fixtures.get(fixture, 0.0)
+                                          + span.duration.total_seconds())
+        return test_data
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """Write the report"""
+        write_sep, write_line = terminalreporter.write_sep, terminalreporter.write_line
+
+        write_sep("=", f"slowest {self.count} tests (buildkite)")
+        for duration, nodeid in self._tests.largest():
+            write_line(f"{duration:8.2f}s {nodeid}")
+
+        write_sep("-", f"slowest {self.count} files")
+        for duration, file_name in heapq.nlargest(self.count, _pairs(self.files)):
+            write_line(f"{duration:8.2f}s {file_name}")
+
+        if self.fixtures:
+            write_sep("-", f"slowest {self.count} fixture setups")
+            for duration, fixture in heapq.nlargest(self.count, _pairs(self.fixtures)):
+                write_line(f"{duration:8.2f}s {fixture}")
+
+        write_sep("-", "time by phase")
+        total = sum(self.phases.values())
+        for phase, duration in self.phases.items():
+            share = duration / total if total else 0.0
+            write_line(f"{duration:8.2f}s {phase} ({share:.0%})")
+
+
+def _pairs(totals):
+    return ((value, key) for key, value in totals.items())
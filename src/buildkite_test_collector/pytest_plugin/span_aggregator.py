@@ -0,0 +1,132 @@
+"""Folds high-frequency spans into summaries to bound payload size"""
+
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..collector.instant import Instant
+from ..collector.payload import TestSpan
+from .span_buffer import SpanBuffer
+from .sql import normalize_query
+
+
+@dataclass
+class SpanAggregate:
+    """Running count and duration summary of spans that look the same"""
+
+    # pylint: disable=too-many-instance-attributes
+
+    section: str
+    detail: Optional[Dict[str, str]]
+    count: int
+    total: timedelta
+    minimum: timedelta
+    maximum: timedelta
+    start_at: Optional[Instant]
+    end_at: Optional[Instant]
+
+    @classmethod
+    def from_span(cls, span: TestSpan, detail: Optional[Dict[str, str]]) -> "SpanAggregate":
+        """Start an aggregate from its first span"""
+        return cls(section=span.section, detail=detail, count=1,
+                   total=span.duration, minimum=span.duration, maximum=span.duration,
+                   start_at=span.start_at, end_at=span.end_at)
+
+    def add(self, span: TestSpan) -> None:
+        """Fold another span into the summary"""
+        self.count += 1
+        self.total += span.duration
+        self.minimum = min(self.minimum, span.duration)
+        self.maximum = max(self.maximum, span.duration)
+        if span.end_at is not None:
+            self.end_at = span.end_at
+
+    def merge(self, other: "SpanAggregate") -> None:
+        """Fold another aggregate of the same spans, e.g. from another thread, into this one"""
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.start_at = _earliest(self.start_at, other.start_at)
+        self.end_at = _latest(self.end_at, other.end_at)
+
+    def spans(self) -> Tuple[TestSpan, ...]:
+        """
+        A span covering every folded span, whose duration is their total,
+        followed by an annotation describing the summary.
+        """
+        span = TestSpan(section=self.section, detail=self.detail, duration=self.total,
+                        start_at=self.start_at, end_at=self.end_at)
+        if self.count == 1:
+            return (span,)
+
+        content = (
+            f"{self.count} {self.section} spans aggregated: "
+            f"total={self.total.total_seconds():.6f}s "
+            f"min={self.minimum.total_seconds():.6f}s "
+            f"max={self.maximum.total_seconds():.6f}s"
+        )
+        annotation = TestSpan(section="annotation", detail={"content": content},
+                              duration=timedelta(0), start_at=self.end_at, end_at=self.end_at)
+        return (span, annotation)
+
+
+class SpanAggregator:
+    """
+    Records the first `threshold` spans of each test as usual, and folds any
+    after that into one `SpanAggregate` per distinct section and (normalised)
+    detail.  The aggregates are added to the test as spans when it finishes.
+
+    This keeps the payload, and the cost of building it, bounded for tests
+    which e.g. issue tens of thousands of identical queries.
+
+    Spans are folded into the recording thread's `SpanBuffer`, so that no
+    locking is needed, which means the threshold applies per thread.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+
+    def fold(self, buffer: SpanBuffer, span: TestSpan) -> bool:
+        """Fold the span into an aggregate, returning False if it should be recorded as is"""
+        if len(buffer.spans) < self.threshold:
+            return False
+
+        detail = _normalize_detail(span.section, span.detail)
+        key = (span.section, tuple(sorted(detail.items())) if detail else None)
+        aggregate = buffer.aggregates.get(key)
+        if aggregate is None:
+            buffer.aggregates[key] = SpanAggregate.from_span(span, detail)
+        else:
+            aggregate.add(span)
+        return True
+
+    @staticmethod
+    def spans(buffers: Iterable[SpanBuffer]) -> List[TestSpan]:
+        """The summary spans of every aggregate in the buffers, merged across threads"""
+        merged: Dict[tuple, SpanAggregate] = {}
+        for buffer in buffers:
+            for key, aggregate in buffer.aggregates.items():
+                if key in merged:
+                    merged[key].merge(aggregate)
+                else:
+                    merged[key] = aggregate
+        return [span for aggregate in merged.values() for span in aggregate.spans()]
+
+
+def _normalize_detail(section, detail):
+    if section == "sql" and detail is not None:
+        return {**detail, "query": normalize_query(detail["query"])}
+    return detail
+
+
+def _earliest(a, b):
+    if a is None or b is None:
+        return a or b
+    return min(a, b, key=lambda instant: instant.seconds)
+
+
+def _latest(a, b):
+    if a is None or b is None:
+        return a or b
+    return max(a, b, key=lambda instant: instant.seconds)
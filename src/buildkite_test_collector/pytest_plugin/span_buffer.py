@@ -0,0 +1,32 @@
+"""Per-thread buffers of spans recorded against a running test"""
+
+from contextvars import ContextVar
+from typing import Dict, List
+from uuid import UUID
+
+from ..collector.payload import TestSpan
+
+# The nodeid of the running test in the current context.  asyncio tasks copy
+# the context they're created in, so a task which outlives its test keeps
+# pointing at that test (and its late spans are dropped) rather than having
+# them attributed to whichever test happens to be running next.  Threads
+# start with an empty context, and fall back to the plugin's current test if
+# they were started while it was running.
+CURRENT_NODEID: ContextVar = ContextVar("buildkite_current_nodeid", default=None)
+
+
+class SpanBuffer:  # pylint: disable=too-few-public-methods
+    """
+    The spans a single thread has recorded against a single test run.
+
+    Only the owning thread appends to a buffer, so recording a span needs no
+    lock.  The plugin merges every buffer for a test when it is finalized.
+    """
+
+    __slots__ = ("test_id", "spans", "aggregates")
+
+    def __init__(self, test_id: UUID):
+        self.test_id = test_id
+        self.spans: List[TestSpan] = []
+        # Used by SpanAggregator, keyed by section and normalised detail
+        self.aggregates: Dict[tuple, object] = {}
@@ -3,10 +3,12 @@
 from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Literal, Optional, Any
+from uuid import uuid4
 
 from ..collector.payload import TestSpan, TestData
 from ..collector.instant import Instant
 from .buildkite_plugin import BuildkitePlugin
+from .span_buffer import CURRENT_NODEID
 
 
 @dataclass
@@ -22,13 +24,51 @@ class SpanCollector:
     nodeid: str
     plugin: BuildkitePlugin = None
 
+    @classmethod
+    def for_current_test(cls, plugin: Optional[BuildkitePlugin]) -> Optional['SpanCollector']:
+        """
+        Returns a SpanCollector for whichever test is currently running, or
+        None if no test is running.  Used by automatic instrumentation, which
+        has no `request` to find the test from.
+
+        The test is looked up from the current context first, so asyncio
+        tasks stay attached to the test that created them, and then from the
+        plugin, so threads started by a test are attached to it.  Threads
+        which were already running when the test started aren't attached to
+        any test.
+        """
+        if plugin is None:
+            return None
+        nodeid = CURRENT_NODEID.get() or plugin.thread_nodeid()
+        if nodeid is None:
+            return None
+        return cls(nodeid=nodeid, plugin=plugin)
+
     def record(self, span: TestSpan) -> None:
         """
         Add a span to the current test.
+
+        Spans recorded after the test has finished are dropped, and spans past
+        the plugin's aggregation threshold are folded into summaries.
+
+        Safe to call from any thread or asyncio task: each thread appends to
+        its own buffer, which the plugin merges when the test is finalized.
         """
         if self.plugin is not None:
-            test_data = self.plugin.in_flight[self.nodeid].push_span(span)
-            self.plugin.in_flight[self.nodeid] = test_data
+            buffer = self.plugin.span_buffer(self.nodeid)
+            if buffer is None:
+                return
+            aggregator = self.plugin.span_aggregator
+            if aggregator is not None and aggregator.fold(buffer, span):
+                return
+            buffer.spans.append(span)
+
+    def record_since(self, section: Literal['http', 'sql', 'sleep', 'annotation'],
+                     start_at: Instant, detail: Optional[dict] = None) -> None:
+        """Record a span which started at `start_at` and ends now"""
+        end_at = Instant.now()
+        self.record(TestSpan(section=section, detail=detail,
+                    start_at=start_at, end_at=end_at, duration=end_at - start_at))
 
     @contextmanager
     def measure(self, section: Literal['http', 'sql', 'sleep', 'annotation'],
@@ -60,11 +100,15 @@ class SpanCollector:
             yield
 
         finally:
-            end_at = Instant.now()
-
-            self.record(TestSpan(section=section, detail=detail,
-                        start_at=start_at, end_at=end_at, duration=end_at - start_at))
+            self.record_since(section, start_at, detail)
 
     def current_test(self) -> TestData:
-        """Returns the `TestData` of the currently executing test"""
-        return self.plugin.in_flight[self.nodeid]
+        """
+        Returns the `TestData` of the currently executing test.  Without a
+        plugin (when nothing is being collected) this is a `TestData` started
+        now, with no spans.
+        """
+        if self.plugin is None:
+            chunks = self.nodeid.split("::")
+            return TestData.start(uuid4(), scope="::".join(chunks[:-1]), name=chunks[-1])
+        return self.plugin.current_test_data(self.nodeid)
@@ -0,0 +1,108 @@
+"""Splitting tests between parallel jobs by their expected duration"""
+
+import heapq
+import json
+import statistics
+from typing import Callable, Dict, List, Tuple
+
+from .logger import logger
+
+# The smallest duration a test is expected to take, so that tests which
+# took no measurable time are still spread between jobs.
+MIN_DURATION = 0.001
+
+
+def split_items(items: List, durations: Dict[str, float], job: int, job_count: int,
+                split: str) -> Tuple[List, List]:
+    """
+    Split items between jobs so each has about the same expected duration,
+    returning this job's share and the rest.
+
+    Items are packed greedily, longest first, onto whichever job has the
+    least expected duration so far.  With the "files" split whole files are
+    packed, so each file's module scoped fixtures are only set up by one job.
+    Every job computes the same split from the same items and durations, and
+    each keeps its share in collection order.
+
+    Tests with no known duration are expected to take the median.
+    """
+    expected = duration_estimator(durations)
+    groups = _groups(items, split)
+    mine = _assign([sum(expected(item.nodeid) for item in group) for group in groups],
+                   job, job_count)
+
+    selected, deselected = [], []
+    for index, group in enumerate(groups):
+        (selected if index in mine else deselected).extend(group)
+    return selected, deselected
+
+
+def duration_estimator(durations: Dict[str, float]) -> Callable[[str], float]:
+    """
+    A function returning the expected duration of a nodeid: its known
+    duration, or else the median of the known durations.
+    """
+    default = statistics.median(durations.values()) if durations else 1.0
+
+    def expected(nodeid):
+        return max(durations.get(nodeid, default), MIN_DURATION)
+
+    return expected
+
+
+def _groups(items, split):
+    if split == "tests":
+        return [[item] for item in items]
+
+    files = {}
+    for item in items:
+        files.setdefault(item.nodeid.split("::", 1)[0], []).append(item)
+    return list(files.values())
+
+
+def _assign(weights, job, job_count):
+    """The indexes of the weights packed onto the job"""
+    by_weight = sorted(range(len(weights)), key=lambda index: (-weights[index], index))
+
+    # (expected duration, job) of every job, the least loaded at the top
+    jobs = [(0.0, index) for index in range(job_count)]
+    mine = set()
+    for index in by_weight:
+        load, assigned = heapq.heappop(jobs)
+        if assigned == job:
+            mine.add(index)
+        heapq.heappush(jobs, (load + weights[index], assigned))
+    return mine
+
+
+def load_timings(path: str) -> Dict[str, float]:
+    """
+    Read expected test durations from a JSON file, either an object mapping
+    nodeids to seconds, or the output of ``--json`` from an earlier run.
+
+    A missing or malformed file (e.g. on the first build, before there are
+    any timings) gives no durations, so every test is expected to take as
+    long as every other, which every job still agrees on.
+    """
+    try:
+        return _read_timings(path)
+    except (OSError, ValueError, TypeError, AttributeError, KeyError) as error:
+        logger.warning("--bk-timings: can't read %s (%s), using no timings", path, error)
+        return {}
+
+
+def _read_timings(path):
+    with open(path, "r", encoding="utf-8") as f:
+        timings = json.load(f)
+
+    if isinstance(timings, dict):
+        return {nodeid: float(seconds) for nodeid, seconds in timings.items()}
+
+    durations = {}
+    for test in timings:
+        duration = test.get("history", {}).get("duration")
+        if duration is None:
+            continue
+        nodeid = f"{test['scope']}::{test['name']}" if test.get("scope") else test["name"]
+        durations[nodeid] = float(duration)
+    return durations
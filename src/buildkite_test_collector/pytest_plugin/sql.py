@@ -0,0 +1,31 @@
+"""Normalising sql query text for spans"""
+
+import re
+
+# Longest query text recorded in a span, longer queries are truncated
+MAX_QUERY_LENGTH = 1024
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """
+    Normalise query text so that executions of the same statement with
+    different literal values look the same, and bound its length.
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", errors="replace")
+    elif not isinstance(query, str):
+        query = str(query)
+
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    query = _PLACEHOLDER_LIST.sub("(?)", query)
+    query = _WHITESPACE.sub(" ", query).strip()
+
+    if len(query) > MAX_QUERY_LENGTH:
+        query = query[:MAX_QUERY_LENGTH - 3] + "..."
+    return query
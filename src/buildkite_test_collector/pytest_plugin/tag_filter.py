@@ -0,0 +1,56 @@
+"""Selecting tests by their execution_tag markers"""
+
+from typing import List, Tuple
+
+
+def filter_by_tag(items: List, tag_filter: str) -> Tuple[List, List]:
+    """
+    Filters tests based on the tag_filter option.
+    Supports filtering by a single tag in the format key:value.
+    Only equality comparison is supported.
+    Returns a tuple of (filtered_items, unfiltered_items).
+    """
+    key, _, value = tag_filter.partition(":")
+
+    filtered_items = []
+    unfiltered_items = []
+    for item in items:
+        # Extract all execution_tag markers and store them in a dict
+        tags = {}
+        markers = item.iter_markers("execution_tag")
+        for tag_marker in markers:
+            # Ensure the marker has exactly two arguments: key and value
+            if len(tag_marker.args) != 2:
+                continue
+
+            tags[tag_marker.args[0]] = tag_marker.args[1]
+
+        if tags.get(key) == value:
+            filtered_items.append(item)
+        else:
+            unfiltered_items.append(item)
+
+    return filtered_items, unfiltered_items
+
+
+def deselect_by_tag(config, items: List, tag_filter: str) -> None:
+    """Deselect, in place, every item which doesn't have the tag"""
+    filtered_items, unfiltered_items = filter_by_tag(items, tag_filter)
+
+    config.hook.pytest_deselected(items=unfiltered_items)
+    items[:] = filtered_items
+
+
+# pylint: disable=too-few-public-methods
+class TagFilter:
+    """
+    Applies --tag-filters on its own, for runs which don't need the rest of
+    the BuildkitePlugin (nothing is uploaded or saved).
+    """
+
+    def __init__(self, tag_filter: str):
+        self.tag_filter = tag_filter
+
+    def pytest_collection_modifyitems(self, config, items):
+        """pytest_collection_modifyitems hook callback to filter tests by tag"""
+        deselect_by_tag(config, items, self.tag_filter)
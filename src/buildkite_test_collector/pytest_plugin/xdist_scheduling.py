@@ -0,0 +1,63 @@
+"""An xdist scheduler which hands out the longest running work first"""
+
+from typing import Callable, Dict, List
+
+from .splitting import duration_estimator
+
+
+def order_work_units(workqueue: Dict[str, Dict[str, bool]],
+                     durations: Dict[str, float]) -> List[str]:
+    """
+    The scopes of the work queue, in descending order of the expected total
+    duration of their tests.  Ties keep their order in the queue, as does
+    everything when there are no durations (e.g. the timings file is missing).
+    """
+    if not durations:
+        return list(workqueue)
+
+    expected = duration_estimator(durations)
+    weights = {scope: sum(expected(nodeid) for nodeid in nodeids)
+               for scope, nodeids in workqueue.items()}
+    return sorted(workqueue, key=lambda scope: -weights[scope])
+
+
+def make_scheduler(config, log, schedule: str,
+                   expected_durations: Callable[[List[str]], Dict[str, float]]):
+    """
+    Build an xdist scheduler which hands out work units (single tests, or
+    whole files) in descending order of expected duration.
+
+    Workers pull a new unit whenever they run low, so handing out the
+    longest units first is a greedy longest-processing-time schedule: a
+    long test never starts last and leaves the other workers idle, and the
+    short units at the end of the queue even out each worker's total.
+    ``expected_durations`` is called with the collected nodeids once every
+    worker has finished collecting.
+    """
+    # xdist is optional, and this is only called from its own hook
+    from xdist.scheduler import LoadScopeScheduling  # pylint: disable=import-outside-toplevel
+
+    class DurationScheduling(LoadScopeScheduling):  # pylint: disable=abstract-method
+        """LoadScopeScheduling with its work queue ordered by expected duration"""
+
+        def __init__(self, config, log=None):
+            super().__init__(config, log)
+            self._ordered = False
+
+        def _split_scope(self, nodeid):
+            if schedule == "tests":
+                return nodeid
+            # Keep each file's tests, and so its module scoped fixtures, on one worker
+            return nodeid.split("::", 1)[0]
+
+        def _assign_work_unit(self, node):
+            # schedule() builds the work queue in collection order and then
+            # immediately starts assigning it, so order it on first use.
+            if not self._ordered:
+                self._ordered = True
+                durations = expected_durations(self.collection)
+                for scope in order_work_units(self.workqueue, durations):
+                    self.workqueue.move_to_end(scope)
+            super()._assign_work_unit(node)
+
+    return DurationScheduling(config, log)
@@ -1,3 +1,4 @@
+import gzip
 import os
 from uuid import uuid4
 
@@ -235,3 +236,44 @@ def test_api_url_override(successful_test):
 
     json = result.json()
     assert json['upload_id'] == upload_id
+
+@responses.activate
+def test_submit_compressed_sends_single_gzipped_request(successful_test, failed_test):
+    responses.add(
+        responses.POST,
+        "https://analytics-api.buildkite.com/v1/uploads",
+        json={},
+        status=202)
+
+    env = {"BUILDKITE_ANALYTICS_TOKEN": str(uuid4())}
+    payload = Payload.started(Payload.init(RunEnvBuilder(env).build()))
+    payload = payload.push_test_data(successful_test)
+    payload = payload.push_test_data(failed_test)
+
+    assert API(env).submit_compressed(payload, timeout=5) is True
+
+    assert len(responses.calls) == 1
+    request = responses.calls[0].request
+    assert request.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(request.body) == payload.as_json_bytes()
+
+@responses.activate
+def test_submit_compressed_with_bad_response_returns_false(successful_test):
+    responses.add(
+        responses.POST,
+        "https://analytics-api.buildkite.com/v1/uploads",
+        json={'error': str(uuid4())},
+        status=401)
+
+    env = {"BUILDKITE_ANALYTICS_TOKEN": str(uuid4())}
+    payload = Payload.started(Payload.init(RunEnvBuilder(env).build()))
+    payload = payload.push_test_data(successful_test)
+
+    assert API(env).submit_compressed(payload, timeout=5) is False
+
+def test_submit_compressed_with_missing_api_key_returns_false(capfd):
+    env = {"BUILDKITE_ANALYTICS_TOKEN": None}
+    payload = Payload.init(RunEnvBuilder(env).build())
+
+    assert API(env).submit_compressed(payload, timeout=5) is False
+    assert "No BUILDKITE_ANALYTICS_TOKEN" in capfd.readouterr().err
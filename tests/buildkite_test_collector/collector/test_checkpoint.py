@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+import responses
+
+from buildkite_test_collector.collector.api import API
+from buildkite_test_collector.collector.checkpoint import Checkpoint
+from buildkite_test_collector.pytest_plugin import _upload_orphaned_checkpoints
+
+
+def test_checkpoint_create_writes_header_and_locks(tmp_path, fake_env):
+    checkpoint = Checkpoint.create(str(tmp_path), fake_env)
+
+    assert os.path.exists(f"{checkpoint.prefix}.json")
+    assert os.path.exists(f"{checkpoint.prefix}.spool")
+
+    # A live checkpoint is not an orphan
+    assert list(Checkpoint.orphans(str(tmp_path))) == []
+
+    checkpoint.remove()
+
+
+def test_checkpoint_orphans_recovers_closed_checkpoint(tmp_path, payload, successful_test, failed_test):
+    checkpoint = Checkpoint.create(str(tmp_path), payload.run_env, fsync_interval=0)
+    checkpoint.append(successful_test.serialize(payload.started_at))
+    checkpoint.append(failed_test.serialize(payload.started_at))
+    checkpoint.close()
+
+    [orphan] = Checkpoint.orphans(str(tmp_path))
+
+    assert orphan.prefix == checkpoint.prefix
+    assert orphan.run_env == payload.run_env
+    assert orphan.payload().count() == 2
+
+    expected = payload.push_test_data(successful_test).push_test_data(failed_test)
+    assert orphan.payload().as_json_bytes() == expected.as_json_bytes()
+
+    orphan.remove()
+
+
+def test_checkpoint_remove_deletes_files(tmp_path, fake_env):
+    checkpoint = Checkpoint.create(str(tmp_path), fake_env)
+    checkpoint.remove()
+
+    assert os.listdir(tmp_path) == []
+    assert list(Checkpoint.orphans(str(tmp_path))) == []
+
+
+def test_checkpoint_orphans_skips_corrupt_header(tmp_path, fake_env):
+    checkpoint = Checkpoint.create(str(tmp_path), fake_env)
+    checkpoint.close()
+
+    with open(f"{checkpoint.prefix}.json", "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    assert list(Checkpoint.orphans(str(tmp_path))) == []
+
+
+def test_checkpoint_orphans_removes_stale_checkpoints(tmp_path, fake_env):
+    checkpoint = Checkpoint.create(str(tmp_path), fake_env)
+    checkpoint.close()
+
+    last_written = time.time() - Checkpoint.MAX_ORPHAN_AGE - 60
+    os.utime(f"{checkpoint.prefix}.spool", (last_written, last_written))
+
+    assert list(Checkpoint.orphans(str(tmp_path))) == []
+    assert os.listdir(tmp_path) == []
+
+
+@responses.activate
+def test_upload_orphaned_checkpoints_removes_uploaded(tmp_path, payload, successful_test):
+    responses.add(responses.POST, "https://analytics-api.buildkite.com/v1/uploads", status=202)
+
+    checkpoint = Checkpoint.create(str(tmp_path), payload.run_env)
+    checkpoint.append(successful_test.serialize(payload.started_at))
+    checkpoint.close()
+
+    _upload_orphaned_checkpoints(API({"BUILDKITE_ANALYTICS_TOKEN": "fake"}), str(tmp_path))
+
+    assert len(responses.calls) == 1
+    assert json.loads(responses.calls[0].request.body)["data"][0]["id"] == str(successful_test.id)
+    assert list(Checkpoint.orphans(str(tmp_path))) == []
+
+
+@responses.activate
+def test_upload_orphaned_checkpoints_keeps_failed_upload(tmp_path, payload, successful_test):
+    responses.add(responses.POST, "https://analytics-api.buildkite.com/v1/uploads", status=500)
+
+    checkpoint = Checkpoint.create(str(tmp_path), payload.run_env)
+    checkpoint.append(successful_test.serialize(payload.started_at))
+    checkpoint.close()
+
+    _upload_orphaned_checkpoints(API({"BUILDKITE_ANALYTICS_TOKEN": "fake"}), str(tmp_path))
+
+    [orphan] = Checkpoint.orphans(str(tmp_path))
+    orphan.close()
+
+
+@responses.activate
+def test_upload_orphaned_checkpoints_stops_after_a_failed_upload(tmp_path, payload, successful_test):
+    responses.add(responses.POST, "https://analytics-api.buildkite.com/v1/uploads", status=500)
+
+    for _ in range(3):
+        checkpoint = Checkpoint.create(str(tmp_path), payload.run_env)
+        checkpoint.append(successful_test.serialize(payload.started_at))
+        checkpoint.close()
+
+    _upload_orphaned_checkpoints(API({"BUILDKITE_ANALYTICS_TOKEN": "fake"}), str(tmp_path))
+
+    assert len(responses.calls) == 1
+    orphans = list(Checkpoint.orphans(str(tmp_path)))
+    assert len(orphans) == 3
+    for orphan in orphans:
+        orphan.close()
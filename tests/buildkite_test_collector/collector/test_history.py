@@ -0,0 +1,86 @@
+import statistics
+from dataclasses import replace
+from datetime import timedelta
+
+import pytest
+
+from buildkite_test_collector.collector.history import History
+
+NODEID = "test_sample.py::test_history"
+
+
+def _with_duration(test_data, seconds):
+    return replace(test_data, history=replace(test_data.history, duration=timedelta(seconds=seconds)))
+
+
+@pytest.fixture
+def history(tmp_path, fake_env):
+    history = History(str(tmp_path / "history.db"), fake_env)
+    yield history
+    history.close()
+
+
+def test_nothing_is_written_until_flush(history, successful_test):
+    history.add(NODEID, successful_test)
+
+    assert history.stats() == {}
+    history.flush()
+    assert list(history.stats()) == [NODEID]
+
+
+def test_rolling_statistics(history, successful_test, failed_test):
+    durations = [1.0, 2.0, 4.0]
+    history.add(NODEID, _with_duration(successful_test, 1.0))
+    history.add(NODEID, _with_duration(failed_test, 2.0))
+    history.flush()
+    history.add(NODEID, _with_duration(successful_test, 4.0))
+    history.flush()
+
+    stats = history.stats()[NODEID]
+    assert stats.runs == 3
+    assert stats.failures == 1
+    assert stats.mean == pytest.approx(statistics.mean(durations))
+    assert stats.stddev == pytest.approx(statistics.stdev(durations))
+    assert stats.ewma == pytest.approx(0.3 * 4.0 + 0.7 * (0.3 * 2.0 + 0.7 * 1.0))
+    assert (stats.minimum, stats.maximum) == (1.0, 4.0)
+    assert stats.last_result == "passed"
+    assert stats.last_failed_at is not None
+
+
+def test_skipped_runs_are_not_timed(history, successful_test, skipped_test):
+    history.add(NODEID, _with_duration(successful_test, 1.0))
+    history.add(NODEID, _with_duration(skipped_test, 0.0))
+    history.flush()
+
+    assert history.stats()[NODEID].runs == 1
+    assert history.results(NODEID) == ["skipped", "passed"]
+    assert history.durations(NODEID) == [1.0]
+
+
+def test_keeps_the_most_recent_results(tmp_path, fake_env, successful_test):
+    history = History(str(tmp_path / "history.db"), fake_env, keep=3)
+    for seconds in range(5):
+        history.add(NODEID, _with_duration(successful_test, seconds))
+    history.close()
+
+    history = History(str(tmp_path / "history.db"), fake_env)
+    assert history.durations(NODEID) == [4.0, 3.0, 2.0]
+    assert history.stats()[NODEID].runs == 5
+    history.close()
+
+
+def test_records_the_commit(tmp_path, fake_env, successful_test, history):
+    history.add(NODEID, successful_test)
+    history.flush()
+
+    [(commit_sha, run_key)] = history._connection.execute(
+        "SELECT commit_sha, run_key FROM results").fetchall()
+    assert (commit_sha, run_key) == (fake_env.commit_sha, fake_env.key)
+
+
+def test_stats_for_selected_tests(history, successful_test):
+    history.add("a.py::test_a", successful_test)
+    history.add("b.py::test_b", successful_test)
+    history.flush()
+
+    assert list(history.stats(["b.py::test_b", "c.py::test_c"])) == ["b.py::test_b"]
@@ -1,11 +1,15 @@
+import json
+from dataclasses import replace
 from datetime import timedelta
 from functools import reduce
+from uuid import uuid4
 
 import pytest
 
 from buildkite_test_collector.collector.instant import Instant
 from buildkite_test_collector.collector.payload import (
     Payload,
+    SerializedTestData,
     TestData,
     TestHistory,
     TestResultFailed,
@@ -13,6 +17,7 @@ from buildkite_test_collector.collector.payload import (
     TestResultSkipped,
     TestSpan,
 )
+from buildkite_test_collector.collector.spool import Spool
 
 
 def test_payload_init_has_empty_data(fake_env):
@@ -46,6 +51,60 @@ def test_payload_into_batches_works_as_advertised(payload, successful_test):
     assert len(payloads[3].data) == 1
 
 
+def test_payload_into_batches_with_no_data_returns_one_empty_batch(payload):
+    payloads = payload.into_batches(10)
+
+    assert len(payloads) == 1
+    assert len(payloads[0].data) == 0
+
+
+def test_payload_spill_moves_data_to_spool(payload, successful_test, failed_test, tmp_path):
+    payload = payload.push_test_data(successful_test)
+    spilled = payload.spill(Spool.create(directory=tmp_path))
+    spilled = spilled.push_test_data(failed_test)
+
+    assert len(spilled.data) == 1
+    assert spilled.count() == 2
+
+    expected = payload.push_test_data(failed_test)
+    assert spilled.as_json_bytes() == expected.as_json_bytes()
+
+
+def test_payload_iter_batches_streams_spooled_data(payload, successful_test, tmp_path):
+    payload = reduce(
+        lambda p, _: p.push_test_data(successful_test), range(10), payload
+    )
+    payload = payload.spill(Spool.create(directory=tmp_path))
+    payload = reduce(
+        lambda p, _: p.push_test_data(successful_test), range(5), payload
+    )
+
+    batches = list(payload.iter_batches(4))
+
+    assert [len(batch.data) for batch in batches] == [4, 4, 4, 3]
+    assert all(batch.spool is None for batch in batches)
+    assert isinstance(batches[0].data[0], SerializedTestData)
+    assert batches[-1].data[-1] == successful_test
+
+
+def test_payload_excluding_skips_tests(payload, successful_test, failed_test, tmp_path):
+    failed_test = replace(failed_test, id=uuid4())
+    payload = payload.push_test_data(successful_test)
+    payload = payload.spill(Spool.create(directory=tmp_path))
+    payload = payload.push_test_data(failed_test)
+
+    excluded = payload.excluding({successful_test.id})
+
+    assert excluded.count() == 1
+    [batch] = excluded.iter_batches()
+    assert batch.data == (failed_test,)
+    assert batch.count() == 1
+    assert json.loads(excluded.as_json_bytes())["data"] == [
+        json.loads(failed_test.as_json_fragment(payload.started_at))
+    ]
+    assert payload.count() == 2
+
+
 def test_payload_push_test_data(payload, successful_test):
     new_payload = payload.push_test_data(successful_test)
 
@@ -66,6 +125,35 @@ def test_payload_as_json(payload, successful_test):
     assert json["data"][0]["id"] == str(successful_test.id)
 
 
+def test_payload_as_json_bytes_matches_as_json(payload, successful_test, failed_test):
+    payload = payload.push_test_data(successful_test)
+    payload = payload.push_test_data(failed_test)
+
+    assert json.loads(payload.as_json_bytes()) == json.loads(json.dumps(payload.as_json()))
+
+
+def test_payload_as_json_bytes_with_serialized_test_data(payload, successful_test, failed_test):
+    expected = payload.push_test_data(successful_test).push_test_data(failed_test)
+
+    payload = payload.push_test_data(successful_test.serialize(payload.started_at))
+    payload = payload.push_test_data(failed_test)
+
+    assert isinstance(payload.data[0], SerializedTestData)
+    assert payload.as_json_bytes() == expected.as_json_bytes()
+
+
+def test_payload_as_json_bytes_with_no_data(payload):
+    assert json.loads(payload.as_json_bytes())["data"] == []
+
+
+def test_test_data_serialize(payload, failed_test):
+    serialized = failed_test.serialize(payload.started_at)
+
+    assert serialized.id == failed_test.id
+    assert serialized.is_finished()
+    assert serialized.as_json(payload.started_at) == failed_test.as_json(payload.started_at)
+
+
 def test_test_history_with_no_end_at_is_not_finished():
     hist = TestHistory(start_at=Instant.now(), end_at=None, duration=None)
 
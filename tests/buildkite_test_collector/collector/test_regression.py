@@ -0,0 +1,37 @@
+import pytest
+
+from buildkite_test_collector.collector.regression import Baseline
+
+
+def test_baseline_needs_enough_samples():
+    assert Baseline.from_durations([1.0] * (Baseline.MIN_SAMPLES - 1)) is None
+
+
+def test_baseline_is_the_median_and_mad():
+    baseline = Baseline.from_durations([1.0, 1.2, 0.9, 1.1, 10.0])
+
+    assert baseline.median == 1.1
+    assert baseline.mad == pytest.approx(0.1)
+    assert baseline.samples == 5
+
+
+def test_an_outlier_in_the_history_doesnt_hide_a_regression():
+    baseline = Baseline.from_durations([1.0, 1.02, 0.98, 1.01, 0.99, 30.0])
+
+    assert baseline.is_regression(2.0)
+    assert not baseline.is_regression(1.03)
+
+
+def test_small_slowdowns_arent_regressions():
+    baseline = Baseline.from_durations([0.001] * 10)
+
+    # Many deviations slower, but only by a few milliseconds
+    assert baseline.score(0.01) > Baseline.THRESHOLD
+    assert not baseline.is_regression(0.01)
+
+
+def test_noisy_tests_need_a_bigger_slowdown():
+    baseline = Baseline.from_durations([1.0, 2.0, 1.5, 0.5, 2.5, 1.0, 2.0])
+
+    assert not baseline.is_regression(3.0)
+    assert baseline.is_regression(6.0)
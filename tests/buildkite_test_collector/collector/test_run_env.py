@@ -2,6 +2,8 @@ import sys
 from random import randint
 from uuid import uuid4, UUID
 
+import pytest
+
 from buildkite_test_collector.collector.constants import VERSION
 from buildkite_test_collector.collector.run_env import RunEnvBuilder
 
@@ -118,3 +120,20 @@ def test_env_as_json(fake_env):
     expected_version = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
     assert json["language_version"] == expected_version
     assert json["test_runner"] == "pytest"
+
+
+def test_parallel_job():
+    builder = RunEnvBuilder({"BUILDKITE_PARALLEL_JOB": "2", "BUILDKITE_PARALLEL_JOB_COUNT": "4"})
+
+    assert builder.parallel_job() == (2, 4)
+
+
+@pytest.mark.parametrize("env", [
+    {},
+    {"BUILDKITE_PARALLEL_JOB": "0"},
+    {"BUILDKITE_PARALLEL_JOB": "", "BUILDKITE_PARALLEL_JOB_COUNT": "2"},
+    {"BUILDKITE_PARALLEL_JOB": "two", "BUILDKITE_PARALLEL_JOB_COUNT": "4"},
+    {"BUILDKITE_PARALLEL_JOB": "4", "BUILDKITE_PARALLEL_JOB_COUNT": "4"},
+])
+def test_parallel_job_when_not_parallel(env):
+    assert RunEnvBuilder(env).parallel_job() is None
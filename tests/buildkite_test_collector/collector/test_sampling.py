@@ -0,0 +1,71 @@
+import pytest
+
+from buildkite_test_collector.collector.payload import TestData
+from buildkite_test_collector.collector.sampling import Sampler, SampleRule, WEIGHT_TAG
+
+
+def _test_data(name, result="passed", file_name="tests/test_a.py", tags=None):
+    test_data = TestData.start("id", scope=file_name, name=name, file_name=file_name,
+                               location=f"{file_name}:1")
+    test_data = getattr(test_data, result)()
+    for key, value in (tags or {}).items():
+        test_data = test_data.tag_execution(key, value)
+    return test_data
+
+
+def _kept(sampler, count=1000, **kwargs):
+    return [n for n in range(count)
+            if sampler.sample(f"tests/test_a.py::test_{n}", _test_data(f"test_{n}", **kwargs))]
+
+
+def test_keeps_every_failure():
+    sampler = Sampler("build", 0.0)
+
+    assert len(_kept(sampler, result="failed")) == 1000
+    assert _kept(sampler) == []
+
+
+def test_keeps_about_the_rate_of_passes_and_skips():
+    sampler = Sampler("build", 0.25)
+
+    assert 200 < len(_kept(sampler)) < 300
+    assert 200 < len(_kept(sampler, result="skipped")) < 300
+
+
+def test_is_deterministic_per_build():
+    assert _kept(Sampler("build", 0.5)) == _kept(Sampler("build", 0.5))
+    assert _kept(Sampler("build", 0.5)) != _kept(Sampler("another build", 0.5))
+
+
+def test_a_lower_rate_keeps_a_subset():
+    assert set(_kept(Sampler("build", 0.1))) <= set(_kept(Sampler("build", 0.5)))
+
+
+def test_tags_kept_tests_with_their_weight():
+    sampler = Sampler("build", 0.25)
+    nodeid = "tests/test_a.py::test_{}".format(_kept(sampler)[0])
+
+    test_data = sampler.sample(nodeid, _test_data("test"))
+
+    assert test_data.tags[WEIGHT_TAG] == "4"
+    assert WEIGHT_TAG not in Sampler("build", 1.0).sample(nodeid, _test_data("test")).tags
+
+
+def test_rules_override_the_rate():
+    sampler = Sampler("build", 0.0, [
+        SampleRule.parse("tag:team=payments=1"),
+        SampleRule.parse("tests/slow/*=0.5"),
+        SampleRule.parse("tests/*=1"),
+    ])
+
+    assert sampler.rate_for(_test_data("a", tags={"team": "payments"},
+                                       file_name="tests/slow/test_b.py")) == 1.0
+    assert sampler.rate_for(_test_data("a", file_name="tests/slow/test_b.py")) == 0.5
+    assert sampler.rate_for(_test_data("a", file_name="tests/test_c.py")) == 1.0
+    assert sampler.rate_for(_test_data("a", file_name="other/test_d.py")) == 0.0
+
+
+@pytest.mark.parametrize("rule", ["tests/*", "=0.5", "tests/*=2", "tests/*=often"])
+def test_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        SampleRule.parse(rule)
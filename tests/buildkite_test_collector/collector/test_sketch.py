@@ -0,0 +1,83 @@
+import json
+import math
+import random
+
+import pytest
+
+from buildkite_test_collector.collector.sketch import DDSketch
+
+
+def _exact_quantile(values, q):
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def test_empty_sketch():
+    sketch = DDSketch()
+
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean is None
+
+
+@pytest.mark.parametrize("q", [0.0, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantiles_are_within_the_relative_accuracy(q):
+    rng = random.Random(42)
+    values = [rng.lognormvariate(-3, 1.5) for _ in range(10000)]
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.quantile(q) == pytest.approx(_exact_quantile(values, q), rel=0.01)
+    assert sketch.count == 10000
+    assert sketch.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_counts_zeros():
+    sketch = DDSketch()
+    for value in (0.0, 0.0, 0.0, 1.0):
+        sketch.add(value)
+
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == 1.0
+
+
+def test_merging_is_the_same_as_adding_everything():
+    rng = random.Random(1)
+    values = [rng.expovariate(10) for _ in range(2000)]
+    merged, first, second = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        merged.add(value)
+        (first if i % 2 else second).add(value)
+
+    first.merge(second)
+
+    assert first.bins == merged.bins
+    assert first.count == merged.count
+    assert (first.min, first.max) == (merged.min, merged.max)
+
+
+def test_cant_merge_different_accuracies():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_collapses_the_lowest_bins():
+    sketch = DDSketch(max_bins=10)
+    for exponent in range(-20, 5):
+        sketch.add(10.0 ** exponent)
+
+    assert len(sketch.bins) == 10
+    assert sketch.count == 25
+    assert sketch.quantile(1.0) == pytest.approx(10.0 ** 4, rel=0.01)
+    assert sketch.quantile(0.9) == pytest.approx(10.0 ** 2, rel=0.01)
+
+
+def test_json_round_trip():
+    sketch = DDSketch()
+    for value in (0.001, 0.5, 2.0, 0.0):
+        sketch.add(value)
+
+    restored = DDSketch.from_json(json.loads(json.dumps(sketch.as_json())))
+
+    assert restored.as_json() == sketch.as_json()
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
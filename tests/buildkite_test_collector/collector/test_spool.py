@@ -0,0 +1,60 @@
+import os
+
+from buildkite_test_collector.collector.spool import Spool, count_records, read_records
+
+
+def test_spool_create_makes_empty_file(tmp_path):
+    spool = Spool.create(directory=tmp_path)
+
+    assert os.path.exists(spool.path)
+    assert len(spool) == 0
+    assert list(spool) == []
+
+
+def test_spool_round_trips_records_in_order(tmp_path):
+    spool = Spool.create(directory=tmp_path)
+    records = [b"first", b"", b"\x00\xff" * 1000, b"last"]
+
+    for record in records:
+        spool.append(record)
+
+    assert len(spool) == 4
+    assert list(spool) == records
+
+
+def test_spool_remove_deletes_directory(tmp_path):
+    spool = Spool.create(directory=tmp_path)
+    spool.append(b"data")
+
+    spool.remove()
+
+    assert not os.path.exists(os.path.dirname(spool.path))
+
+
+def test_read_records_ignores_truncated_tail(tmp_path):
+    spool = Spool.create(directory=tmp_path)
+    spool.append(b"complete")
+    spool.append(b"interrupted")
+    spool.flush()
+
+    with open(spool.path, "r+b") as f:
+        f.truncate(os.path.getsize(spool.path) - 3)
+
+    assert list(read_records(spool.path)) == [b"complete"]
+
+
+def test_spool_open_counts_existing_records(tmp_path):
+    spool = Spool.create(directory=tmp_path)
+    spool.append(b"first")
+    spool.append(b"second")
+    spool.append(b"interrupted")
+    spool.close()
+
+    with open(spool.path, "r+b") as f:
+        f.truncate(os.path.getsize(spool.path) - 3)
+
+    assert count_records(spool.path) == 2
+    reopened = Spool.open(spool.path)
+    assert len(reopened) == 2
+    assert list(reopened) == [b"first", b"second"]
+    reopened.remove()
@@ -0,0 +1,25 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def expensive():
+    time.sleep(0.02)
+    yield "expensive"
+    time.sleep(0.01)
+
+
+@pytest.fixture
+def cheap():
+    return "cheap"
+
+
+def test_first(expensive, cheap):
+    assert expensive == "expensive"
+
+
+def test_second(expensive, cheap):
+    assert cheap == "cheap"
@@ -0,0 +1,23 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_makes_http_request():
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.handle_request, daemon=True).start()
+
+    assert requests.get(f"http://127.0.0.1:{httpd.server_port}/ping", timeout=5).status_code == 204
+    httpd.server_close()
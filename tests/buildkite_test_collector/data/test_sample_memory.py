@@ -0,0 +1,7 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+retained = []
+
+
+def test_allocates():
+    retained.extend(bytearray(1024) for _ in range(10_000))
@@ -0,0 +1,12 @@
+def test_spans_without_collecting(request, spans):
+    assert getattr(request.config, "_buildkite", None) is None
+
+    with spans.measure("annotation", {"content": "not recorded"}):
+        pass
+
+
+def test_current_test_without_collecting(spans):
+    test_data = spans.current_test()
+
+    assert test_data.name == "test_current_test_without_collecting"
+    assert test_data.history.children == ()
@@ -0,0 +1,15 @@
+"""Sample test file used by test_integration_history.py."""
+
+import time
+
+
+def test_fast():
+    pass
+
+
+def test_slow():
+    time.sleep(0.1)
+
+
+def test_medium():
+    time.sleep(0.03)
@@ -0,0 +1,15 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import time
+
+import pytest
+
+
+@pytest.fixture
+def slow_setup():
+    time.sleep(0.02)
+    yield
+
+
+def test_slow_setup(slow_setup):
+    pass
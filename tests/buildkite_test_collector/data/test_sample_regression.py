@@ -0,0 +1,12 @@
+"""Sample test file used by test_integration_history.py."""
+
+import os
+import time
+
+
+def test_varies():
+    time.sleep(float(os.environ.get("SAMPLE_SLEEP", "0")))
+
+
+def test_steady():
+    pass
@@ -0,0 +1,14 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import gc
+import time
+
+
+def test_busy():
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_collects_garbage():
+    gc.collect()
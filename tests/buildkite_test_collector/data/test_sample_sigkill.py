@@ -0,0 +1,20 @@
+"""Sample test file used by test_integration_checkpoint.py.
+
+The last test kills its own process, so pytest never reaches
+pytest_unconfigure and nothing is uploaded.
+"""
+
+import os
+import signal
+
+
+def test_first():
+    assert True
+
+
+def test_second():
+    assert False
+
+
+def test_killed():
+    os.kill(os.getpid(), signal.SIGKILL)
@@ -0,0 +1,20 @@
+"""Sample test file used by test_integration_sigterm.py.
+
+The last test sends SIGTERM to its own process, as the Buildkite agent does
+when a job is cancelled.
+"""
+
+import os
+import signal
+
+
+def test_first():
+    assert True
+
+
+def test_terminated():
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def test_never_runs():
+    assert True
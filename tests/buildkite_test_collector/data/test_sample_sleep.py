@@ -0,0 +1,9 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import asyncio
+import time
+
+
+def test_sleeps():
+    time.sleep(0.01)
+    asyncio.run(asyncio.sleep(0.01))
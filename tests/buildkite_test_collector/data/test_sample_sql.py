@@ -0,0 +1,13 @@
+"""Sample test file used by test_integration_instrumentation.py."""
+
+import sqlite3
+
+
+def test_runs_queries():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+    for i in range(3):
+        conn.execute("INSERT INTO users VALUES (?, ?)", (i, f"user{i}"))
+
+    assert conn.execute("SELECT count(*) FROM users WHERE id >= 0").fetchone() == (3,)
+    conn.close()
@@ -0,0 +1,75 @@
+import pytest
+
+from buildkite_test_collector.collector.payload import Payload
+from buildkite_test_collector.pytest_plugin.buildkite_plugin import BuildkitePlugin
+
+NODEID = "test_sample.py::test_instrumented"
+LOCATION = ("test_sample.py", 1, "")
+
+
+class InstrumentedTest:
+    """A test in flight on its own BuildkitePlugin, with an instrumentation installed"""
+
+    nodeid = NODEID
+
+    def __init__(self, plugin, instrumentation):
+        self.plugin = plugin
+        self.instrumentation = instrumentation
+        self.installed = True
+
+    def spans(self):
+        """The spans recorded against the test so far"""
+        return self.plugin.current_test_data(NODEID).history.children
+
+    def finish(self):
+        """Pass and finalize the test, returning its TestData"""
+        self.plugin.in_flight[NODEID] = self.plugin.in_flight[NODEID].passed()
+        self.plugin.finalize_test(NODEID)
+        [test_data] = self.plugin.payload.data
+        return test_data
+
+    def run(self, body):
+        """Run body as the test, finish it and uninstall the instrumentation"""
+        try:
+            # Keep what the body returns alive until the test is finalized
+            result = body()
+            test_data = self.finish()
+            del result
+            return test_data
+        finally:
+            self.uninstall()
+
+    def uninstall(self):
+        if self.installed:
+            self.instrumentation.uninstall()
+            self.installed = False
+
+
+@pytest.fixture
+def instrumented(fake_env):
+    """
+    Starts a test with an instrumentation installed, e.g.
+    ``instrumented(SleepInstrumentation)``, returning an InstrumentedTest.
+    Keyword arguments are set on the instrumentation before it's installed,
+    and it's uninstalled at teardown if the test hasn't already.
+    """
+    tests = []
+
+    def start(instrumentation_class, **attributes):
+        plugin = BuildkitePlugin(Payload.init(fake_env))
+        instrumentation = instrumentation_class(plugin)
+        for name, value in attributes.items():
+            setattr(instrumentation, name, value)
+        instrumentation.install()
+        test = InstrumentedTest(plugin, instrumentation)
+        tests.append(test)
+
+        plugin.pytest_runtest_logstart(NODEID, LOCATION)
+        logstart = getattr(instrumentation, "pytest_runtest_logstart", None)
+        if logstart is not None:
+            logstart(NODEID, LOCATION)
+        return test
+
+    yield start
+    for test in tests:
+        test.uninstall()
@@ -0,0 +1,72 @@
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from buildkite_test_collector.pytest_plugin.instrumentation.http_client import HttpInstrumentation
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def http_test(instrumented):
+    return instrumented(HttpInstrumentation)
+
+
+def test_records_urllib_request(http_test, server):
+    with urllib.request.urlopen(f"{server}/zen?token=secret") as response:
+        assert response.read() == b"ok"
+
+    [span] = http_test.spans()
+    assert span.section == "http"
+    assert span.detail == {"method": "GET", "url": f"{server}/zen", "lib": "http.client"}
+    assert span.duration.total_seconds() >= 0
+    assert span.start_at <= span.end_at
+
+
+def test_records_requests_via_urllib3(http_test, server):
+    assert requests.get(f"{server}/zen", timeout=5).text == "ok"
+
+    [span] = http_test.spans()
+    assert span.detail == {"method": "GET", "url": f"{server}/zen", "lib": "urllib3"}
+
+
+def test_ignores_requests_outside_a_test(http_test, server):
+    http_test.plugin.current_nodeid = None
+
+    assert requests.get(f"{server}/zen", timeout=5).text == "ok"
+
+    assert http_test.spans() == ()
+
+
+def test_uninstall_restores_http_client(plugin):
+    import http.client
+    original = http.client.HTTPConnection.putrequest
+
+    instrumentation = HttpInstrumentation(plugin)
+    instrumentation.install()
+    assert http.client.HTTPConnection.putrequest is not original
+    instrumentation.uninstall()
+
+    assert http.client.HTTPConnection.putrequest is original
@@ -0,0 +1,53 @@
+import sys
+import tracemalloc
+
+import pytest
+
+from buildkite_test_collector.pytest_plugin.instrumentation.memory import MemoryInstrumentation
+
+
+def _run_test(instrumented, body, tracemalloc_rate=0.0):
+    return instrumented(MemoryInstrumentation, tracemalloc_rate=tracemalloc_rate).run(body)
+
+
+def _allocate():
+    return [bytearray(1024) for _ in range(10_000)]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+def test_rss_delta(instrumented):
+    test_data = _run_test(instrumented, _allocate)
+
+    assert int(test_data.tags["test.rss_delta_bytes"]) > 5_000_000
+    assert "test.maxrss_delta_bytes" in test_data.tags
+
+
+def test_not_traced_by_default(instrumented):
+    test_data = _run_test(instrumented, _allocate)
+
+    assert "test.tracemalloc_peak_bytes" not in test_data.tags
+    assert test_data.history.children == ()
+    assert not tracemalloc.is_tracing()
+
+
+def test_traces_sampled_tests(instrumented):
+    test_data = _run_test(instrumented, _allocate, tracemalloc_rate=1.0)
+
+    assert int(test_data.tags["test.tracemalloc_peak_bytes"]) > 10_000_000
+    [annotation] = test_data.history.children
+    content = annotation.detail["content"]
+    assert content.startswith("top allocations:\n")
+    assert "test_memory.py" in content.splitlines()[1]
+    assert not tracemalloc.is_tracing()
+
+
+def test_compares_to_a_baseline_when_already_tracing(instrumented):
+    tracemalloc.start()
+    try:
+        test_data = _run_test(instrumented, _allocate, tracemalloc_rate=1.0)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    [annotation] = test_data.history.children
+    assert "test_memory.py" in annotation.detail["content"].splitlines()[1]
@@ -0,0 +1,101 @@
+import gc
+import os
+import time
+
+import pytest
+
+from buildkite_test_collector.pytest_plugin.instrumentation.resources import (
+    CpuInstrumentation, GcInstrumentation, IoInstrumentation)
+
+NODEID = "test_sample.py::test_resources"
+
+
+def _run_test(instrumented, instrumentation_class, body):
+    test = instrumented(instrumentation_class)
+    test_data = test.run(body)
+
+    assert test.plugin.finalize_hooks == []
+    return test_data.tags
+
+
+def _busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_cpu_bound_tests_have_a_higher_utilization_than_waiting_ones(instrumented):
+    # Only compare the two, as absolute CPU times vary on a loaded machine
+    busy = _run_test(instrumented, CpuInstrumentation, lambda: _busy(0.1))
+    waiting = _run_test(instrumented, CpuInstrumentation, lambda: time.sleep(0.1))
+
+    assert float(busy["test.cpu_seconds"]) > 0
+    assert float(busy["test.cpu_thread_seconds"]) > 0
+    assert float(busy["test.cpu_utilization"]) > float(waiting["test.cpu_utilization"])
+
+
+def test_user_and_system_time(instrumented):
+    pytest.importorskip("resource")
+
+    tags = _run_test(instrumented, CpuInstrumentation, lambda: _busy(0.01))
+
+    assert float(tags["test.cpu_user_seconds"]) >= 0
+    assert float(tags["test.cpu_system_seconds"]) >= 0
+
+
+def test_tests_without_a_start_snapshot_are_not_tagged(plugin):
+    instrumentation = CpuInstrumentation(plugin)
+    instrumentation.install()
+    plugin.pytest_runtest_logstart(NODEID, ("test_sample.py", 1, ""))
+    plugin.in_flight[NODEID] = plugin.in_flight[NODEID].passed()
+
+    plugin.finalize_test(NODEID)
+
+    [test_data] = plugin.payload.data
+    assert test_data.tags == {}
+
+
+def test_gc_collections(instrumented):
+    def make_garbage():
+        for _ in range(100):
+            cycle = []
+            cycle.append(cycle)
+        gc.collect()
+
+    tags = _run_test(instrumented, GcInstrumentation, make_garbage)
+
+    assert int(tags["test.gc_gen2_collections"]) >= 1
+    assert int(tags["test.gc_collected"]) >= 100
+    assert float(tags["test.gc_pause_seconds"]) > 0
+
+
+def test_gc_callback_is_removed(plugin):
+    instrumentation = GcInstrumentation(plugin)
+    instrumentation.install()
+    instrumentation.uninstall()
+
+    assert instrumentation._callback not in gc.callbacks
+
+
+@pytest.mark.skipif(not os.access("/proc/self/io", os.R_OK), reason="needs /proc/self/io")
+def test_io_counters(instrumented, tmp_path):
+    def write_file():
+        with open(tmp_path / "data", "wb") as f:
+            for _ in range(10):
+                f.write(b"x" * 1024)
+                f.flush()
+
+    tags = _run_test(instrumented, IoInstrumentation, write_file)
+
+    assert int(tags["test.io_write_syscalls"]) >= 10
+    assert int(tags["test.io_read_syscalls"]) >= 0
+    assert "test.io_write_bytes" in tags
+
+
+def test_context_switches(instrumented):
+    pytest.importorskip("resource")
+
+    tags = _run_test(instrumented, IoInstrumentation, lambda: time.sleep(0.01))
+
+    assert int(tags["test.voluntary_context_switches"]) >= 1
+    assert int(tags["test.involuntary_context_switches"]) >= 0
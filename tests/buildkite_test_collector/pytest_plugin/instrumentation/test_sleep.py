@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from buildkite_test_collector.pytest_plugin.instrumentation.sleep import (
+    TOTAL_TAG, SleepInstrumentation)
+
+
+@pytest.fixture
+def sleep_test(instrumented):
+    return instrumented(SleepInstrumentation)
+
+
+def test_records_time_sleep(sleep_test):
+    time.sleep(0.01)
+
+    test_data = sleep_test.finish()
+    [span] = test_data.history.children
+    assert span.section == "sleep"
+    assert span.duration.total_seconds() >= 0.01
+    assert float(test_data.tags[TOTAL_TAG]) == pytest.approx(span.duration.total_seconds(), abs=1e-6)
+
+
+def test_records_asyncio_sleep(sleep_test):
+    async def main():
+        await asyncio.sleep(0.01)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+    [span] = sleep_test.spans()
+    assert span.section == "sleep"
+    assert span.duration.total_seconds() >= 0.01
+
+
+def test_totals_every_sleep(sleep_test):
+    time.sleep(0.01)
+    time.sleep(0.02)
+
+    test_data = sleep_test.finish()
+    total = sum(span.duration.total_seconds() for span in test_data.history.children)
+    assert len(test_data.history.children) == 2
+    assert float(test_data.tags[TOTAL_TAG]) == pytest.approx(total, abs=1e-5)
+
+
+def test_ignores_zero_delays(sleep_test):
+    time.sleep(0)
+
+    test_data = sleep_test.finish()
+    assert test_data.history.children == ()
+    assert TOTAL_TAG not in test_data.tags
+
+
+def test_ignores_sleeps_outside_a_test(sleep_test):
+    sleep_test.plugin.current_nodeid = None
+
+    time.sleep(0.001)
+
+    assert sleep_test.spans() == ()
+
+
+def test_uninstall_restores_sleep(plugin):
+    originals = (time.sleep, asyncio.sleep, asyncio.tasks.sleep)
+
+    instrumentation = SleepInstrumentation(plugin)
+    instrumentation.install()
+    assert time.sleep is not originals[0]
+    instrumentation.uninstall()
+
+    assert (time.sleep, asyncio.sleep, asyncio.tasks.sleep) == originals
+    assert plugin.finalize_hooks == []
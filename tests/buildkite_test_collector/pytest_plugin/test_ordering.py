@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from buildkite_test_collector.collector.history import TestStats
+from buildkite_test_collector.pytest_plugin.ordering import order_items
+
+
+def _items(*nodeids):
+    return [SimpleNamespace(nodeid=nodeid) for nodeid in nodeids]
+
+
+def _stats(nodeid, ewma, last_result="passed"):
+    return TestStats(nodeid=nodeid, runs=1, failures=0, mean=ewma, m2=0.0, ewma=ewma,
+                     minimum=ewma, maximum=ewma, last_result=last_result)
+
+
+def _nodeids(items):
+    return [item.nodeid for item in items]
+
+
+def test_orders_tests_longest_first():
+    items = _items("a.py::fast", "a.py::slow", "b.py::medium")
+    stats = {s.nodeid: s for s in (_stats("a.py::fast", 1), _stats("a.py::slow", 10),
+                                   _stats("b.py::medium", 5))}
+
+    order_items(items, stats, "tests")
+
+    assert _nodeids(items) == ["a.py::slow", "b.py::medium", "a.py::fast"]
+
+
+def test_orders_failed_tests_first():
+    items = _items("a.py::slow", "a.py::failed")
+    stats = {s.nodeid: s for s in (_stats("a.py::slow", 10), _stats("a.py::failed", 1, "failed"))}
+
+    order_items(items, stats, "tests")
+
+    assert _nodeids(items) == ["a.py::failed", "a.py::slow"]
+
+
+def test_unknown_tests_take_the_median():
+    items = _items("a.py::fast", "a.py::new", "a.py::slow", "a.py::medium")
+    stats = {s.nodeid: s for s in (_stats("a.py::fast", 1), _stats("a.py::slow", 10),
+                                   _stats("a.py::medium", 5))}
+
+    order_items(items, stats, "tests")
+
+    # The new test is expected to take 5s, and ties keep collection order
+    assert _nodeids(items) == ["a.py::slow", "a.py::new", "a.py::medium", "a.py::fast"]
+
+
+def test_is_stable_without_history():
+    items = _items("b.py::one", "a.py::two", "a.py::three")
+
+    order_items(items, {}, "tests")
+
+    assert _nodeids(items) == ["b.py::one", "a.py::two", "a.py::three"]
+
+
+def test_orders_whole_files():
+    items = _items("a.py::fast", "a.py::slow", "b.py::medium", "c.py::flaky", "c.py::ok")
+    stats = {s.nodeid: s for s in (_stats("a.py::fast", 1), _stats("a.py::slow", 3),
+                                   _stats("b.py::medium", 5), _stats("c.py::flaky", 0, "failed"),
+                                   _stats("c.py::ok", 0))}
+
+    order_items(items, stats, "files")
+
+    assert _nodeids(items) == ["c.py::flaky", "c.py::ok", "b.py::medium", "a.py::fast", "a.py::slow"]
@@ -1,10 +1,13 @@
 import json
 import os
+import time
 from types import SimpleNamespace
 
 import pytest
 
-from buildkite_test_collector.collector.payload import Payload, TestData, TestResultFailed, TestResultPassed, TestResultSkipped
+from buildkite_test_collector.collector.payload import Payload, SerializedTestData, TestData, TestResultFailed, TestResultPassed, TestResultSkipped
+from buildkite_test_collector.collector.history import History
+from buildkite_test_collector.collector.sampling import Sampler
 from buildkite_test_collector.pytest_plugin import BuildkitePlugin
 
 from _pytest._code.code import ExceptionInfo
@@ -316,6 +319,127 @@ def test_save_json_payload_with_large_data(fake_env, tmp_path, successful_test):
     assert json.loads(path.read_text()) == expected_data
 
 
+def test_finalize_test_with_preserialize_stores_fragment(fake_env, tmp_path):
+    payload = Payload.init(fake_env)
+    plugin = BuildkitePlugin(payload, preserialize=True)
+
+    location = ("test_sample.py", 1, "")
+    report = TestReport(nodeid="test_sample.py::test_happy", location=location, keywords={}, outcome="passed", longrepr=None, when="call")
+
+    plugin.pytest_runtest_logstart(report.nodeid, location)
+    plugin.pytest_runtest_logreport(report)
+    plugin.finalize_test(report.nodeid)
+
+    assert len(plugin.payload.data) == 1
+    assert isinstance(plugin.payload.data[0], SerializedTestData)
+
+    path = tmp_path / "result.json"
+    plugin.save_payload_as_json(path, merge=True)
+
+    [entry] = json.loads(path.read_text())
+    assert entry["name"] == "test_happy"
+    assert entry["result"] == "passed"
+
+
+def test_finalize_test_with_spool_threshold_spills_to_disk(fake_env, tmp_path):
+    payload = Payload.init(fake_env)
+    plugin = BuildkitePlugin(payload, spool_threshold=2)
+
+    for i in range(5):
+        nodeid = f"test_sample.py::test_{i}"
+        location = ("test_sample.py", i, "")
+        report = TestReport(nodeid=nodeid, location=location, keywords={}, outcome="passed", longrepr=None, when="call")
+        plugin.pytest_runtest_logstart(nodeid, location)
+        plugin.pytest_runtest_logreport(report)
+        plugin.finalize_test(nodeid)
+
+    assert len(plugin.payload.data) == 1
+    assert plugin.payload.count() == 5
+
+    path = tmp_path / "result.json"
+    plugin.save_payload_as_json(path)
+    assert [entry["name"] for entry in json.loads(path.read_text())] == [
+        f"test_{i}" for i in range(5)
+    ]
+
+    spool_path = plugin.payload.spool.path
+    plugin.close()
+    assert not os.path.exists(spool_path)
+
+
+def test_finalize_test_records_history(fake_env, tmp_path):
+    history = History(str(tmp_path / "history.db"), fake_env)
+    plugin = BuildkitePlugin(Payload.init(fake_env), history=history)
+
+    nodeid = "test_sample.py::test_history"
+    location = ("test_sample.py", 1, "")
+    report = TestReport(nodeid=nodeid, location=location, keywords={}, outcome="failed", longrepr=None, when="call")
+    plugin.pytest_runtest_logstart(nodeid, location)
+    plugin.pytest_runtest_logreport(report)
+    plugin.finalize_test(nodeid)
+    plugin.close()
+
+    history = History(str(tmp_path / "history.db"))
+    assert history.results(nodeid) == ["failed"]
+    assert history.stats()[nodeid].failures == 1
+    history.close()
+
+
+def test_finalize_test_drops_unsampled_tests(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env), sampler=Sampler(fake_env.key, 0.0))
+
+    for outcome in ("passed", "failed"):
+        nodeid = f"test_sample.py::test_{outcome}"
+        location = ("test_sample.py", 1, "")
+        report = TestReport(nodeid=nodeid, location=location, keywords={}, outcome=outcome,
+                            longrepr=None, when="call")
+        plugin.pytest_runtest_logstart(nodeid, location)
+        plugin.pytest_runtest_logreport(report)
+        assert plugin.finalize_test(nodeid)
+
+    assert [test_data.name for test_data in plugin.payload.data] == ["test_failed"]
+    assert plugin.in_flight == {}
+
+
+def test_finalize_test_keeps_unsampled_tests_out_of_the_upload(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env), sampler=Sampler(fake_env.key, 0.0),
+                             keep_unsampled=True)
+
+    for outcome in ("passed", "failed"):
+        nodeid = f"test_sample.py::test_{outcome}"
+        location = ("test_sample.py", 1, "")
+        report = TestReport(nodeid=nodeid, location=location, keywords={}, outcome=outcome,
+                            longrepr=None, when="call")
+        plugin.pytest_runtest_logstart(nodeid, location)
+        plugin.pytest_runtest_logreport(report)
+        assert plugin.finalize_test(nodeid)
+
+    assert [test_data.name for test_data in plugin.payload.data] == ["test_passed", "test_failed"]
+    [uploaded] = plugin.upload_payload.iter_batches()
+    assert [test_data.name for test_data in uploaded.data] == ["test_failed"]
+    assert plugin.upload_payload.count() == 1
+
+
+def test_finalize_hooks_are_not_counted_in_the_duration(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    nodeid = "test_sample.py::test_passed"
+    location = ("test_sample.py", 1, "")
+
+    def slow_hook(test_data):
+        time.sleep(0.05)
+        return test_data
+
+    plugin.finalize_hooks.append(slow_hook)
+    report = TestReport(nodeid=nodeid, location=location, keywords={}, outcome="passed",
+                        longrepr=None, when="call")
+    plugin.pytest_runtest_logstart(nodeid, location)
+    plugin.pytest_runtest_logreport(report)
+    assert plugin.finalize_test(nodeid)
+
+    [test_data] = plugin.payload.data
+    assert test_data.history.duration.total_seconds() < 0.05
+
+
 def test_save_json_payload_concurrent_merge(fake_env, tmp_path, successful_test):
     """Test that concurrent merge writes produce valid JSON with all entries.
 
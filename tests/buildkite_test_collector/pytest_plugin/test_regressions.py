@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from buildkite_test_collector.pytest_plugin.regressions import RegressionReport
+
+
+class FakeHistory:
+    def __init__(self, durations):
+        self._durations = durations
+
+    def durations(self, nodeid, limit=None):
+        return self._durations.get(nodeid, [])[:limit]
+
+
+def _report(nodeid, when, duration, skipped=False):
+    return SimpleNamespace(nodeid=nodeid, when=when, duration=duration, skipped=skipped)
+
+
+def _run(report, nodeid, call, skipped=False):
+    report.pytest_runtest_logreport(_report(nodeid, "setup", 0.01))
+    report.pytest_runtest_logreport(_report(nodeid, "call", call, skipped))
+    report.pytest_runtest_logreport(_report(nodeid, "teardown", 0.01))
+
+
+def test_checks_report_durations():
+    history = FakeHistory({"a.py::slower": [0.1] * 10, "a.py::same": [0.1] * 10})
+    report = RegressionReport(history, from_reports=True)
+
+    _run(report, "a.py::slower", 1.0)
+    _run(report, "a.py::same", 0.09)
+    _run(report, "a.py::new", 1.0)
+
+    assert [nodeid for _, nodeid, _ in report.regressions] == ["a.py::slower"]
+    assert report.regressions[0][0] == 1.02
+
+
+def test_skipped_tests_arent_checked():
+    report = RegressionReport(FakeHistory({"a.py::skipped": [0.1] * 10}), from_reports=True)
+
+    _run(report, "a.py::skipped", 1.0, skipped=True)
+
+    assert report.regressions == []
+
+
+def test_only_checks_reports_in_the_xdist_controller():
+    report = RegressionReport(FakeHistory({"a.py::slower": [0.1] * 10}))
+
+    _run(report, "a.py::slower", 1.0)
+
+    assert report.regressions == []
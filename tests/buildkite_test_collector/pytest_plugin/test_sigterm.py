@@ -0,0 +1,101 @@
+import json
+import signal
+
+import responses
+
+from buildkite_test_collector.collector.api import API
+from buildkite_test_collector.collector.checkpoint import Checkpoint
+from buildkite_test_collector.collector.payload import Payload
+from buildkite_test_collector.pytest_plugin.buildkite_plugin import BuildkitePlugin
+from buildkite_test_collector.pytest_plugin.sigterm import SigtermFlusher
+
+from _pytest.reports import TestReport
+
+UPLOADS_URL = "https://analytics-api.buildkite.com/v1/uploads"
+LOCATION = ("test_sample.py", 1, "")
+
+
+def _plugin_with_finished_and_in_flight_tests(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+
+    nodeid = "test_sample.py::test_finished"
+    report = TestReport(nodeid=nodeid, location=LOCATION, keywords={}, outcome="passed", longrepr=None, when="call")
+    plugin.pytest_runtest_logstart(nodeid, LOCATION)
+    plugin.pytest_runtest_logreport(report)
+    plugin.finalize_test(nodeid)
+
+    plugin.pytest_runtest_logstart("test_sample.py::test_running", LOCATION)
+    return plugin
+
+
+@responses.activate
+def test_flush_uploads_finished_and_interrupted_tests(fake_env):
+    responses.add(responses.POST, UPLOADS_URL, status=202)
+    plugin = _plugin_with_finished_and_in_flight_tests(fake_env)
+
+    SigtermFlusher(plugin, API({"BUILDKITE_ANALYTICS_TOKEN": "fake"})).flush()
+
+    assert len(responses.calls) == 1
+    import gzip
+    data = json.loads(gzip.decompress(responses.calls[0].request.body))["data"]
+    results = {t["name"]: t for t in data}
+
+    assert results["test_finished"]["result"] == "passed"
+    assert results["test_running"]["result"] == "failed"
+    assert results["test_running"]["failure_reason"] == "Interrupted by SIGTERM"
+    assert results["test_running"]["tags"] == {"test.interrupted": "true"}
+
+    assert plugin.in_flight == {}
+    assert plugin.payload.count() == 0
+
+
+@responses.activate
+def test_flush_saves_checkpoint_when_upload_fails(fake_env, tmp_path):
+    responses.add(responses.POST, UPLOADS_URL, status=500)
+    plugin = _plugin_with_finished_and_in_flight_tests(fake_env)
+
+    flusher = SigtermFlusher(plugin, API({"BUILDKITE_ANALYTICS_TOKEN": "fake"}),
+                             checkpoint_dir=str(tmp_path))
+    flusher.flush()
+
+    [orphan] = Checkpoint.orphans(str(tmp_path))
+    data = json.loads(orphan.payload().as_json_bytes())["data"]
+    orphan.close()
+
+    assert sorted(t["name"] for t in data) == ["test_finished", "test_running"]
+    assert plugin.payload.count() == 0
+
+
+@responses.activate
+def test_flush_keeps_existing_checkpoint_when_upload_fails(fake_env, tmp_path):
+    responses.add(responses.POST, UPLOADS_URL, status=500)
+    plugin = BuildkitePlugin(Payload.init(fake_env),
+                             checkpoint=Checkpoint.create(str(tmp_path), fake_env))
+    plugin.pytest_runtest_logstart("test_sample.py::test_running", LOCATION)
+
+    SigtermFlusher(plugin, API({"BUILDKITE_ANALYTICS_TOKEN": "fake"})).flush()
+
+    assert plugin.checkpoint is None
+    [orphan] = Checkpoint.orphans(str(tmp_path))
+    data = json.loads(orphan.payload().as_json_bytes())["data"]
+    orphan.close()
+
+    assert [t["name"] for t in data] == ["test_running"]
+
+
+def test_handler_chains_to_previous_handler(fake_env, monkeypatch):
+    calls = []
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: calls.append(signum))
+    try:
+        plugin = BuildkitePlugin(Payload.init(fake_env))
+        flusher = SigtermFlusher(plugin, API({}))
+        monkeypatch.setattr(flusher, "flush", lambda: calls.append("flush"))
+
+        assert flusher.install()
+        flusher(signal.SIGTERM, None)
+
+        assert calls == ["flush", signal.SIGTERM]
+        # The handler uninstalls itself before chaining
+        assert signal.getsignal(signal.SIGTERM) is not flusher
+    finally:
+        signal.signal(signal.SIGTERM, previous)
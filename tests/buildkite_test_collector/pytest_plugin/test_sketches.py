@@ -0,0 +1,48 @@
+from dataclasses import replace
+from datetime import timedelta
+
+from buildkite_test_collector.collector.payload import TestData
+from buildkite_test_collector.pytest_plugin.sketches import DurationSketches
+
+
+def _test_data(scope, name, seconds, tags=None, result="passed"):
+    test_data = getattr(TestData.start("id", scope=scope, name=name, file_name="a.py",
+                                       location="a.py:1"), result)()
+    for key, value in (tags or {}).items():
+        test_data = test_data.tag_execution(key, value)
+    start_at = test_data.history.start_at
+    return replace(test_data, history=replace(
+        test_data.history,
+        end_at=start_at + timedelta(seconds=seconds),
+        duration=timedelta(seconds=seconds),
+    ))
+
+
+def test_sketches_suite_file_scope_and_tags():
+    sketches = DurationSketches("unused.json")
+
+    sketches.finalize_test(_test_data("a.py::TestA", "one", 1.0, {"team": "red"}))
+    sketches.finalize_test(_test_data("a.py::TestA", "two", 2.0, {"test.cpu_seconds": "1.5"}))
+    sketches.finalize_test(_test_data("a.py", "skipped", 5.0, result="skipped"))
+
+    assert {group: sketch.count for group, sketch in sketches.sketches.items()} == {
+        "suite": 2,
+        "file:a.py": 2,
+        "scope:a.py::TestA": 2,
+        "tag:team=red": 1,
+    }
+    assert sketches.sketches["suite"].quantile(1.0) == 2.0
+
+
+def test_saves_and_merges(tmp_path):
+    path = tmp_path / "sketches.json"
+    for seconds in (1.0, 3.0):
+        sketches = DurationSketches(str(path))
+        sketches.finalize_test(_test_data("a.py", "one", seconds))
+        sketches.save()
+
+    sketches = DurationSketches(str(path))
+    sketches.save()
+
+    assert sketches.sketches["suite"].count == 2
+    assert sketches.sketches["suite"].quantile(1.0) == 3.0
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from buildkite_test_collector.collector.payload import TestSpan
+from buildkite_test_collector.pytest_plugin.slowest import SlowestReport, TopN
+
+
+def _report(nodeid, when, duration):
+    return SimpleNamespace(nodeid=nodeid, when=when, duration=duration)
+
+
+def _run(report, nodeid, setup=0.0, call=0.0, teardown=0.0):
+    for when, duration in (("setup", setup), ("call", call), ("teardown", teardown)):
+        report.pytest_runtest_logreport(_report(nodeid, when, duration))
+
+
+def test_top_n_keeps_the_largest():
+    top = TopN(2)
+    for value, key in ((1, "a"), (5, "b"), (3, "c"), (2, "d")):
+        top.push(value, key)
+
+    assert top.largest() == [(5, "b"), (3, "c")]
+
+
+def test_totals_tests_files_and_phases():
+    report = SlowestReport(2)
+    _run(report, "a.py::one", setup=0.5, call=1.0, teardown=0.1)
+    _run(report, "a.py::two", call=0.2)
+    _run(report, "b.py::three", call=3.0)
+
+    assert report._tests.largest() == [(3.0, "b.py::three"), (1.6, "a.py::one")]
+    assert report.files == {"a.py": 1.8, "b.py": 3.0}
+    assert report.phases == {"setup": 0.5, "call": 4.2, "teardown": 0.1}
+
+
+def test_teardown_without_earlier_phases():
+    report = SlowestReport(2)
+    report.pytest_runtest_logreport(_report("a.py::one", "teardown", 0.5))
+
+    assert report._tests.largest() == [(0.5, "a.py::one")]
+
+
+def test_totals_fixture_setups_from_spans():
+    report = SlowestReport(5)
+    test_data = SimpleNamespace(history=SimpleNamespace(children=[
+        TestSpan(section="annotation", duration=timedelta(seconds=0.5),
+                 detail={"content": "fixture setup: db (session)"}),
+        TestSpan(section="annotation", duration=timedelta(seconds=0.1),
+                 detail={"content": "fixture teardown: db (session)"}),
+        TestSpan(section="sleep", duration=timedelta(seconds=1)),
+    ]))
+
+    assert report.finalize_test(test_data) is test_data
+    assert report.fixtures == {"db (session)": 0.5}
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from buildkite_test_collector.collector.instant import Instant
+from buildkite_test_collector.collector.payload import Payload, TestSpan
+from buildkite_test_collector.pytest_plugin.buildkite_plugin import BuildkitePlugin
+from buildkite_test_collector.pytest_plugin.span_aggregator import SpanAggregator
+from buildkite_test_collector.pytest_plugin.span_buffer import SpanBuffer
+from buildkite_test_collector.pytest_plugin.span_collector import SpanCollector
+
+
+def _sql_span(query, seconds):
+    start_at = Instant.now()
+    return TestSpan(section="sql", detail={"query": query}, duration=timedelta(seconds=seconds),
+                    start_at=start_at, end_at=start_at)
+
+
+def test_records_spans_up_to_the_threshold(plugin, span_collector):
+    plugin.span_aggregator = SpanAggregator(threshold=2)
+
+    span_collector.record(_sql_span("SELECT 1", 1))
+    span_collector.record(_sql_span("SELECT 2", 1))
+
+    assert len(span_collector.current_test().history.children) == 2
+
+
+def test_folds_matching_spans_past_the_threshold(plugin, span_collector):
+    aggregator = plugin.span_aggregator = SpanAggregator(threshold=1)
+
+    span_collector.record(_sql_span("SELECT * FROM users", 1))
+    for seconds in (1, 2, 3):
+        span_collector.record(_sql_span(f"SELECT * FROM users WHERE id = {seconds}", seconds))
+    span_collector.record(_sql_span("DELETE FROM users", 5))
+
+    assert len(span_collector.current_test().history.children) == 1
+
+    folded, annotation, single = aggregator.spans(plugin.spans[span_collector.nodeid])
+    assert folded.detail == {"query": "SELECT * FROM users WHERE id = ?"}
+    assert folded.duration == timedelta(seconds=6)
+    assert annotation.section == "annotation"
+    assert annotation.detail["content"] == (
+        "3 sql spans aggregated: total=6.000000s min=1.000000s max=3.000000s"
+    )
+    assert single.detail == {"query": "DELETE FROM users"}
+    assert single.duration == timedelta(seconds=5)
+
+
+def test_merges_aggregates_from_several_buffers():
+    aggregator = SpanAggregator(threshold=0)
+    buffers = [SpanBuffer(test_id=None), SpanBuffer(test_id=None)]
+    for buffer, seconds in zip(buffers, (1, 4)):
+        aggregator.fold(buffer, _sql_span("SELECT 1", seconds))
+        aggregator.fold(buffer, _sql_span("SELECT 2", seconds))
+
+    folded, annotation = aggregator.spans(buffers)
+    assert folded.duration == timedelta(seconds=10)
+    assert annotation.detail["content"] == (
+        "4 sql spans aggregated: total=10.000000s min=1.000000s max=4.000000s"
+    )
+
+
+def test_finalize_emits_aggregates(fake_env):
+    nodeid = "test_sample.py::test_sql"
+    plugin = BuildkitePlugin(Payload.init(fake_env), span_aggregator=SpanAggregator(threshold=0))
+    plugin.pytest_runtest_logstart(nodeid, ("test_sample.py", 1, ""))
+    collector = SpanCollector.for_current_test(plugin)
+    for _ in range(100):
+        collector.record(_sql_span("SELECT 1", 0.5))
+    plugin.in_flight[nodeid] = plugin.in_flight[nodeid].passed()
+
+    plugin.finalize_test(nodeid)
+
+    [test_data] = plugin.payload.data
+    span, annotation = test_data.history.children
+    assert span.duration == timedelta(seconds=50)
+    assert annotation.detail["content"].startswith("100 sql spans aggregated")
+    assert plugin.spans == {}
@@ -1,7 +1,13 @@
+import asyncio
+import contextvars
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
-from buildkite_test_collector.collector.payload import TestSpan
+from buildkite_test_collector.collector.payload import Payload, TestSpan
+from buildkite_test_collector.pytest_plugin.buildkite_plugin import BuildkitePlugin
+from buildkite_test_collector.pytest_plugin.span_collector import SpanCollector
 
 
 def test_record_adds_span_to_plugin(span_collector):
@@ -18,3 +24,93 @@ def test_measure_adds_span_to_plugin(span_collector):
         time.sleep(0.001)
 
     assert len(span_collector.current_test().history.children) == 1
+
+
+def test_record_from_many_threads_loses_nothing(span_collector):
+    def record_spans():
+        for _ in range(500):
+            span_collector.record(TestSpan(section='sleep', duration=timedelta(0)))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(record_spans) for _ in range(8)]:
+            future.result()
+
+    assert len(span_collector.current_test().history.children) == 4000
+
+
+def test_record_from_asyncio_tasks(fake_env):
+    nodeid = "test_sample.py::test_async"
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    plugin.pytest_runtest_logstart(nodeid, ("test_sample.py", 1, ""))
+
+    async def task(seconds):
+        collector = SpanCollector.for_current_test(plugin)
+        with collector.measure('sleep'):
+            await asyncio.sleep(seconds)
+
+    async def main():
+        await asyncio.gather(*(task(0.001 * i) for i in range(10)))
+
+    asyncio.run(main())
+
+    assert len(plugin.current_test_data(nodeid).history.children) == 10
+
+
+def test_for_current_test_prefers_the_context(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    plugin.pytest_runtest_logstart("test_sample.py::test_a", ("test_sample.py", 1, ""))
+    context = contextvars.copy_context()
+    plugin.pytest_runtest_logstart("test_sample.py::test_b", ("test_sample.py", 2, ""))
+
+    collector = context.run(SpanCollector.for_current_test, plugin)
+
+    assert collector.nodeid == "test_sample.py::test_a"
+
+
+def test_for_current_test_in_a_thread_uses_the_plugin(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    plugin.pytest_runtest_logstart("test_sample.py::test_a", ("test_sample.py", 1, ""))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        collector = executor.submit(SpanCollector.for_current_test, plugin).result()
+
+    assert collector.nodeid == "test_sample.py::test_a"
+
+
+def test_for_current_test_ignores_threads_started_before_the_test(fake_env):
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Start the worker thread, as a session scoped server would be
+        executor.submit(lambda: None).result()
+        plugin.pytest_runtest_logstart("test_sample.py::test_a", ("test_sample.py", 1, ""))
+
+        collector = executor.submit(SpanCollector.for_current_test, plugin).result()
+
+    assert collector is None
+
+
+def test_finalize_merges_thread_buffers_in_start_order(fake_env):
+    nodeid = "test_sample.py::test_threads"
+    plugin = BuildkitePlugin(Payload.init(fake_env))
+    plugin.pytest_runtest_logstart(nodeid, ("test_sample.py", 1, ""))
+    collector = SpanCollector.for_current_test(plugin)
+    barrier = threading.Barrier(2)
+
+    def record_span(delay):
+        barrier.wait()
+        time.sleep(delay)
+        with collector.measure('sleep'):
+            pass
+
+    threads = [threading.Thread(target=record_span, args=(delay,)) for delay in (0.02, 0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    plugin.in_flight[nodeid] = plugin.in_flight[nodeid].passed()
+    plugin.finalize_test(nodeid)
+
+    [test_data] = plugin.payload.data
+    first, second = test_data.history.children
+    assert first.start_at.seconds <= second.start_at.seconds
+    assert plugin.spans == {}
@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+
+from buildkite_test_collector.pytest_plugin.splitting import load_timings, split_items
+
+
+def _items(*nodeids):
+    return [SimpleNamespace(nodeid=nodeid) for nodeid in nodeids]
+
+
+def _nodeids(items):
+    return [item.nodeid for item in items]
+
+
+def test_splits_tests_by_duration():
+    items = _items("a.py::one", "a.py::two", "b.py::three", "b.py::four")
+    durations = {"a.py::one": 10, "a.py::two": 6, "b.py::three": 3, "b.py::four": 2}
+
+    shares = [split_items(items, durations, job, 2, "tests")[0] for job in range(2)]
+
+    assert _nodeids(shares[0]) == ["a.py::one"]
+    assert _nodeids(shares[1]) == ["a.py::two", "b.py::three", "b.py::four"]
+
+
+def test_every_test_runs_in_exactly_one_job():
+    items = _items(*(f"test_{n % 7}.py::test_{n}" for n in range(50)))
+    durations = {item.nodeid: (n * 37) % 11 for n, item in enumerate(items)}
+
+    shares = [split_items(items, durations, job, 4, "tests") for job in range(4)]
+
+    assert sorted(nodeid for selected, _ in shares for nodeid in _nodeids(selected)) \
+        == sorted(_nodeids(items))
+    for selected, deselected in shares:
+        assert len(selected) + len(deselected) == len(items)
+
+
+def test_keeps_collection_order():
+    items = _items("a.py::fast", "a.py::slow", "b.py::medium", "c.py::other")
+    durations = {"a.py::fast": 1, "a.py::slow": 10, "b.py::medium": 5, "c.py::other": 4}
+
+    selected, deselected = split_items(items, durations, 1, 2, "tests")
+
+    assert _nodeids(selected) == ["a.py::fast", "b.py::medium", "c.py::other"]
+    assert _nodeids(deselected) == ["a.py::slow"]
+
+
+def test_splits_whole_files():
+    items = _items("a.py::one", "a.py::two", "b.py::three", "c.py::four")
+    durations = {"a.py::one": 1, "a.py::two": 1, "b.py::three": 5, "c.py::four": 1}
+
+    shares = [split_items(items, durations, job, 2, "files")[0] for job in range(2)]
+
+    assert _nodeids(shares[0]) == ["b.py::three"]
+    assert _nodeids(shares[1]) == ["a.py::one", "a.py::two", "c.py::four"]
+
+
+def test_spreads_tests_without_durations():
+    items = _items("a.py::one", "a.py::two", "a.py::three", "a.py::four")
+
+    shares = [split_items(items, {}, job, 2, "tests")[0] for job in range(2)]
+
+    assert [len(share) for share in shares] == [2, 2]
+
+
+def test_loads_timings_mapping(tmp_path):
+    path = tmp_path / "timings.json"
+    path.write_text(json.dumps({"a.py::one": 1.5, "a.py::two": 2}))
+
+    assert load_timings(str(path)) == {"a.py::one": 1.5, "a.py::two": 2.0}
+
+
+def test_loads_timings_from_json_output(tmp_path):
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps([
+        {"scope": "a.py", "name": "one", "history": {"duration": 1.5}},
+        {"scope": "", "name": "b.py", "history": {"duration": 0.5}},
+        {"scope": "a.py", "name": "unfinished", "history": {}},
+    ]))
+
+    assert load_timings(str(path)) == {"a.py::one": 1.5, "b.py": 0.5}
+
+
+def test_missing_timings_are_empty(tmp_path):
+    assert load_timings(str(tmp_path / "missing.json")) == {}
+
+
+def test_malformed_timings_are_empty(tmp_path):
+    path = tmp_path / "timings.json"
+    path.write_text(json.dumps([1, 2]))
+
+    assert load_timings(str(path)) == {}
@@ -0,0 +1,22 @@
+from buildkite_test_collector.pytest_plugin.sql import MAX_QUERY_LENGTH, normalize_query
+
+
+def test_normalize_query_replaces_literals():
+    assert normalize_query(
+        "SELECT * FROM users WHERE name = 'O''Brien' AND age > 42.5 AND t1.id IN (1, 2, 3)"
+    ) == "SELECT * FROM users WHERE name = ? AND age > ? AND t1.id IN (?)"
+
+
+def test_normalize_query_collapses_whitespace():
+    assert normalize_query("  SELECT\n    id\n  FROM\tusers  ") == "SELECT id FROM users"
+
+
+def test_normalize_query_truncates():
+    query = normalize_query("SELECT " + "a, " * 1000 + "b FROM t")
+
+    assert len(query) == MAX_QUERY_LENGTH
+    assert query.endswith("...")
+
+
+def test_normalize_query_accepts_bytes():
+    assert normalize_query(b"SELECT 1") == "SELECT ?"
@@ -0,0 +1,27 @@
+from buildkite_test_collector.pytest_plugin.xdist_scheduling import order_work_units
+
+
+def test_orders_work_units_longest_first():
+    workqueue = {
+        "a.py": {"a.py::one": False, "a.py::two": False},
+        "b.py": {"b.py::three": False},
+        "c.py": {"c.py::four": False},
+    }
+    durations = {"a.py::one": 1, "a.py::two": 2, "b.py::three": 5, "c.py::four": 0.5}
+
+    assert order_work_units(workqueue, durations) == ["b.py", "a.py", "c.py"]
+
+
+def test_unknown_work_units_take_the_median():
+    workqueue = {scope: {f"{scope}::test": False} for scope in ("a.py", "new.py", "b.py", "c.py")}
+    durations = {"a.py::test": 1, "b.py::test": 3, "c.py::test": 2}
+
+    # The new file is expected to take 2s, and ties keep their order
+    assert order_work_units(workqueue, durations) == ["b.py", "new.py", "c.py", "a.py"]
+
+
+def test_keeps_queue_order_without_durations():
+    workqueue = {"b.py": {"b.py::one": False},
+                 "a.py": {"a.py::two": False, "a.py::three": False}}
+
+    assert order_work_units(workqueue, {}) == ["b.py", "a.py"]
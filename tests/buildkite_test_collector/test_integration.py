@@ -112,3 +112,35 @@ class TestTagFiltering:
         assert "tests/buildkite_test_collector/data/test_sample_execution_tag_filter.py::test_orange" in collected_tests
         assert "tests/buildkite_test_collector/data/test_sample_execution_tag_filter.py::test_banana" in collected_tests
         assert "tests/buildkite_test_collector/data/test_sample_execution_tag_filter.py::test_grape" in collected_tests
+
+
+def test_plugin_import_defers_optional_machinery():
+    """Loading the plugin, as every pytest start does, doesn't import what only collecting, uploading, locking and history need."""
+    heavy = ("requests", "filelock", "sqlite3", "gzip",
+             "buildkite_test_collector.collector.payload",
+             "buildkite_test_collector.pytest_plugin.buildkite_plugin",
+             "buildkite_test_collector.pytest_plugin.span_aggregator")
+    code = (
+        "import sys\n"
+        "import buildkite_test_collector.pytest_plugin\n"
+        f"print(','.join(name for name in {heavy!r} if name in sys.modules))\n"
+    )
+
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_nothing_is_collected_without_token_json_or_local_reports():
+    """Without a token, --json or a local report, no plugin tracks tests and the spans fixture is a no-op."""
+    test_file = Path(__file__).parent / "data" / "test_sample_noop.py"
+    env = {name: value for name, value in os.environ.items()
+           if name != "BUILDKITE_ANALYTICS_TOKEN"}
+
+    result = subprocess.run([sys.executable, "-m", "pytest", str(test_file)],
+                            env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    # Nothing tried to upload, so nothing warned about the missing token
+    assert "BUILDKITE_ANALYTICS_TOKEN" not in result.stdout + result.stderr
@@ -0,0 +1,69 @@
+"""Integration test: results checkpointed before a process is killed can be recovered."""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from buildkite_test_collector.collector.checkpoint import Checkpoint
+
+SAMPLE_FILE = Path(__file__).parent / "data" / "test_sample_sigkill.py"
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(signal, "SIGKILL"), reason="requires SIGKILL"
+)
+
+
+def test_checkpoint_survives_sigkill(tmp_path):
+    checkpoint_dir = tmp_path / "checkpoints"
+    env = {
+        **os.environ,
+        "BUILDKITE_ANALYTICS_TOKEN": "fake",
+        # Nothing listens here, so the orphan upload on the next run would fail
+        "BUILDKITE_ANALYTICS_API_URL": "http://127.0.0.1:9/v1",
+    }
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        f"--bk-checkpoint-dir={checkpoint_dir}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    assert result.returncode == -signal.SIGKILL
+
+    [orphan] = Checkpoint.orphans(str(checkpoint_dir))
+    data = json.loads(orphan.payload().as_json_bytes())["data"]
+    orphan.close()
+
+    assert [(t["name"], t["result"]) for t in data] == [
+        ("test_first", "passed"),
+        ("test_second", "failed"),
+    ]
+
+
+def test_checkpoint_kept_when_upload_fails(tmp_path):
+    checkpoint_dir = tmp_path / "checkpoints"
+    env = {
+        **os.environ,
+        "BUILDKITE_ANALYTICS_TOKEN": "fake",
+        # Nothing listens here, so the upload at the end of the run fails
+        "BUILDKITE_ANALYTICS_API_URL": "http://127.0.0.1:9/v1",
+    }
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(Path(__file__).parent / "data" / "test_sample_order.py"),
+        f"--bk-checkpoint-dir={checkpoint_dir}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    [orphan] = Checkpoint.orphans(str(checkpoint_dir))
+    data = json.loads(orphan.payload().as_json_bytes())["data"]
+    orphan.close()
+
+    assert len(data) == 3
@@ -0,0 +1,196 @@
+"""Integration test: --bk-history keeps results across runs."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from buildkite_test_collector.collector.history import History
+
+DATA_DIR = Path(__file__).parent / "data"
+SAMPLE_FILE = DATA_DIR / "test_sample_resources.py"
+
+
+def test_history_accumulates_across_runs(tmp_path):
+    history_path = tmp_path / "history.db"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        f"--bk-history={history_path}",
+    ]
+
+    for _ in range(2):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    history = History(str(history_path))
+    stats = history.stats()
+    history.close()
+    assert sorted(nodeid.split("::")[-1] for nodeid in stats) == [
+        "test_busy", "test_collects_garbage",
+    ]
+    assert all(s.runs == 2 and s.failures == 0 for s in stats.values())
+
+
+def test_order_runs_slowest_tests_first(tmp_path):
+    history_path = tmp_path / "history.db"
+    json_path = tmp_path / "results.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        f"--bk-history={history_path}",
+        f"--json={json_path}",
+    ]
+
+    for extra_args in ([], ["--bk-order=tests"]):
+        result = subprocess.run(cmd + extra_args, capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    names = [test["name"] for test in json.loads(json_path.read_text())]
+    assert names == ["test_slow", "test_medium", "test_fast"]
+
+
+def test_order_requires_history(tmp_path):
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        "--bk-order=tests",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "--bk-order requires --bk-history" in result.stderr
+
+
+def test_split_shares_tests_between_parallel_jobs(tmp_path):
+    timings_path = tmp_path / "timings.json"
+    sample = DATA_DIR / "test_sample_order.py"
+    timings_path.write_text(json.dumps({
+        f"{sample.relative_to(Path.cwd())}::test_slow": 0.1,
+        f"{sample.relative_to(Path.cwd())}::test_medium": 0.03,
+        f"{sample.relative_to(Path.cwd())}::test_fast": 0.001,
+    }))
+
+    names = []
+    for job in range(2):
+        json_path = tmp_path / f"results-{job}.json"
+        cmd = [
+            sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+            str(sample),
+            "--bk-split=tests",
+            f"--bk-timings={timings_path}",
+            f"--json={json_path}",
+        ]
+        env = {**os.environ, "BUILDKITE_PARALLEL_JOB": str(job),
+               "BUILDKITE_PARALLEL_JOB_COUNT": "2"}
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        assert result.returncode == 0, result.stdout + result.stderr
+        names.append([test["name"] for test in json.loads(json_path.read_text())])
+
+    assert names == [["test_slow"], ["test_fast", "test_medium"]]
+
+
+def test_split_without_a_timings_file_splits_by_count(tmp_path):
+    names = []
+    for job in range(2):
+        json_path = tmp_path / f"results-{job}.json"
+        cmd = [
+            sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+            str(DATA_DIR / "test_sample_order.py"),
+            "--bk-split=tests",
+            f"--bk-timings={tmp_path / 'missing.json'}",
+            f"--json={json_path}",
+        ]
+        env = {**os.environ, "BUILDKITE_PARALLEL_JOB": str(job),
+               "BUILDKITE_PARALLEL_JOB_COUNT": "2"}
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        assert result.returncode == 0, result.stdout + result.stderr
+        names.extend(test["name"] for test in json.loads(json_path.read_text()))
+
+    assert sorted(names) == ["test_fast", "test_medium", "test_slow"]
+
+
+def test_split_requires_timings(tmp_path):
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        "--bk-split=tests",
+        f"--bk-history={tmp_path / 'history.db'}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "--bk-split requires --bk-timings" in result.stderr
+
+
+def test_regressions_are_tagged_and_reported(tmp_path):
+    history_path = tmp_path / "history.db"
+    json_path = tmp_path / "results.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_regression.py"),
+        f"--bk-history={history_path}",
+        "--bk-regressions",
+        f"--json={json_path}",
+    ]
+
+    for sleep in ["0"] * 5 + ["0.2"]:
+        env = {**os.environ, "SAMPLE_SLEEP": sleep}
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    summary = result.stdout[result.stdout.index("duration regressions (buildkite)"):]
+    assert "test_sample_regression.py::test_varies" in summary
+    assert "test_steady" not in summary
+
+    tags = {test["name"]: test.get("tags", {}) for test in json.loads(json_path.read_text())}
+    assert tags["test_varies"]["perf.regression"] == "true"
+    assert float(tags["test_varies"]["perf.baseline_seconds"]) < 0.05
+    assert "perf.regression" not in tags["test_steady"]
+
+
+def test_regressions_require_history(tmp_path):
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_regression.py"),
+        "--bk-regressions",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "--bk-regressions requires --bk-history" in result.stderr
+
+
+def test_sampling_keeps_every_test_in_the_json(tmp_path):
+    json_path = tmp_path / "results.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        "--bk-sample-rate=0",
+        "--bk-sample-rule=tag:unused=true=1",
+        f"--json={json_path}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    # Only uploads are sampled, the JSON file is a complete --bk-timings input
+    names = [test["name"] for test in json.loads(json_path.read_text())]
+    assert sorted(names) == ["test_fast", "test_medium", "test_slow"]
+
+
+def test_sampling_rejects_invalid_rates():
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        "--bk-sample-rate=1.5",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "sample rates must be between 0 and 1" in result.stderr
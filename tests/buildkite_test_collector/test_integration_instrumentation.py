@@ -0,0 +1,134 @@
+"""Integration test: spans captured by --bk-instrument appear in the JSON report."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def _run_pytest(tmp_path, test_file, *extra_args):
+    json_output = tmp_path / "results.json"
+    cmd = [
+        sys.executable, "-m", "pytest",
+        str(DATA_DIR / test_file),
+        f"--json={json_output}",
+        *extra_args,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return json.loads(json_output.read_text())
+
+
+def test_http_spans_are_captured(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_http.py", "--bk-instrument=http")
+
+    [span] = test["history"]["children"]
+    assert span["section"] == "http"
+    assert span["detail"]["method"] == "GET"
+    assert span["detail"]["url"].endswith("/ping")
+    assert span["detail"]["lib"] == "urllib3"
+
+
+def test_no_spans_without_instrumentation(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_http.py")
+
+    assert test["history"]["children"] == []
+
+
+def test_unknown_instrumentation_is_a_usage_error(tmp_path):
+    cmd = [
+        sys.executable, "-m", "pytest",
+        str(DATA_DIR / "test_sample_http.py"),
+        "--bk-instrument=carrier-pigeon",
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "unknown instrumentation 'carrier-pigeon'" in result.stderr
+
+
+def test_sql_spans_are_captured(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_sql.py", "--bk-instrument=sql")
+
+    spans = test["history"]["children"]
+    assert {span["section"] for span in spans} == {"sql"}
+    assert [span["detail"]["query"] for span in spans] == [
+        "CREATE TABLE users (id INTEGER, name TEXT)",
+        "INSERT INTO users VALUES (?)",
+        "INSERT INTO users VALUES (?)",
+        "INSERT INTO users VALUES (?)",
+        "SELECT count(*) FROM users WHERE id >= ?",
+    ]
+
+
+def test_sleep_spans_are_captured(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_sleep.py", "--bk-instrument=sleep")
+
+    spans = test["history"]["children"]
+    assert [span["section"] for span in spans] == ["sleep", "sleep"]
+    assert float(test["tags"]["test.sleep_seconds"]) >= 0.02
+
+
+def test_fixture_spans_are_captured(tmp_path):
+    first, second = _run_pytest(tmp_path, "test_sample_fixtures.py", "--bk-instrument=fixtures")
+
+    def annotations(test):
+        return [span["detail"]["content"] for span in test["history"]["children"]]
+
+    # The session fixture's setup is charged to the first test, its teardown to the last
+    assert annotations(first) == [
+        "fixture setup: expensive (session)",
+        "fixture setup: cheap (function)",
+        "fixture teardown: cheap (function)",
+    ]
+    assert annotations(second) == [
+        "fixture setup: cheap (function)",
+        "fixture teardown: cheap (function)",
+        "fixture teardown: expensive (session)",
+    ]
+    [setup] = [span for span in first["history"]["children"] if "expensive" in span["detail"]["content"]]
+    assert setup["duration"] >= 0.02
+
+
+def test_phase_spans_are_captured(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_phases.py", "--bk-instrument=phases")
+
+    spans = test["history"]["children"]
+    assert [span["detail"]["content"] for span in spans] == [
+        "phase: setup", "phase: call", "phase: teardown",
+    ]
+    assert spans[0]["start_at"] <= spans[0]["end_at"] <= spans[1]["start_at"]
+    assert float(test["tags"]["test.setup_seconds"]) >= 0.02
+    assert float(test["tags"]["test.call_seconds"]) < 0.02
+    assert "test.teardown_seconds" in test["tags"]
+
+
+def test_cpu_usage_is_captured(tmp_path):
+    test, _ = _run_pytest(tmp_path, "test_sample_resources.py", "--bk-instrument=cpu")
+
+    assert float(test["tags"]["test.cpu_seconds"]) > 0
+    assert "test.cpu_utilization" in test["tags"]
+
+
+def test_memory_usage_is_captured(tmp_path):
+    [test] = _run_pytest(tmp_path, "test_sample_memory.py",
+                         "--bk-instrument=memory", "--bk-tracemalloc-rate=1")
+
+    assert int(test["tags"]["test.tracemalloc_peak_bytes"]) > 10_000_000
+    [annotation] = test["history"]["children"]
+    assert "test_sample_memory.py" in annotation["detail"]["content"]
+
+
+def test_gc_pauses_are_captured(tmp_path):
+    busy, collects = _run_pytest(tmp_path, "test_sample_resources.py", "--bk-instrument=gc")
+
+    assert "test.gc_pause_seconds" in busy["tags"]
+    assert int(collects["tags"]["test.gc_gen2_collections"]) >= 1
+
+
+def test_io_counters_are_captured(tmp_path):
+    busy, _ = _run_pytest(tmp_path, "test_sample_resources.py", "--bk-instrument=io")
+
+    assert "test.voluntary_context_switches" in busy["tags"]
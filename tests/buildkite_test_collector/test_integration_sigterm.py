@@ -0,0 +1,47 @@
+"""Integration test: results are saved when pytest is terminated with SIGTERM."""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from buildkite_test_collector.collector.checkpoint import Checkpoint
+
+SAMPLE_FILE = Path(__file__).parent / "data" / "test_sample_sigterm.py"
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(signal, "SIGKILL"), reason="requires POSIX signals"
+)
+
+
+def test_sigterm_saves_results_when_upload_fails(tmp_path):
+    checkpoint_dir = tmp_path / "checkpoints"
+    env = {
+        **os.environ,
+        "BUILDKITE_ANALYTICS_TOKEN": "fake",
+        # Nothing listens here, so the upload fails and results are saved locally
+        "BUILDKITE_ANALYTICS_API_URL": "http://127.0.0.1:9/v1",
+    }
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        "--bk-flush-on-sigterm",
+        f"--bk-checkpoint-dir={checkpoint_dir}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    assert result.returncode == -signal.SIGTERM
+
+    [orphan] = Checkpoint.orphans(str(checkpoint_dir))
+    data = json.loads(orphan.payload().as_json_bytes())["data"]
+    orphan.close()
+
+    tests_by_name = {t["name"]: t for t in data}
+    assert sorted(tests_by_name) == ["test_first", "test_terminated"]
+    assert tests_by_name["test_first"]["result"] == "passed"
+    assert tests_by_name["test_terminated"]["result"] == "failed"
+    assert tests_by_name["test_terminated"]["tags"] == {"test.interrupted": "true"}
@@ -0,0 +1,60 @@
+"""Integration tests: --bk-slowest and --bk-sketches summarise the run."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_slowest_report():
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        str(DATA_DIR / "test_sample_fixtures.py"),
+        "--bk-slowest=2",
+        "--bk-instrument=fixtures",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    summary = result.stdout[result.stdout.index("slowest 2 tests (buildkite)"):]
+    lines = [line.split()[-1].split("/")[-1] for line in summary.splitlines() if line.startswith(" ")]
+    assert lines[:2] == ["test_sample_order.py::test_slow", "test_sample_order.py::test_medium"]
+    assert "slowest 2 fixture setups" in summary
+    assert "expensive (session)" in summary
+    assert "time by phase" in summary
+
+
+def test_slowest_must_be_positive():
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        "--bk-slowest=-1",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "--bk-slowest must be at least 1" in result.stderr
+
+
+def test_sketches_are_saved_and_merged(tmp_path):
+    sketches_path = tmp_path / "sketches.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_order.py"),
+        f"--bk-sketches={sketches_path}",
+    ]
+
+    for _ in range(2):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    summary = result.stdout[result.stdout.index("duration percentiles (buildkite)"):]
+    assert "n=3  all tests" in summary
+    sketches = json.loads(sketches_path.read_text())
+    assert sketches["suite"]["count"] == 6
+    assert sketches["suite"]["max"] >= 0.1
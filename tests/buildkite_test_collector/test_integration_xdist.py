@@ -0,0 +1,108 @@
+"""Integration test: --bk-xdist-schedule hands out the slowest tests first."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("xdist")
+
+DATA_DIR = Path(__file__).parent / "data"
+SAMPLE_FILE = DATA_DIR / "test_sample_order.py"
+
+
+def test_xdist_schedule_runs_slowest_tests_first(tmp_path):
+    timings_path = tmp_path / "timings.json"
+    json_path = tmp_path / "results.json"
+    scope = SAMPLE_FILE.relative_to(Path.cwd())
+    timings_path.write_text(json.dumps({
+        f"{scope}::test_fast": 0.001,
+        f"{scope}::test_slow": 0.1,
+        f"{scope}::test_medium": 0.03,
+    }))
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        "-n", "1",
+        "--bk-xdist-schedule=tests",
+        f"--bk-timings={timings_path}",
+        f"--json={json_path}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    names = [test["name"] for test in json.loads(json_path.read_text())]
+    assert names == ["test_slow", "test_medium", "test_fast"]
+
+
+def test_xdist_schedule_without_a_timings_file(tmp_path):
+    json_path = tmp_path / "results.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        "-n", "2",
+        "--bk-xdist-schedule=tests",
+        f"--bk-timings={tmp_path / 'missing.json'}",
+        f"--json={json_path}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    names = [test["name"] for test in json.loads(json_path.read_text())]
+    assert sorted(names) == ["test_fast", "test_medium", "test_slow"]
+
+
+def test_xdist_schedule_requires_durations(tmp_path):
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        "-n", "1",
+        "--bk-xdist-schedule=files",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    assert result.returncode != 0
+    assert "--bk-xdist-schedule requires --bk-history or --bk-timings" in result.stderr
+
+
+def test_xdist_controller_reports_regressions(tmp_path):
+    history_path = tmp_path / "history.db"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(DATA_DIR / "test_sample_regression.py"),
+        "-n", "2",
+        f"--bk-history={history_path}",
+        "--bk-regressions",
+    ]
+
+    for sleep in ["0"] * 5 + ["0.2"]:
+        env = {**os.environ, "SAMPLE_SLEEP": sleep}
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    summary = result.stdout[result.stdout.index("duration regressions (buildkite)"):]
+    assert "test_sample_regression.py::test_varies" in summary
+    assert "test_steady" not in summary
+
+
+def test_xdist_controller_merges_worker_sketches(tmp_path):
+    sketches_path = tmp_path / "sketches.json"
+    cmd = [
+        sys.executable, "-m", "pytest", "-p", "no:cacheprovider",
+        str(SAMPLE_FILE),
+        "-n", "2",
+        f"--bk-sketches={sketches_path}",
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    sketches = json.loads(sketches_path.read_text())
+    assert sketches["suite"]["count"] == 3
+    assert "n=3  all tests" in result.stdout